@@ -0,0 +1,24 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Run benchmarks from backend/ as modules, e.g.:
+    python -m benchmarks.bench_cache_memory
+"""
+import os
+
+
+def setup_django() -> None:
+    """Configure Django so benchmarks can import event_api modules"""
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "event_intake.settings")
+    django.setup()
+
+
+def setup_test_database() -> None:
+    """Point the default connection at a throwaway test database"""
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
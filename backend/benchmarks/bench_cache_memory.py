@@ -0,0 +1,95 @@
+"""
+Bytes per cached event: the old per-event dict vs EventRecord.
+
+    python -m benchmarks.bench_cache_memory --events 200000
+"""
+import argparse
+import json
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from ._common import setup_django
+
+setup_django()
+
+from event_api.storage import EventRecord, to_epoch_us  # noqa: E402
+
+BASE_TS = datetime(2026, 1, 7, tzinfo=timezone.utc)
+
+
+def _incoming(i: int, users: int, event_names: int):
+    """Fresh strings/dicts per event, as the JSON parser would produce them"""
+    ts = BASE_TS + timedelta(microseconds=i * 1500)
+    metadata = {'page': '/home', 'index': i} if i % 2 else {}
+    return (
+        f"evt_{i:08x}",
+        "event_" + str(i % event_names),
+        "u_" + str(i % users),
+        ts,
+        ts,
+        metadata,
+        f"req_{i:08x}",
+    )
+
+
+def as_dict(event_id, event, user_id, received_at, client_ts, metadata, request_id):
+    return {
+        "id": event_id,
+        "event": event,
+        "user_id": user_id,
+        "received_at": received_at.isoformat(),
+        "client_ts": client_ts.isoformat(),
+        "metadata": metadata,
+        "request_id": request_id,
+    }
+
+
+def as_record(event_id, event, user_id, received_at, client_ts, metadata, request_id):
+    return EventRecord(
+        id=event_id,
+        event=event,
+        user_id=user_id,
+        received_at_us=to_epoch_us(received_at),
+        client_ts_us=to_epoch_us(client_ts),
+        metadata=metadata,
+        request_id=request_id,
+    )
+
+
+def measure(build, events: int, users: int, event_names: int) -> float:
+    """Retained bytes per event for a cache of `events` built with `build`"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    cache = [build(*_incoming(i, users, event_names)) for i in range(events)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del cache
+    return (after - before) / events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=1_000)
+    parser.add_argument('--event-names', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    results = {
+        'events': args.events,
+        'dict_bytes_per_event': measure(as_dict, args.events, args.users, args.event_names),
+        'record_bytes_per_event': measure(as_record, args.events, args.users, args.event_names),
+    }
+    results['reduction'] = 1 - results['record_bytes_per_event'] / results['dict_bytes_per_event']
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"events cached:        {results['events']}")
+    print(f"dict   bytes/event:   {results['dict_bytes_per_event']:.0f}")
+    print(f"record bytes/event:   {results['record_bytes_per_event']:.0f}")
+    print(f"reduction:            {results['reduction']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
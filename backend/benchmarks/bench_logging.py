@@ -0,0 +1,121 @@
+"""
+Logging cost per request on the request thread, at each logging setting.
+
+    python -m benchmarks.bench_logging --requests 20000
+
+A "request" is the logging one POST does: the cache append line and one
+TRACK line per vendor (TrackingClient._route_to_sinks). Output goes to
+/dev/null. Modes:
+
+  legacy   the original code: two print()s and an eagerly built
+           f"TRACK: {vendor}: {json.dumps(payload)}" INFO line per vendor
+  sync     structured logging at INFO, JSON written by a plain StreamHandler
+  queued   structured logging at INFO through the LOGGING queue handler
+  sampled  as queued, with LOG_SAMPLE_RATES track=0.01
+  off      event_api at WARNING
+
+/dev/null never blocks, so `queued` vs `sync` only shows the formatting
+moved off the request thread; with a slow log sink the gap is the I/O wait.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import queue
+import time
+from logging.handlers import QueueListener
+
+from ._common import setup_django
+
+setup_django()
+
+from event_api import ingest, structured_log  # noqa: E402
+from event_api.log_handlers import JSONFormatter, NonBlockingQueueHandler  # noqa: E402
+from event_api.tracking import TrackingClient  # noqa: E402
+
+tracking_logger = logging.getLogger('event_api.tracking')
+
+PROPERTIES = {'event_id': 'evt_00000001', 'client_ts': '2026-01-07T10:00:00+00:00',
+              'metadata': {'page': '/home', 'tags': ['a', 'b']}, 'source': 'api_v1'}
+
+
+def _configure(devnull, mode: str) -> None:
+    """Point the event_api logger at /dev/null the way `mode` logs"""
+    logger = logging.getLogger('event_api')
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.setLevel(logging.WARNING if mode == 'off' else logging.DEBUG if mode == 'legacy' else logging.INFO)
+    structured_log.set_sample_rates({'track': 0.01} if mode == 'sampled' else {})
+
+    target = logging.StreamHandler(devnull)
+    if mode in ('queued', 'sampled'):
+        target.setFormatter(JSONFormatter())
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=100_000))
+        handler.listener = QueueListener(handler.queue, target)
+        logger.addHandler(handler)
+    else:
+        if mode == 'sync':
+            target.setFormatter(JSONFormatter())
+        logger.addHandler(target)
+
+
+def _stop(logger: logging.Logger) -> int:
+    dropped = 0
+    for handler in logger.handlers:
+        if isinstance(handler, NonBlockingQueueHandler):
+            dropped += handler.dropped
+            handler.stop_listener()
+    return dropped
+
+
+def legacy_request(client, bodies, payloads):
+    print(f"DEBUG memory_store before append: {len(ingest.memory_store)}")
+    print(f"DEBUG memory_store after append: {len(ingest.memory_store)}")
+    for vendor, payload in payloads.items():
+        tracking_logger.info(f"TRACK: {vendor}: {json.dumps(payload)}")
+
+
+def current_request(client, bodies, payloads):
+    ingest.log.debug('cache', 'memory_store append', added=1, before=0, after=lambda: len(ingest.memory_store))
+    client._route_to_sinks(bodies)
+
+
+def run(mode: str, requests: int) -> dict:
+    client = TrackingClient()
+    bodies = client.encode_event('u_1', 'page_view', PROPERTIES, 'req_1')
+    payloads = {vendor: json.loads(body) for vendor, body in bodies.items()}
+    request = legacy_request if mode == 'legacy' else current_request
+
+    with open(os.devnull, 'w') as devnull:
+        _configure(devnull, mode)
+        with contextlib.redirect_stdout(devnull):
+            started = time.perf_counter()
+            for _ in range(requests):
+                request(client, bodies, payloads)
+            elapsed = time.perf_counter() - started
+        dropped = _stop(logging.getLogger('event_api'))
+    return {'us_per_request': elapsed / requests * 1e6, 'dropped': dropped}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20_000)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    results = {'requests': args.requests}
+    for mode in ('legacy', 'sync', 'queued', 'sampled', 'off'):
+        results[mode] = run(mode, args.requests)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for mode in ('legacy', 'sync', 'queued', 'sampled', 'off'):
+        r = results[mode]
+        dropped = f"  ({r['dropped']} lines dropped)" if r['dropped'] else ''
+        print(f"{mode:8} {r['us_per_request']:8.2f} us/request{dropped}")
+
+
+if __name__ == "__main__":
+    main()
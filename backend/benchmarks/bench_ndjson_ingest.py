@@ -0,0 +1,87 @@
+"""
+Throughput and memory of NDJSON ingest (POST /api/v1/events/stream)
+
+    python -m benchmarks.bench_ndjson_ingest --lines 1000000
+
+Lines are generated on the fly by a file-like object, so the benchmark itself
+holds no more than one line at a time. Tracking is skipped, as it would be for
+a backfill. Peak memory should stay flat as --lines grows.
+"""
+import argparse
+import io
+import json
+import time
+import resource
+
+from ._common import setup_django, setup_test_database
+
+setup_django()
+
+from event_api.ingest import ingest_ndjson  # noqa: E402
+from event_api.storage import memory_store  # noqa: E402
+
+
+class GeneratedNDJSON(io.RawIOBase):
+    """Readable stream of `lines` synthetic events, produced one line at a time"""
+
+    def __init__(self, lines: int, users: int):
+        self.lines = lines
+        self.users = users
+        self._next = 0
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readline(self, size=-1):
+        if not self._buffer:
+            if self._next >= self.lines:
+                return b''
+            i = self._next
+            self._next += 1
+            self._buffer = json.dumps({
+                "event": "backfill_event",
+                "user_id": f"u_{i % self.users}",
+                "client_ts": "2026-01-07T11:00:00Z",
+                "metadata": {"index": i, "source": "bench"},
+            }).encode() + b'\n'
+        if size is None or size < 0:
+            size = len(self._buffer)
+        line, self._buffer = self._buffer[:size], self._buffer[size:]
+        return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lines', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    setup_test_database()
+    memory_store.clear()
+
+    started = time.perf_counter()
+    summary = ingest_ndjson(GeneratedNDJSON(args.lines, args.users), request_id='bench', track=False)
+    elapsed = time.perf_counter() - started
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    results = {
+        'lines': summary['lines'],
+        'accepted': summary['accepted'],
+        'rejected': summary['rejected'],
+        'seconds': elapsed,
+        'lines_per_second': summary['lines'] / elapsed if elapsed else 0.0,
+        'peak_rss_mb': peak_rss_kb / 1024,
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"lines:            {results['lines']} ({results['accepted']} accepted, {results['rejected']} rejected)")
+    print(f"elapsed:          {results['seconds']:.1f} s")
+    print(f"throughput:       {results['lines_per_second']:,.0f} lines/s")
+    print(f"peak RSS:         {results['peak_rss_mb']:.1f} MB (includes the bounded event cache)")
+
+
+if __name__ == "__main__":
+    main()
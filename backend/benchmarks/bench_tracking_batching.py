@@ -0,0 +1,71 @@
+"""
+Vendor delivery throughput: one request per event vs per-vendor batches.
+
+    python -m benchmarks.bench_tracking_batching --events 2000 --latency 0.002
+
+Both modes deliver to a local VendorStub that waits `--latency` seconds per
+request, so the difference is the per-request overhead batching removes.
+"""
+import argparse
+import json
+import time
+
+from ._common import setup_django
+
+setup_django()
+
+from event_api.tracking import TrackingClient  # noqa: E402
+from event_api.vendor_stub import VendorStub  # noqa: E402
+
+
+def run(stub: VendorStub, events: int, batch_size: int) -> dict:
+    stub.reset()
+    client = TrackingClient()
+    client.use_vendor_url(stub.url)
+    if batch_size:
+        client.enable_batching({vendor: {'max_events': batch_size} for vendor in ('segment', 'posthog', 'mixpanel')})
+
+    started = time.perf_counter()
+    for i in range(events):
+        client.track_event(f'u_{i % 100}', 'page_view', {'event_id': f'evt_{i}', 'metadata': {'i': i}}, 'req_bench')
+    client.flush()
+    elapsed = time.perf_counter() - started
+
+    for sink in client.sinks.values():
+        sink.stop()
+    return {
+        'events_per_second': events / elapsed,
+        'requests': len(stub.requests),
+        'delivered': sum(len(stub.events_for(vendor)) for vendor in ('segment', 'posthog', 'mixpanel')),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=1_000)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.002, help='Stub response delay in seconds')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    with VendorStub(latency=args.latency) as stub:
+        results = {
+            'events': args.events,
+            'latency': args.latency,
+            'per_event': run(stub, args.events, 0),
+            'batched': run(stub, args.events, args.batch_size),
+        }
+    results['speedup'] = results['batched']['events_per_second'] / results['per_event']['events_per_second']
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for mode in ('per_event', 'batched'):
+        r = results[mode]
+        print(f"{mode:10} {r['events_per_second']:10.0f} events/s  {r['requests']:6} requests  "
+              f"{r['delivered']} payloads delivered")
+    print(f"speedup:   {results['speedup']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
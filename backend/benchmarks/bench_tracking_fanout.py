@@ -0,0 +1,74 @@
+"""
+track_event latency with serial vs concurrent vendor fan-out.
+
+    python -m benchmarks.bench_tracking_fanout --events 50
+
+The simulated vendor send sleeps for each vendor's latency, so serial
+delivery costs the sum of the latencies and concurrent delivery the max.
+"""
+import argparse
+import json
+import statistics
+import time
+
+from ._common import setup_django
+
+setup_django()
+
+from event_api.tracking import TrackingClient  # noqa: E402
+
+VENDORS = ('segment', 'posthog', 'mixpanel')
+PROFILES = {
+    'uniform_10ms': {'segment': 0.010, 'posthog': 0.010, 'mixpanel': 0.010},
+    'skewed_5_20_40ms': {'segment': 0.005, 'posthog': 0.020, 'mixpanel': 0.040},
+    'one_slow_100ms': {'segment': 0.005, 'posthog': 0.005, 'mixpanel': 0.100},
+}
+
+
+def _client(fanout: str, latencies: dict) -> TrackingClient:
+    client = TrackingClient()
+    client.fanout = fanout
+
+    def send(vendor, body):
+        time.sleep(latencies[vendor])
+    client._send_to_vendor = send
+    return client
+
+
+def measure(fanout: str, latencies: dict, events: int) -> dict:
+    """Per-call deliver_event latency in milliseconds"""
+    client = _client(fanout, latencies)
+    samples = []
+    for i in range(events):
+        started = time.perf_counter()
+        client.deliver_event(f'u_{i}', 'page_view', {'event_id': f'evt_{i}', 'metadata': {}}, 'req_bench')
+        samples.append((time.perf_counter() - started) * 1000)
+    return {'median_ms': statistics.median(samples), 'max_ms': max(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=30)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for name, latencies in PROFILES.items():
+        results[name] = {
+            'sum_ms': sum(latencies.values()) * 1000,
+            'max_ms': max(latencies.values()) * 1000,
+            'serial': measure('serial', latencies, args.events),
+            'concurrent': measure('concurrent', latencies, args.events),
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'profile':18} {'sum':>7} {'max':>7} {'serial':>9} {'concurrent':>11}")
+    for name, r in results.items():
+        print(f"{name:18} {r['sum_ms']:6.0f}ms {r['max_ms']:6.0f}ms "
+              f"{r['serial']['median_ms']:7.1f}ms {r['concurrent']['median_ms']:9.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
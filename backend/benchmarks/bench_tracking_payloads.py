@@ -0,0 +1,124 @@
+"""
+CPU cost per event of building the vendor tracking payloads.
+
+    python -m benchmarks.bench_tracking_payloads --events 20000
+
+`legacy` is the original pipeline: isoformat() then strptime() for Mixpanel,
+{**...} copies of every sub-dict, and a json.dumps per vendor for the TRACK
+log line plus another in _send_to_vendor's log line (built eagerly even with
+INFO disabled). `current` is TrackingClient._encode_vendor_payloads, which
+encodes each field once and assembles each vendor body as bytes.
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime
+
+from ._common import setup_django
+
+setup_django()
+
+from event_api.tracking import TrackingClient  # noqa: E402
+
+CONFIG = {
+    'segment_write_key': 'dummy_write_key_123',
+    'posthog_api_key': 'dummy_posthog_key_456',
+    'mixpanel_token': 'dummy_mixpanel_token_789',
+}
+
+
+def legacy_payloads(user_id, event_name, properties, request_id):
+    base_payload = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'userId': user_id,
+        'event': event_name,
+        'properties': properties or {},
+        'context': {
+            'library': {'name': 'event-intake-service', 'version': '1.0.0'},
+            'requestId': request_id or f'req_{uuid.uuid4().hex[:8]}'
+        }
+    }
+    payloads = {
+        'segment': {
+            'writeKey': CONFIG['segment_write_key'],
+            'type': 'track',
+            'timestamp': base_payload['timestamp'],
+            'event': base_payload['event'],
+            'userId': base_payload['userId'],
+            'properties': {**base_payload['properties']},
+            'context': {**base_payload['context']}
+        },
+        'posthog': {
+            'api_key': CONFIG['posthog_api_key'],
+            'event': base_payload['event'],
+            'distinct_id': base_payload['userId'],
+            'properties': {**base_payload['properties'], 'distinct_id': base_payload['userId']},
+            'timestamp': base_payload['timestamp']
+        },
+        'mixpanel': {
+            'event': base_payload['event'],
+            'properties': {
+                'token': CONFIG['mixpanel_token'],
+                'distinct_id': base_payload['userId'],
+                'time': int(datetime.strptime(base_payload['timestamp'], "%Y-%m-%dT%H:%M:%S.%fZ").timestamp()),
+                **base_payload['properties'],
+                'mp_lib': 'python'
+            }
+        },
+    }
+    for vendor, payload in payloads.items():
+        f"TRACK: {vendor}: {json.dumps(payload)}"
+        f"Sending event to {vendor}: {json.dumps(payload)}"
+    return payloads
+
+
+def _events(count: int):
+    return [
+        ('u_%d' % (i % 1000), 'page_view',
+         {'event_id': f'evt_{i:08x}', 'client_ts': '2026-01-07T10:00:00.123456+00:00',
+          'metadata': {'page': '/home', 'index': i, 'tags': ['a', 'b']}, 'source': 'api_v1'},
+         f'req_{i:08x}')
+        for i in range(count)
+    ]
+
+
+def measure(build, events) -> float:
+    """Microseconds per event"""
+    started = time.process_time()
+    for user_id, event_name, properties, request_id in events:
+        build(user_id, event_name, properties, request_id)
+    return (time.process_time() - started) / len(events) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=20_000)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    events = _events(args.events)
+    client = TrackingClient()
+
+    def current(user_id, event_name, properties, request_id):
+        metadata_json = json.dumps(properties['metadata'])  # done by validation, reused here
+        return client._encode_vendor_payloads(user_id, event_name, properties, request_id, metadata_json)
+
+    results = {
+        'events': args.events,
+        'legacy_us_per_event': measure(legacy_payloads, events),
+        'current_us_per_event': measure(current, events),
+    }
+    results['speedup'] = results['legacy_us_per_event'] / results['current_us_per_event']
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"events:              {results['events']}")
+    print(f"legacy  us/event:    {results['legacy_us_per_event']:.1f}")
+    print(f"current us/event:    {results['current_us_per_event']:.1f}")
+    print(f"speedup:             {results['speedup']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
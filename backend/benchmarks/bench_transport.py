@@ -0,0 +1,80 @@
+"""
+Vendor POST throughput: a new connection per request vs the pooled transport.
+
+    python -m benchmarks.bench_transport --requests 2000 --threads 8
+
+`per_request` opens a fresh http.client connection for every POST, as the
+urllib-based sender did. `pooled` is HTTPTransport, which reuses keep-alive
+connections to the local VendorStub.
+"""
+import argparse
+import http.client
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from ._common import setup_django
+
+setup_django()
+
+from event_api.transport import HTTPTransport  # noqa: E402
+from event_api.vendor_stub import VendorStub  # noqa: E402
+
+BODY = json.dumps({'event': 'page_view', 'userId': 'u_1', 'properties': {'page': '/home'}}).encode()
+
+
+def per_request_send(url: str, body: bytes, timeout: float) -> int:
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=timeout)
+    try:
+        connection.request('POST', parts.path, body=body, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def run(stub: VendorStub, send, requests: int, threads: int) -> dict:
+    stub.reset()
+    url = f'{stub.url}/segment'
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(lambda _: send(url, BODY, 5), range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests_per_second': requests / elapsed,
+        'connections': stub.connections,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2_000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    transport = HTTPTransport(max_connections=args.threads)
+    with VendorStub() as stub:
+        results = {
+            'requests': args.requests,
+            'threads': args.threads,
+            'per_request': run(stub, per_request_send, args.requests, args.threads),
+            'pooled': run(stub, transport.send, args.requests, args.threads),
+        }
+        transport.close()
+    results['speedup'] = results['pooled']['requests_per_second'] / results['per_request']['requests_per_second']
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for mode in ('per_request', 'pooled'):
+        r = results[mode]
+        print(f"{mode:12} {r['requests_per_second']:8.0f} requests/s  {r['connections']:6} connections")
+    print(f"speedup:     {results['speedup']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Per-event validation cost: EventSerializer vs validate_event.
+
+    python -m benchmarks.bench_validation --events 50000
+
+Both sides include the metadata encoding the tracking fan-out needs: the
+serializer path encodes the metadata again after validation, as the views
+did, while validate_event hands back the encoding it already made.
+"""
+import argparse
+import json
+import time
+
+from ._common import setup_django
+
+setup_django()
+
+from event_api.serializers import EventSerializer  # noqa: E402
+from event_api.validation import validate_event  # noqa: E402
+
+
+def _payloads(events: int):
+    """Freshly decoded bodies, as the JSON parser would produce them"""
+    return [
+        json.loads(json.dumps({
+            'event': 'page_view',
+            'user_id': f'u_{i % 1000}',
+            'client_ts': '2026-01-07T10:00:00.123456Z',
+            'metadata': {'page': '/home', 'index': i, 'tags': ['a', 'b']},
+        }))
+        for i in range(events)
+    ]
+
+
+def with_serializer(data, request_id):
+    serializer = EventSerializer(data={**data, 'request_id': request_id})
+    serializer.is_valid()
+    return json.dumps(serializer.validated_data['metadata'])
+
+
+def with_validator(data, request_id):
+    validated, _ = validate_event(data, request_id=request_id)
+    return validated['metadata_json']
+
+
+def measure(validate, payloads) -> float:
+    """Microseconds per event"""
+    started = time.perf_counter()
+    for data in payloads:
+        validate(data, 'req_bench')
+    return (time.perf_counter() - started) / len(payloads) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=20_000)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    payloads = _payloads(args.events)
+    results = {
+        'events': args.events,
+        'serializer_us_per_event': measure(with_serializer, payloads),
+        'validator_us_per_event': measure(with_validator, payloads),
+    }
+    results['speedup'] = results['serializer_us_per_event'] / results['validator_us_per_event']
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"events validated:      {results['events']}")
+    print(f"serializer us/event:   {results['serializer_us_per_event']:.1f}")
+    print(f"validator  us/event:   {results['validator_us_per_event']:.1f}")
+    print(f"speedup:               {results['speedup']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+Microbenchmark suite for the service's hot functions, with regression checks.
+
+    python -m benchmarks.suite run --output baseline.json
+    python -m benchmarks.suite run --output current.json --baseline baseline.json
+    python -m benchmarks.suite compare baseline.json current.json --threshold 0.10
+
+Each case is timed in `--repeat` rounds, printing progress to stderr. Every round runs enough loops to
+take at least `--min-time` seconds, and the result is the best round in
+microseconds per operation. The best round is the least noisy figure for
+CPU-bound code; `spread` (slowest round over best, minus one) shows how noisy
+the run was. `compare`, or `run --baseline`, flags cases more than
+`--threshold` slower than the baseline and exits with status 1 if there are any.
+
+Cases (select with --filter, a substring of the name):
+
+  validation.event_serializer    EventSerializer.is_valid() on one event
+  validation.validate_event      validate_event() on the same event
+  tracking.build_segment         TrackingClient._build_segment_payload
+  tracking.build_posthog         TrackingClient._build_posthog_payload
+  tracking.build_mixpanel        TrackingClient._build_mixpanel_payload
+  tracking.encode_event          every vendor body for one event, parts included
+  serializer.render_100          EventResponseSerializer + JSONRenderer, 100 events
+  cache.lookup_10k               EventStore.lookup, 10k cached events
+  cache.lookup_1m                EventStore.lookup, 1M cached events
+  cache.filtered_lookup          EventStore.lookup for a rare event name, 1000-event history
+  error_capture.log_exception    ErrorCaptureMiddleware._log_exception, logged
+  error_capture.log_suppressed   the same exception once deduplication suppresses it
+
+Cache lookups alternate first pages and cursor pages from the middle of a
+user's history (100 events per user). Log output goes to a NullHandler, so
+the figures are the request thread's share of the cost.
+"""
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Tuple
+
+from ._common import setup_django
+
+setup_django()
+
+import django  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from event_api.error_capture import ErrorCaptureMiddleware  # noqa: E402
+from event_api.filters import EventFilter  # noqa: E402
+from event_api.serializers import EventResponseSerializer, EventSerializer  # noqa: E402
+from event_api.storage import EventRecord, EventStore  # noqa: E402
+from event_api.tracking import TrackingClient  # noqa: E402
+from event_api.validation import validate_event  # noqa: E402
+
+BASE_US = 1_767_780_000_000_000  # 2026-01-07T10:00:00Z
+EVENTS_PER_USER = 100
+
+EVENT = {
+    'event': 'page_view',
+    'user_id': 'u_42',
+    'client_ts': '2026-01-07T10:00:00.123456Z',
+    'metadata': {'page': '/home', 'referrer': 'https://example.com/', 'tags': ['a', 'b'], 'index': 7},
+}
+PROPERTIES = {'event_id': 'evt_00000001', 'client_ts': '2026-01-07T10:00:00.123456+00:00',
+              'metadata': EVENT['metadata'], 'source': 'api_v1'}
+
+# A case returns (function to time, operations per call)
+Case = Callable[[], Tuple[Callable[[], object], int]]
+
+
+def _fresh_event():
+    """A newly decoded body, as the JSON parser would produce it"""
+    return json.loads(json.dumps(EVENT))
+
+
+def case_event_serializer():
+    data = {**_fresh_event(), 'request_id': 'req_bench'}
+
+    def run():
+        serializer = EventSerializer(data=data)
+        serializer.is_valid()
+    return run, 1
+
+
+def case_validate_event():
+    data = _fresh_event()
+    return lambda: validate_event(data, request_id='req_bench'), 1
+
+
+def _builder_case(vendor: str) -> Case:
+    def case():
+        client = TrackingClient()
+        parts = client._build_payload_parts('u_42', 'page_view', PROPERTIES, 'req_bench', None)
+        build = client._builders[vendor]
+
+        def run():
+            # Sub-microsecond: batch calls so loop overhead does not dominate
+            for _ in range(100):
+                build(client, parts)
+        return run, 100
+    return case
+
+
+def case_encode_event():
+    client = TrackingClient()
+    return lambda: client.encode_event('u_42', 'page_view', PROPERTIES, 'req_bench'), 1
+
+
+def _records(count: int) -> List[EventRecord]:
+    return [
+        EventRecord(
+            id=f'evt_{i:08x}', event='page_view', user_id=f'u_{i // EVENTS_PER_USER}',
+            received_at_us=BASE_US + i * 1000, client_ts_us=BASE_US + i * 1000,
+            metadata={'page': '/home', 'index': i} if i % 2 else None, request_id=f'req_{i:08x}',
+        )
+        for i in range(count)
+    ]
+
+
+def case_render_100():
+    records = _records(100)
+    renderer = JSONRenderer()
+
+    def run():
+        renderer.render({'events': EventResponseSerializer(records, many=True).data, 'count': len(records)})
+    return run, 1
+
+
+def _lookup_case(events: int) -> Case:
+    def case():
+        store = EventStore()
+        store.add_many(_records(events))
+        users = [f'u_{i}' for i in range(events // EVENTS_PER_USER)]
+        for user_id in users:
+            store.fill(user_id, [], 20)  # mark each log as loaded, as a first GET would
+        # (user, cursor) pairs spread over the users: a first page, then a
+        # page starting in the middle of that user's history
+        pages = []
+        for n in range(1000):
+            index = n * 7919 % len(users)
+            middle = BASE_US + (index * EVENTS_PER_USER + EVENTS_PER_USER // 2) * 1000
+            pages.append((users[index], None if n % 2 == 0 else (middle, '')))
+
+        def run():
+            for user_id, before in pages:
+                store.lookup(user_id, 20, before)
+        return run, len(pages)
+    return case
+
+
+def case_filtered_lookup():
+    store = EventStore()
+    # One user, 1000 events, 1 in 50 a purchase
+    store.add_many([
+        EventRecord(id=f'evt_{i:08x}', event='purchase' if i % 50 == 0 else 'page_view', user_id='u_0',
+                    received_at_us=BASE_US + i * 1000, client_ts_us=BASE_US + i * 1000,
+                    metadata={'plan': 'pro'}, request_id=f'req_{i:08x}')
+        for i in range(1000)
+    ])
+    store.fill('u_0', [], 20)
+    query = EventFilter(events=frozenset({'purchase'}))
+    return lambda: store.lookup('u_0', 20, None, query), 1
+
+
+def _raise_nested(depth: int):
+    if depth:
+        _raise_nested(depth - 1)
+    raise ValueError('metadata did not decode')
+
+
+def _log_exception_case(suppressed: bool) -> Case:
+    def case():
+        middleware = ErrorCaptureMiddleware(lambda request: None)
+        if not suppressed:
+            middleware.deduplicator.limit = float('inf')
+        request = RequestFactory().post('/api/v1/events', data=json.dumps(EVENT), content_type='application/json',
+                                        HTTP_X_REQUEST_ID='req_bench', HTTP_USER_AGENT='bench/1.0')
+        try:
+            _raise_nested(5)
+        except ValueError as e:
+            exception = e
+        if suppressed:
+            # Use up this fingerprint's allowance for the window
+            for _ in range(middleware.deduplicator.limit):
+                middleware._log_exception(exception, request)
+        return lambda: middleware._log_exception(exception, request), 1
+    return case
+
+
+CASES: Dict[str, Case] = {
+    'validation.event_serializer': case_event_serializer,
+    'validation.validate_event': case_validate_event,
+    'tracking.build_segment': _builder_case('segment'),
+    'tracking.build_posthog': _builder_case('posthog'),
+    'tracking.build_mixpanel': _builder_case('mixpanel'),
+    'tracking.encode_event': case_encode_event,
+    'serializer.render_100': case_render_100,
+    'cache.lookup_10k': _lookup_case(10_000),
+    'cache.lookup_1m': _lookup_case(1_000_000),
+    'cache.filtered_lookup': case_filtered_lookup,
+    'error_capture.log_exception': _log_exception_case(suppressed=False),
+    'error_capture.log_suppressed': _log_exception_case(suppressed=True),
+}
+
+
+def measure(function: Callable[[], object], ops: int, repeat: int, min_time: float) -> Dict[str, float]:
+    """Best and spread of `repeat` rounds, each at least `min_time` seconds"""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)))
+
+    rounds = [elapsed]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            function()
+        rounds.append(time.perf_counter() - started)
+    best, worst = min(rounds), max(rounds)
+    return {
+        'us_per_op': best / (loops * ops) * 1e6,
+        'spread': worst / best - 1,
+        'loops': loops,
+        'ops_per_loop': ops,
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def run(filters: List[str], repeat: int, min_time: float) -> dict:
+    # Measure the request thread's logging cost, not the console's
+    logger = logging.getLogger('event_api')
+    logger.handlers = [logging.NullHandler()]
+    logger.propagate = False
+
+    results = {}
+    for name, case in CASES.items():
+        if filters and not any(f in name for f in filters):
+            continue
+        function, ops = case()
+        results[name] = measure(function, ops, repeat, min_time)
+        print(f"{name:32} {results[name]['us_per_op']:10.3f} us/op  (spread {results[name]['spread']:.1%})",
+              file=sys.stderr)
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git': _git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'machine': f"{platform.system()} {platform.machine()}",
+            'repeat': repeat,
+            'min_time': min_time,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> Tuple[List[str], List[str]]:
+    """(report lines, names of cases slower than baseline by more than `threshold`)"""
+    lines = [f"{'case':32} {'baseline':>11} {'current':>11} {'change':>8}"]
+    regressions = []
+    base_results, current_results = baseline['results'], current['results']
+    for name in sorted(set(base_results) | set(current_results)):
+        if name not in current_results or name not in base_results:
+            where = 'current' if name not in current_results else 'baseline'
+            lines.append(f"{name:32} {'':>11} {'':>11} {'':>8}  not in {where}")
+            continue
+        before, after = base_results[name]['us_per_op'], current_results[name]['us_per_op']
+        change = after / before - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = '  faster'
+        lines.append(f"{name:32} {before:9.3f}us {after:9.3f}us {change:+8.1%}{flag}")
+    return lines, regressions
+
+
+def _load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def _report_comparison(baseline: dict, current: dict, threshold: float) -> int:
+    lines, regressions = compare(baseline, current, threshold)
+    print('\n'.join(lines))
+    if regressions:
+        print(f"\n{len(regressions)} case(s) regressed by more than {threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print(f"\nNo regressions beyond {threshold:.0%}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run the suite')
+    run_parser.add_argument('--filter', action='append', default=[], help='Only cases whose name contains this')
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--min-time', type=float, default=0.2, help='Minimum seconds per round')
+    run_parser.add_argument('--output', help='Write results as JSON to this file')
+    run_parser.add_argument('--baseline', help='Compare against these saved results')
+    run_parser.add_argument('--threshold', type=float, default=0.10, help='Allowed slowdown, 0.10 = 10%%')
+    run_parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    compare_parser = commands.add_parser('compare', help='Compare two saved results')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.10, help='Allowed slowdown, 0.10 = 10%%')
+
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        sys.exit(_report_comparison(_load(args.baseline), _load(args.current), args.threshold))
+
+    results = run(args.filter, args.repeat, args.min_time)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    if args.baseline:
+        print(file=sys.stderr)
+        sys.exit(_report_comparison(_load(args.baseline), results, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
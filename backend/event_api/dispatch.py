@@ -0,0 +1,183 @@
+"""
+Background dispatch queue for vendor tracking
+
+TrackingClient.track_event builds the vendor payloads in the request thread
+and submits them here; worker threads do the (slow) vendor sends, so a POST
+no longer waits on vendor latency. The queue is bounded and what happens when
+it is full is set by the overflow policy.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DROP_NEWEST = 'drop_newest'
+DROP_OLDEST = 'drop_oldest'
+BLOCK = 'block'
+OVERFLOW_POLICIES = (DROP_NEWEST, DROP_OLDEST, BLOCK)
+
+
+class DispatchQueue:
+    """
+    Bounded in-process job queue drained by `workers` daemon threads.
+
+    When the queue is full, submit() applies `overflow`:
+      - drop_newest: reject the submitted job
+      - drop_oldest: discard the longest-waiting job to make room
+      - block: wait up to `block_timeout` seconds for room, then reject
+
+    stop() drains everything queued before the workers exit. Dropped jobs are
+    counted, not raised: tracking is best-effort and must not fail a request.
+    """
+
+    def __init__(
+            self,
+            handler: Callable[[Any], None],
+            workers: int = 4,
+            max_queue: int = 10000,
+            overflow: str = DROP_NEWEST,
+            block_timeout: float = 0.05,
+            name: str = 'dispatch'
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}")
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.name = name
+        self._cond = threading.Condition()
+        self._pending: deque = deque()  # (job, enqueued_at)
+        self._active = 0
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.total_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+        self.last_lag_seconds = 0.0
+
+    def submit(self, job: Any) -> bool:
+        """Queue a job; False if it was dropped by the overflow policy"""
+        with self._cond:
+            if self._stopping:
+                self.dropped += 1
+                return False
+            if len(self._pending) >= self.max_queue:
+                if self.overflow == DROP_OLDEST:
+                    self._pending.popleft()
+                    self.dropped += 1
+                elif self.overflow == BLOCK:
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._pending) >= self.max_queue and not self._stopping:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                if len(self._pending) >= self.max_queue or self._stopping:
+                    self.dropped += 1
+                    return False
+            self._pending.append((job, time.monotonic()))
+            self.enqueued += 1
+            self._cond.notify_all()
+        if len(self._threads) < self.workers:
+            self.start()
+        return True
+
+    def start(self) -> None:
+        with self._cond:
+            self._stopping = False
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._run, name=f'{self.name}-{len(self._threads)}', daemon=True
+                )
+                self._threads.append(thread)
+                thread.start()
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued job has been handled; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._active:
+                if not self._threads:
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        """Drain the queue, then stop the workers; jobs left after `timeout` are dropped"""
+        self.drain(timeout)
+        with self._cond:
+            self._stopping = True
+            threads, self._threads = self._threads, []
+            self._cond.notify_all()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        with self._cond:
+            if self._pending:
+                logger.warning(f"{self.name}: dropping {len(self._pending)} undelivered jobs at shutdown")
+                self.dropped += len(self._pending)
+                self._pending.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, lag (time from submit to pick-up) and outcome counters"""
+        with self._cond:
+            depth = len(self._pending)
+            oldest_age = time.monotonic() - self._pending[0][1] if self._pending else 0.0
+            active = self._active
+            picked = self.processed + self.failed + active
+        return {
+            'depth': depth,
+            'active': active,
+            'max_queue': self.max_queue,
+            'workers': self.workers,
+            'overflow': self.overflow,
+            'oldest_pending_seconds': oldest_age,
+            'enqueued': self.enqueued,
+            'processed': self.processed,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'last_lag_ms': self.last_lag_seconds * 1000,
+            'avg_lag_ms': self.total_lag_seconds / picked * 1000 if picked else 0.0,
+            'max_lag_ms': self.max_lag_seconds * 1000,
+        }
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                job, enqueued_at = self._pending.popleft()
+                self._active += 1
+                lag = time.monotonic() - enqueued_at
+                self.last_lag_seconds = lag
+                self.total_lag_seconds += lag
+                self.max_lag_seconds = max(self.max_lag_seconds, lag)
+                # Room was made: wake submitters blocked by the BLOCK policy
+                self._cond.notify_all()
+            failed = False
+            try:
+                self.handler(job)
+            except Exception as e:
+                failed = True
+                logger.error(f"{self.name}: job failed: {str(e)}", exc_info=True)
+            with self._cond:
+                self._active -= 1
+                if failed:
+                    self.failed += 1
+                else:
+                    self.processed += 1
+                self._cond.notify_all()
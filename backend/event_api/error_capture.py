@@ -1,14 +1,22 @@
 """
 Error capture seam for unhandled exceptions with structured logging
 """
-import json
+import hashlib
 import logging
+import threading
+import time
 import traceback
 import sys
-from typing import Dict, Any, Optional
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
 from django.http import HttpRequest
 
+from . import structured_log
+
 logger = logging.getLogger(__name__)
+log = structured_log.get_logger(__name__)
 
 
 class DeliberateError(Exception):
@@ -16,17 +24,109 @@ class DeliberateError(Exception):
     pass
 
 
+def exception_fingerprint(exception: BaseException, frames: int = 5) -> str:
+    """
+    Stable id for "the same error": the exception type plus the code location
+    of its innermost `frames` traceback frames. Messages are left out, since
+    they usually carry per-request values. Reads no source files.
+    """
+    exception_type = type(exception)
+    parts = [f"{exception_type.__module__}.{exception_type.__qualname__}"]
+    locations = [
+        f"{frame.f_code.co_filename}:{frame.f_code.co_name}:{lineno}"
+        for frame, lineno in traceback.walk_tb(exception.__traceback__)
+    ]
+    parts.extend(locations[-frames:] if frames else [])
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()[:16]
+
+
+class ExceptionDeduplicator:
+    """
+    Counts occurrences per fingerprint in fixed windows of `window` seconds.
+    The first `limit` occurrences in a window should be logged; later ones are
+    only counted. Tracks at most `max_fingerprints`, forgetting the least
+    recently seen.
+    """
+
+    def __init__(self, limit: int = 5, window: float = 60.0, max_fingerprints: int = 1000):
+        self.limit = limit
+        self.window = window
+        self.max_fingerprints = max_fingerprints
+        self._lock = threading.Lock()
+        # fingerprint -> [window_started, count_in_window, suppressed_in_previous_window]
+        self._seen: OrderedDict = OrderedDict()
+
+        self.logged = 0
+        self.suppressed = 0
+
+    def record(self, fingerprint: str) -> Tuple[bool, int, int]:
+        """
+        (log it?, occurrences in this window, occurrences suppressed in the
+        previous window and not yet reported)
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._seen.get(fingerprint)
+            if state is None:
+                state = self._seen[fingerprint] = [now, 0, 0]
+                if len(self._seen) > self.max_fingerprints:
+                    self._seen.popitem(last=False)
+            else:
+                self._seen.move_to_end(fingerprint)
+                if now - state[0] >= self.window:
+                    state[2] += max(0, state[1] - self.limit)
+                    state[0], state[1] = now, 0
+            state[1] += 1
+            if state[1] > self.limit:
+                self.suppressed += 1
+                return False, state[1], 0
+            self.logged += 1
+            unreported, state[2] = state[2], 0
+            return True, state[1], unreported
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'fingerprints': len(self._seen),
+                'logged': self.logged,
+                'suppressed': self.suppressed,
+                'limit': self.limit,
+                'window': self.window,
+            }
+
+
 class ErrorCaptureMiddleware:
     """
-    Middleware to capture unhandled exceptions and log them in structured format
+    Middleware to capture unhandled exceptions and log them in structured format.
+    Works in both sync and async stacks, so async views under ASGI are not
+    pushed onto a thread by this middleware.
+
+    Repeats of the same exception are deduplicated by fingerprint: only the
+    first few per window pay for traceback formatting and a log line.
     """
+    sync_capable = True
+    async_capable = True
     
     def __init__(self, get_response):
         self.get_response = get_response
+        self.fingerprint_frames = getattr(settings, 'ERROR_CAPTURE_FINGERPRINT_FRAMES', 5)
+        self.deduplicator = ExceptionDeduplicator(
+            limit=getattr(settings, 'ERROR_CAPTURE_DEDUP_LIMIT', 5),
+            window=getattr(settings, 'ERROR_CAPTURE_DEDUP_WINDOW', 60.0),
+        )
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
     
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
         response = self.get_response(request)
         return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return response
     
     def process_exception(self, request, exception):
         """
@@ -37,9 +137,16 @@ class ErrorCaptureMiddleware:
     
     def _log_exception(self, exception: Exception, request: Optional[HttpRequest] = None) -> None:
         """
-        Log exception in structured JSON format with FANCYLOG: prefix
+        Log exception as a structured FANCYLOG entry, unless its fingerprint
+        was already logged `limit` times this window. The entry is encoded by
+        the log handler, off the request thread.
         """
         try:
+            fingerprint = exception_fingerprint(exception, self.fingerprint_frames)
+            should_log, occurrences, suppressed = self.deduplicator.record(fingerprint)
+            if not should_log:
+                return
+
             request_info = {}
             if request:
                 request_info = {
@@ -59,14 +166,16 @@ class ErrorCaptureMiddleware:
                     'exception_type': type(exception).__name__,
                     'module': exception.__class__.__module__,
                 },
+                'fingerprint': fingerprint,
+                'occurrences': occurrences,
+                'suppressed_in_previous_window': suppressed,
                 'stack_trace': self._get_stack_trace(exception),
                 'request': request_info,
                 'input': safe_input,
                 'timestamp': self._get_timestamp(),
             }
             
-            # Log with FANCYLOG: prefix
-            logger.error(f"FANCYLOG:{json.dumps(log_entry, default=str)}")
+            log.error('exception', 'FANCYLOG', **log_entry)
             
         except Exception as log_error:
             logger.error(f"Failed to log exception: {log_error}", exc_info=True)
@@ -125,15 +234,17 @@ class ErrorCaptureMiddleware:
         return datetime.utcnow().isoformat() + 'Z'
 
 
-def trigger_explode_error(request: HttpRequest) -> None:
+def trigger_explode_error(request: HttpRequest, data: Optional[Dict[str, Any]] = None) -> None:
     """
     Trigger an exception if event == "explode"
-    This is a deliberately triggered error path for testing
+    This is a deliberately triggered error path for testing.
+    `data` defaults to the DRF request.data; plain Django views pass their parsed body.
     """
     try:
-        data = getattr(request, 'data', {})
+        if data is None:
+            data = getattr(request, 'data', {})
         if isinstance(data, dict) and data.get('event') == 'explode':
-            logger.warning("Deliberate error triggered: event == 'explode'")
+            log.warning('exception', "Deliberate error triggered: event == 'explode'", path=request.path)
             
             raise DeliberateError(
                 f"BOOM! Event 'explode' triggered at {request.path} "
@@ -0,0 +1,204 @@
+"""
+GET /v1/events filters beyond user_id
+
+    ?event=page_view&event=signup        one or more event names (or event=a,b)
+    ?since=2026-01-07T10:00:00Z          inclusive lower bound
+    ?until=2026-01-07T11:00:00Z          exclusive upper bound
+    ?time_field=client_ts                what since/until apply to (default received_at)
+    ?metadata.plan=premium               top-level metadata key equals value
+
+A metadata filter matches a string value equal to its text, or any other
+scalar equal to the JSON the text spells, so `metadata.count=3` matches "3",
+3 and 3.0, and `metadata.beta=true` matches "true" and true. Pages stay
+newest first by received_at, and a next_cursor is only valid with the same
+filters.
+"""
+import json
+import re
+from datetime import timezone
+from typing import Any, Dict, FrozenSet, Iterator, Optional, Tuple
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .pagination import MAX_EPOCH_US, MIN_EPOCH_US
+from .storage import from_epoch_us, metadata_text, to_epoch_us
+
+TIME_FIELDS = ('received_at', 'client_ts')
+MAX_EVENT_NAMES = 20
+MAX_METADATA_FILTERS = 5
+METADATA_PREFIX = 'metadata.'
+# Single underscores only: a double one would read as a nested lookup in the ORM
+_METADATA_KEY_RE = re.compile(r'^(?!.*__)[A-Za-z0-9_-]{1,64}$')
+_NOT_SCALAR = object()
+
+
+class EventFilter:
+    """
+    One GET's filters. Times are epoch microseconds, like EventRecord's;
+    metadata values are held as given. `scalar_texts` has, per metadata
+    filter, metadata_text() of the JSON scalar it spells (None if it spells
+    none), which is what non-string values are compared with.
+    """
+    __slots__ = ('events', 'time_field', 'since_us', 'until_us', 'metadata', 'scalar_texts')
+
+    def __init__(
+            self,
+            events: Optional[FrozenSet[str]] = None,
+            time_field: str = 'received_at',
+            since_us: Optional[int] = None,
+            until_us: Optional[int] = None,
+            metadata: Tuple[Tuple[str, str], ...] = ()
+    ):
+        self.events = events
+        self.time_field = time_field
+        self.since_us = since_us
+        self.until_us = until_us
+        self.metadata = metadata
+        self.scalar_texts = tuple(_scalar_text(text) for _, text in metadata)
+
+    def matches(self, record) -> bool:
+        """Whether a cached EventRecord passes every filter"""
+        if self.events is not None and record.event not in self.events:
+            return False
+        if self.since_us is not None or self.until_us is not None:
+            value = record.received_at_us if self.time_field == 'received_at' else record.client_ts_us
+            if self.since_us is not None and value < self.since_us:
+                return False
+            if self.until_us is not None and value >= self.until_us:
+                return False
+        if self.metadata:
+            metadata = record.metadata
+            for (key, text), scalar_text in zip(self.metadata, self.scalar_texts):
+                if key not in metadata:
+                    return False
+                value = metadata[key]
+                if isinstance(value, str):
+                    if value != text:
+                        return False
+                elif metadata_text(value) != scalar_text:
+                    return False
+        return True
+
+    def metadata_texts(self) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+        """(key, the metadata_text() renderings a filter matches) per metadata filter"""
+        for (key, text), scalar_text in zip(self.metadata, self.scalar_texts):
+            yield key, (text,) if scalar_text in (None, text) else (text, scalar_text)
+
+    def q(self) -> Q:
+        """The same filters for Event.objects"""
+        condition = Q()
+        if self.events is not None:
+            condition &= Q(event__in=sorted(self.events))
+        if self.since_us is not None:
+            condition &= Q(**{f'{self.time_field}__gte': from_epoch_us(self.since_us)})
+        if self.until_us is not None:
+            condition &= Q(**{f'{self.time_field}__lt': from_epoch_us(self.until_us)})
+        for key, text in self.metadata:
+            # The stored value may be the string itself or the JSON scalar it spells.
+            # The explicit __exact keeps keys like "contains" or "in" from
+            # being read as lookups.
+            match = Q(**{f'metadata__{key}__exact': text})
+            scalar = _json_scalar(text)
+            if scalar is not _NOT_SCALAR:
+                match |= Q(**{f'metadata__{key}__exact': scalar})
+            condition &= match
+        return condition
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__[:-1])
+        return f'EventFilter({fields})'
+
+
+def _json_scalar(text: str) -> Any:
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return _NOT_SCALAR
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return _NOT_SCALAR
+
+
+def _scalar_text(text: str) -> Optional[str]:
+    scalar = _json_scalar(text)
+    return None if scalar is _NOT_SCALAR else metadata_text(scalar)
+
+
+def _parse_time(value: str) -> Optional[int]:
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        return None
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    value = to_epoch_us(parsed)
+    # An offset can put e.g. 0001-01-01T00:00+05:00 before the first UTC datetime
+    if not MIN_EPOCH_US <= value <= MAX_EPOCH_US:
+        return None
+    return value
+
+
+def parse_event_names(query_params, details: Dict[str, Any]) -> Optional[FrozenSet[str]]:
+    """The `event` parameter's names, or None; problems are added to `details`"""
+    names = [name.strip() for value in query_params.getlist('event') for name in value.split(',')]
+    if not names:
+        return None
+    if not all(names) or any(len(name) > 64 for name in names):
+        details['event'] = ["Event names must be non-empty and at most 64 characters"]
+    elif len(set(names)) > MAX_EVENT_NAMES:
+        details['event'] = [f"Give at most {MAX_EVENT_NAMES} event names"]
+    else:
+        return frozenset(names)
+    return None
+
+
+def parse_time_range(query_params, details: Dict[str, Any]) -> Tuple[Optional[int], Optional[int]]:
+    """`since` and `until` as epoch microseconds; problems are added to `details`"""
+    bounds = {}
+    for name in ('since', 'until'):
+        value = query_params.get(name)
+        if value:
+            bounds[name] = _parse_time(value)
+            if bounds[name] is None:
+                details[name] = ["Must be an ISO 8601 datetime"]
+    since_us, until_us = bounds.get('since'), bounds.get('until')
+    if since_us is not None and until_us is not None and since_us >= until_us:
+        details['until'] = ["Must be later than since"]
+    return since_us, until_us
+
+
+def parse_filter(query_params) -> Tuple[Optional[EventFilter], Optional[Dict[str, Any]]]:
+    """
+    EventFilter from GET query parameters: (filter, None), (None, None) when
+    no filter was given, or (None, details) naming the invalid parameters.
+    """
+    details = {}
+
+    events = parse_event_names(query_params, details)
+
+    time_field = query_params.get('time_field', 'received_at')
+    if time_field not in TIME_FIELDS:
+        details['time_field'] = ["Must be received_at or client_ts"]
+
+    since_us, until_us = parse_time_range(query_params, details)
+
+    metadata = []
+    for param in sorted(query_params):
+        if not param.startswith(METADATA_PREFIX):
+            continue
+        key = param[len(METADATA_PREFIX):]
+        if not _METADATA_KEY_RE.match(key):
+            details[param] = ["Metadata keys are 1-64 letters, digits, '-' or '_'"]
+        else:
+            metadata.append((key, query_params.get(param)))
+    if len(metadata) > MAX_METADATA_FILTERS:
+        details['metadata'] = [f"Give at most {MAX_METADATA_FILTERS} metadata filters"]
+
+    if details:
+        return None, details
+    if events is None and since_us is None and until_us is None and not metadata:
+        return None, None
+    return EventFilter(events, time_field, since_us, until_us, tuple(metadata)), None
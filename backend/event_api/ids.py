@@ -0,0 +1,54 @@
+"""
+Time-ordered event identifiers (ULID layout)
+"""
+import os
+import threading
+import time
+
+CROCKFORD_BASE32 = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_RANDOM_BITS = 80
+_RANDOM_MAX = (1 << _RANDOM_BITS) - 1
+
+
+def _encode(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        value, index = divmod(value, 32)
+        chars.append(CROCKFORD_BASE32[index])
+    return ''.join(reversed(chars))
+
+
+class ULIDGenerator:
+    """
+    Generates 26-character ULIDs: 48 bits of millisecond timestamp followed by
+    80 random bits, Crockford base32 encoded so string order is time order.
+
+    IDs are strictly increasing within a process: when the clock has not moved
+    on (or went backwards) the previous random part is incremented instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._last_random = 0
+
+    def new(self) -> str:
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._last_random = int.from_bytes(os.urandom(10), 'big')
+            elif self._last_random < _RANDOM_MAX:
+                self._last_random += 1
+            else:
+                self._last_ms += 1
+                self._last_random = int.from_bytes(os.urandom(10), 'big')
+            return _encode(self._last_ms, 10) + _encode(self._last_random, 16)
+
+
+_generator = ULIDGenerator()
+
+
+def new_event_id() -> str:
+    """Sortable event id, e.g. evt_01JH2Y6Q3V8T5M0XK7W9RZ4BCD"""
+    return f"evt_{_generator.new()}"
@@ -0,0 +1,263 @@
+"""
+Write path shared by the single-event and batch endpoints:
+build Event rows, persist them, update the cache and fan out to tracking
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics, outbox, rollups, structured_log, writebehind
+from .ids import new_event_id
+from .models import Event
+from .storage import EventRecord, memory_store
+from .tracking import tracking_client
+from .validation import validate_event
+
+logger = logging.getLogger(__name__)
+log = structured_log.get_logger(__name__)
+
+metrics.CACHE_EVENTS.set_function(lambda: len(memory_store))
+
+
+class IngestUnavailable(Exception):
+    """Events could not be accepted right now; the client should retry (503)"""
+    pass
+
+
+def build_event(validated_data: Dict[str, Any]) -> Event:
+    """
+    Unsaved Event for data that passed validate_event. The encoded metadata
+    rides along as `metadata_json` so tracking does not encode it again.
+    """
+    received_at = timezone.now()
+    event = Event(
+        id=new_event_id(),
+        received_at=received_at,
+        client_ts=validated_data.get('client_ts', received_at),
+        event=validated_data['event'],
+        user_id=validated_data['user_id'],
+        metadata=validated_data.get('metadata', {}),
+        request_id=validated_data['request_id']
+    )
+    event.metadata_json = validated_data.get('metadata_json')
+    return event
+
+
+def store_events(events: List[Event]) -> None:
+    """
+    Persist events with one INSERT, then add them to the cache in one pass.
+
+    With EVENT_WRITE_BEHIND_ENABLED the INSERT is handed to the write-behind
+    buffer instead. In "accepted" ack mode the events are cached (and so
+    readable) straight away; in "durable" mode this waits for the commit.
+    Raises IngestUnavailable when the buffer is full or the commit fails.
+    Tracking outbox rows staged on the events, and rollup counts, are
+    committed with them.
+    """
+    started = time.perf_counter()
+    if settings.EVENT_WRITE_BEHIND_ENABLED:
+        ticket = _submit_write_behind(events)
+        if _durable_ack() and not ticket.wait(settings.EVENT_WRITE_BEHIND_DURABLE_TIMEOUT):
+            raise IngestUnavailable("Events were not committed in time")
+    else:
+        outbox.save_events(events)
+    metrics.DB_SAVE_SECONDS.observe(time.perf_counter() - started)
+    _cache_events(events)
+    metrics.EVENTS_ACCEPTED.inc(len(events))
+
+
+async def astore_events(events: List[Event]) -> None:
+    """store_events for async views: the INSERT (or durable wait) is awaited"""
+    started = time.perf_counter()
+    if settings.EVENT_WRITE_BEHIND_ENABLED:
+        ticket = _submit_write_behind(events)
+        if _durable_ack() and not await asyncio.to_thread(ticket.wait, settings.EVENT_WRITE_BEHIND_DURABLE_TIMEOUT):
+            raise IngestUnavailable("Events were not committed in time")
+    elif settings.TRACKING_OUTBOX_ENABLED or rollups.enabled():
+        await sync_to_async(outbox.save_events)(events)
+    else:
+        await Event.objects.abulk_create(events)
+    metrics.DB_SAVE_SECONDS.observe(time.perf_counter() - started)
+    _cache_events(events)
+    metrics.EVENTS_ACCEPTED.inc(len(events))
+
+
+def _submit_write_behind(events: List[Event]) -> writebehind.WriteTicket:
+    try:
+        return writebehind.write_behind.submit(events)
+    except writebehind.BufferFull as e:
+        raise IngestUnavailable(str(e)) from e
+
+
+def _durable_ack() -> bool:
+    return settings.EVENT_WRITE_BEHIND_ACK == 'durable'
+
+
+def _cache_events(events: List[Event]) -> None:
+    started = time.perf_counter()
+    before = len(memory_store)
+    memory_store.add_many([EventRecord.from_model(event) for event in events])
+    metrics.CACHE_UPDATE_SECONDS.observe(time.perf_counter() - started)
+    log.debug('cache', 'memory_store append', added=len(events), before=before, after=lambda: len(memory_store))
+
+
+def track_events(events: List[Event]) -> None:
+    """Forward stored events to the analytics vendors; failures never propagate"""
+    for event in events:
+        try:
+            tracking_client.track_event(
+                user_id=event.user_id,
+                event_name=event.event,
+                properties=_tracking_properties(event),
+                request_id=event.request_id,
+                metadata_json=getattr(event, 'metadata_json', None))
+
+        except Exception as e:
+            logger.error(f"Tracking error for event {event.id}: {str(e)}", exc_info=True)
+
+
+async def atrack_events(events: List[Event]) -> None:
+    """track_events for async views: vendor I/O is awaited, not slept through"""
+    for event in events:
+        try:
+            await tracking_client.atrack_event(
+                user_id=event.user_id,
+                event_name=event.event,
+                properties=_tracking_properties(event),
+                request_id=event.request_id,
+                metadata_json=getattr(event, 'metadata_json', None))
+
+        except Exception as e:
+            logger.error(f"Tracking error for event {event.id}: {str(e)}", exc_info=True)
+
+
+def _tracking_properties(event: Event) -> Dict[str, Any]:
+    return {
+        'event_id': event.id,
+        'client_ts': event.client_ts.isoformat(),
+        'metadata': event.metadata,
+        'source': 'api_v1'
+    }
+
+
+def stage_tracking(events: List[Event]) -> bool:
+    """
+    With TRACKING_OUTBOX_ENABLED, encode each event's vendor payloads onto it
+    for store_events to write to the outbox, and return True: the events must
+    then not be tracked inline.
+    """
+    if not settings.TRACKING_OUTBOX_ENABLED:
+        return False
+    for event in events:
+        event.tracking_bodies = tracking_client.encode_event(
+            user_id=event.user_id,
+            event_name=event.event,
+            properties=_tracking_properties(event),
+            request_id=event.request_id,
+            metadata_json=getattr(event, 'metadata_json', None))
+    return True
+
+
+def accept_events(events: List[Event]) -> None:
+    staged = stage_tracking(events)
+    store_events(events)
+    if not staged:
+        track_events(events)
+
+
+async def aaccept_events(events: List[Event]) -> None:
+    staged = stage_tracking(events)
+    await astore_events(events)
+    if not staged:
+        await atrack_events(events)
+
+
+def flush_pending_writes() -> None:
+    """Commit write-behind events so a following DELETE cannot be undone by a later flush"""
+    if settings.EVENT_WRITE_BEHIND_ENABLED:
+        writebehind.write_behind.flush()
+
+
+def iter_lines(stream, max_line_bytes: int) -> Iterator[Tuple[int, Optional[bytes]]]:
+    """
+    (line_number, line) pairs read incrementally from a binary stream.
+    Lines longer than `max_line_bytes` are skipped and yielded as None.
+    """
+    line_number = 0
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            return
+        line_number += 1
+        if len(line) > max_line_bytes and not line.endswith(b'\n'):
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(max_line_bytes + 1)
+            yield line_number, None
+            continue
+        yield line_number, line
+
+
+def ingest_ndjson(stream, request_id: str, track: bool = True) -> Dict[str, Any]:
+    """
+    Validate and store newline-delimited JSON events from `stream`.
+
+    Events are accepted EVENT_STREAM_CHUNK_SIZE at a time, so memory stays
+    constant however long the body is. Returns a per-line summary: counts plus
+    the first EVENT_STREAM_MAX_ERRORS rejected lines with their errors. If the
+    store becomes unavailable, ingestion stops and `unavailable` is set; every
+    event counted as accepted before that point was stored.
+    """
+    chunk_size = settings.EVENT_STREAM_CHUNK_SIZE
+    max_errors = settings.EVENT_STREAM_MAX_ERRORS
+    summary: Dict[str, Any] = {'lines': 0, 'accepted': 0, 'rejected': 0, 'errors': [], 'errors_truncated': False}
+    chunk: List[Event] = []
+
+    def reject(line_number: int, details: Any) -> None:
+        summary['rejected'] += 1
+        if len(summary['errors']) < max_errors:
+            summary['errors'].append({'line': line_number, 'details': details})
+        else:
+            summary['errors_truncated'] = True
+
+    def flush() -> None:
+        staged = track and stage_tracking(chunk)
+        store_events(chunk)
+        if track and not staged:
+            track_events(chunk)
+        summary['accepted'] += len(chunk)
+        chunk.clear()
+
+    try:
+        for line_number, line in iter_lines(stream, settings.EVENT_STREAM_MAX_LINE_BYTES):
+            summary['lines'] = line_number
+            if line is None:
+                reject(line_number, {'non_field_errors': ['Line exceeds maximum length.']})
+                continue
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                reject(line_number, {'non_field_errors': ['Invalid JSON.']})
+                continue
+            if not isinstance(item, dict):
+                reject(line_number, {'non_field_errors': ['Expected an event object.']})
+                continue
+            validated, errors = validate_event(item, request_id=item.get('request_id') or request_id)
+            if errors:
+                reject(line_number, errors)
+                continue
+            chunk.append(build_event(validated))
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+    except IngestUnavailable as e:
+        summary['unavailable'] = str(e)
+    return summary
@@ -0,0 +1,104 @@
+"""
+Logging handlers and formatters that keep log I/O off the request path
+
+NonBlockingQueueHandler puts records on a bounded queue and returns; a
+QueueListener thread formats them and hands them to the real handlers
+(console, file, ...). Configure it through LOGGING, naming the handlers it
+feeds:
+
+    'queue': {
+        'class': 'event_api.log_handlers.NonBlockingQueueHandler',
+        'queue': {'()': 'queue.Queue', 'maxsize': 10000},
+        'handlers': ['console'],
+    }
+
+JSONFormatter writes each record as one JSON object per line.
+"""
+import atexit
+import json
+import logging
+import queue
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler
+
+from .structured_log import StructuredMessage
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks the caller: when the queue is full the
+    record is dropped and counted in `dropped`. The listener thread is
+    started by the first record and stopped (after draining) at exit, or
+    earlier by stop_listener().
+
+    Records are queued unformatted, so building the message, rendering
+    structured fields and formatting tracebacks all happen on the listener
+    thread. The queue is in-process, so nothing needs to be pickled.
+    """
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+        self._start_lock = threading.Lock()
+        self._started = False
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if not self._started:
+            self._start_listener()
+        super().emit(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Queued as is: unlike QueueHandler.prepare, nothing here modifies the
+        # record, so other handlers can share it and no copy is needed
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start_listener(self) -> None:
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+            if self.listener is not None:
+                self.listener.start()
+                atexit.register(self.stop_listener)
+
+    def stop_listener(self) -> None:
+        """Drain the queue and stop the listener now rather than at exit"""
+        with self._start_lock:
+            if not self._started or self.listener is None:
+                return
+            atexit.unregister(self.stop_listener)
+            self.listener.stop()
+            self._started = False
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per record: timestamp, level, logger, category (for
+    structured records), message, the structured fields, and the formatted
+    exception if there is one.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+        }
+        category = getattr(record, 'category', None)
+        if category is not None:
+            entry['category'] = category
+        if isinstance(record.msg, StructuredMessage):
+            entry['message'] = record.msg.message
+            entry.update(record.msg.fields)
+        else:
+            entry['message'] = record.getMessage()
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from event_api import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute event rollups (EVENT_ROLLUP_BUCKETS) from the Event table. "
+        "Run with ingest paused: events stored meanwhile may be miscounted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', help="Only rebuild this user's rollups")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Events read per query")
+
+    def handle(self, *args, **options):
+        result = rollups.rebuild(user_id=options['user_id'], chunk_size=options['chunk_size'])
+        sizes = ', '.join(f"{size}s" for size in rollups.bucket_sizes())
+        self.stdout.write(self.style.SUCCESS(
+            f"Counted {result['events']} events into {result['rollups']} rollups ({sizes} buckets)"
+        ))
+        if not rollups.enabled():
+            self.stdout.write(self.style.WARNING(
+                "EVENT_ROLLUPS_ENABLED is off: new events will not be counted until it is enabled"
+            ))
@@ -0,0 +1,454 @@
+"""
+Pipeline metrics in Prometheus text format
+
+Counters, gauges and histograms for the ingest pipeline, served at /metrics.
+
+Recording is lock-light: every thread writes its own shard of each series
+(a short list of numbers), so observe() and inc() take no lock. Shards are
+only summed when /metrics is scraped. Shards of threads that have exited are
+folded into a single retired shard, so thread churn does not grow memory.
+
+Across processes (gunicorn workers), set METRICS_MULTIPROCESS_DIR to a
+directory shared by the workers. Each worker writes its totals there every
+METRICS_FLUSH_INTERVAL seconds, and a scrape served by any worker merges all
+the files. Counters and histograms are summed. Gauges are summed too, but
+only over workers that wrote recently, so a dead worker's gauges drop out.
+"""
+import atexit
+import bisect
+import functools
+import glob
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+from . import profiling
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Fold the shards of exited threads once this many are registered for a series
+_COMPACT_AT = 64
+
+
+class _Shards:
+    """One series' values, kept per thread and summed on read"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[Tuple[Any, List[float]]] = []  # (weakref to thread, values)
+        self._retired = [0.0] * size
+
+    def mine(self) -> List[float]:
+        values = getattr(self._local, 'values', None)
+        if values is None:
+            values = self._local.values = [0] * self.size
+            with self._lock:
+                if len(self._shards) >= _COMPACT_AT:
+                    self._compact()
+                self._shards.append((weakref.ref(threading.current_thread()), values))
+        return values
+
+    def total(self) -> List[float]:
+        with self._lock:
+            self._compact()
+            totals = list(self._retired)
+            for _, values in self._shards:
+                for i, value in enumerate(values):
+                    totals[i] += value
+        return totals
+
+    def _compact(self) -> None:
+        """Fold shards of exited threads into the retired shard; caller holds the lock"""
+        live = []
+        for thread_ref, values in self._shards:
+            thread = thread_ref()
+            if thread is None or not thread.is_alive():
+                for i, value in enumerate(values):
+                    self._retired[i] += value
+            else:
+                live.append((thread_ref, values))
+        self._shards = live
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional['Registry'] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child(())
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *values: str, **kwargs: str):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child(key))
+        return child
+
+    def _new_child(self, key: Tuple[str, ...]):
+        raise NotImplementedError
+
+    def _default(self):
+        """The unlabelled series, for metrics without labels"""
+        return self._children[()]
+
+    def collect(self) -> Dict[Tuple[str, ...], List[float]]:
+        """Current totals per label set"""
+        with self._lock:
+            children = list(self._children.items())
+        return {key: child.values() for key, child in children}
+
+
+class _CounterChild:
+    __slots__ = ('_shards',)
+
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount: float = 1) -> None:
+        self._shards.mine()[0] += amount
+
+    def values(self) -> List[float]:
+        return self._shards.total()
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self, key: Tuple[str, ...]):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ('value', 'function')
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the value from `function` at scrape time instead"""
+        self.function = function
+
+    def values(self) -> List[float]:
+        if self.function is not None:
+            try:
+                return [float(self.function())]
+            except Exception:
+                logger.exception("Gauge callback failed")
+                return [float('nan')]
+        return [self.value]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self, key: Tuple[str, ...]):
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._default().set_function(function)
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', '_shards')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # Per-bucket counts (not cumulative), then +Inf, count and sum
+        self._shards = _Shards(len(buckets) + 3)
+
+    def observe(self, value: float) -> None:
+        values = self._shards.mine()
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-2] += 1
+        values[-1] += value
+
+    def time(self) -> '_Timer':
+        return _Timer(self)
+
+    def values(self) -> List[float]:
+        return self._shards.total()
+
+
+class _StageChild(_HistogramChild):
+    """A stage histogram series that also reports to a profiled request"""
+    __slots__ = ('stage',)
+
+    def __init__(self, buckets: Tuple[float, ...], stage: str):
+        super().__init__(buckets)
+        self.stage = stage
+
+    def observe(self, value: float) -> None:
+        super().observe(value)
+        profiling.record_stage(self.stage, value)
+
+
+class _Timer:
+    __slots__ = ('child', 'started')
+
+    def __init__(self, child: _HistogramChild):
+        self.child = child
+
+    def __enter__(self) -> '_Timer':
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.child.observe(time.perf_counter() - self.started)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional['Registry'] = None, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self, key: Tuple[str, ...]):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def time(self) -> _Timer:
+        return self._default().time()
+
+
+class StageHistogram(Histogram):
+    """
+    Histogram labelled by pipeline stage. Observations are also added to the
+    request being profiled, for its Server-Timing header (event_api.profiling).
+    """
+
+    def __init__(self, name: str, documentation: str, registry: Optional['Registry'] = None,
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, ['stage'], registry, buckets)
+
+    def _new_child(self, key: Tuple[str, ...]):
+        return _StageChild(self.buckets, key[0])
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+
+    def snapshot(self) -> Dict[str, Dict[str, List[float]]]:
+        """{metric name: {label values as JSON: values}}, the format written for other processes"""
+        return {
+            name: {json.dumps(key): values for key, values in metric.collect().items()}
+            for name, metric in self.metrics.items()
+        }
+
+    def render(self, snapshot: Optional[Dict[str, Dict[str, List[float]]]] = None) -> str:
+        """Prometheus text exposition of `snapshot` (this process by default)"""
+        snapshot = self.snapshot() if snapshot is None else snapshot
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, values in sorted(snapshot.get(name, {}).items()):
+                labels = dict(zip(metric.labelnames, json.loads(key)))
+                if metric.kind == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + (float('inf'),), values):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else _format_value(bound)
+                        lines.append(f"{name}_bucket{_format_labels({**labels, 'le': le})} {_format_value(cumulative)}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(values[-1])}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {_format_value(values[-2])}")
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(values[0])}")
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    pairs = (
+        '{}="{}"'.format(name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return 'NaN'
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+REGISTRY = Registry()
+
+
+class MultiProcessWriter:
+    """
+    Writes this process's snapshot to `<directory>/metrics-<pid>.json` every
+    `interval` seconds (and at exit), and merges every process's file on read.
+    """
+
+    def __init__(self, directory: str, interval: float = 5.0, registry: Registry = REGISTRY):
+        self.directory = directory
+        self.interval = interval
+        self.registry = registry
+        self.path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='metrics-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.write()
+
+    def write(self) -> None:
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'written_at': time.time(), 'metrics': self.registry.snapshot()}, f)
+        os.replace(temporary, self.path)
+
+    def merged(self) -> Dict[str, Dict[str, List[float]]]:
+        """Every process's totals combined; this process's are read fresh"""
+        self.write()
+        gauge_cutoff = time.time() - 3 * self.interval
+        merged: Dict[str, Dict[str, List[float]]] = {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue  # being replaced or truncated; its next write will count
+            fresh = data.get('written_at', 0) >= gauge_cutoff
+            for name, series in data.get('metrics', {}).items():
+                metric = self.registry.metrics.get(name)
+                if metric is None or (metric.kind == 'gauge' and not fresh):
+                    continue
+                target = merged.setdefault(name, {})
+                for key, values in series.items():
+                    totals = target.get(key)
+                    if totals is None:
+                        target[key] = list(values)
+                    else:
+                        for i, value in enumerate(values):
+                            totals[i] += value
+        return merged
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                logger.exception("Could not write metrics to %s", self.path)
+
+
+_writer: Optional[MultiProcessWriter] = None
+_writer_lock = threading.Lock()
+
+
+def _multiprocess_writer() -> Optional[MultiProcessWriter]:
+    """Started on first use, so each forked worker writes its own file"""
+    global _writer
+    directory = getattr(settings, 'METRICS_MULTIPROCESS_DIR', '')
+    if not directory:
+        return None
+    if _writer is None or _writer.path != os.path.join(directory, f'metrics-{os.getpid()}.json'):
+        with _writer_lock:
+            if _writer is None or _writer.path != os.path.join(directory, f'metrics-{os.getpid()}.json'):
+                _writer = MultiProcessWriter(directory, getattr(settings, 'METRICS_FLUSH_INTERVAL', 5.0))
+                _writer.start()
+    return _writer
+
+
+def render_metrics() -> str:
+    """The /metrics body: this process's metrics, or every worker's when multiprocess"""
+    writer = _multiprocess_writer()
+    return REGISTRY.render(writer.merged() if writer is not None else None)
+
+
+def timed(histogram_child) -> Callable:
+    """Decorator observing the duration of each call, sync or async"""
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    histogram_child.observe(time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram_child.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+# The pipeline's metrics
+
+REQUEST_SECONDS = Histogram('event_api_request_seconds', 'Time handling event API requests', ['endpoint', 'method'])
+STAGE_SECONDS = StageHistogram('event_api_stage_seconds', 'Time spent per ingest pipeline stage')
+EVENTS_ACCEPTED = Counter('event_api_events_accepted_total', 'Events stored')
+EVENTS_REJECTED = Counter('event_api_events_rejected_total', 'Events rejected by validation')
+EVENTS_DELETED = Counter('event_api_events_deleted_total', 'Events deleted from the database')
+VENDOR_FAILURES = Counter('event_api_vendor_failures_total', 'Failed vendor sends', ['vendor', 'reason'])
+CACHE_EVENTS = Gauge('event_api_cache_events', 'Events held in the in-memory cache')
+DISPATCH_QUEUE_DEPTH = Gauge('event_api_dispatch_queue_depth', 'Tracking jobs waiting for a dispatch worker')
+
+# Stage children, looked up once instead of per observation
+PARSE_SECONDS = STAGE_SECONDS.labels(stage='parse')
+VALIDATE_SECONDS = STAGE_SECONDS.labels(stage='validate')
+DB_SAVE_SECONDS = STAGE_SECONDS.labels(stage='db_save')
+CACHE_UPDATE_SECONDS = STAGE_SECONDS.labels(stage='cache_update')
+TRACKING_BUILD_SECONDS = STAGE_SECONDS.labels(stage='tracking_build')
+TRACKING_SEND_SECONDS = STAGE_SECONDS.labels(stage='tracking_send')
+ROLLUP_UPDATE_SECONDS = STAGE_SECONDS.labels(stage='rollup_update')
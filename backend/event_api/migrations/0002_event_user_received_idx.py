@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-16 23:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['user_id', '-received_at', '-id'], name='event_user_received_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-16 23:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_api', '0002_event_user_received_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackingOutbox',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event_id', models.CharField(max_length=36)),
+                ('vendor', models.CharField(max_length=16)),
+                ('body', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('next_attempt_at', models.DateTimeField()),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('dead_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['vendor', 'next_attempt_at'], name='outbox_vendor_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.0.1 on 2026-10-17 00:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_api', '0003_tracking_outbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['user_id', 'event', '-received_at', '-id'], name='event_user_event_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['user_id', 'client_ts'], name='event_user_client_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-17 00:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_api', '0004_event_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventRollup',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('user_id', models.CharField(max_length=64)),
+                ('event', models.CharField(max_length=64)),
+                ('bucket_seconds', models.PositiveIntegerField()),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user_id', 'bucket_seconds', 'bucket_start', 'event'), name='rollup_bucket_unique')],
+            },
+        ),
+    ]
@@ -1,4 +1,29 @@
 from django.db import models
+from django.db.models import Q
+
+
+class EventQuerySet(models.QuerySet):
+
+    def page(self, user_id, limit, before=None, query=None):
+        """
+        Newest-first page of a user's events older than the `before`
+        (received_at, id) key. Served from the (user_id, received_at, id)
+        index, so deep pages cost the same as the first.
+
+        `query` is an EventFilter (event_api.filters). Event names use the
+        (user_id, event, received_at, id) index and client_ts ranges the
+        (user_id, client_ts) one; metadata is checked on the rows they select.
+        """
+        queryset = self.filter(user_id=user_id)
+        if query is not None:
+            queryset = queryset.filter(query.q())
+        if before is not None:
+            received_at, event_id = before
+            queryset = queryset.filter(
+                Q(received_at__lt=received_at) | Q(received_at=received_at, id__lt=event_id)
+            )
+        return queryset.order_by('-received_at', '-id')[:limit]
+
 
 class Event(models.Model):
     id = models.CharField(primary_key=True, max_length=36)
@@ -9,6 +34,63 @@ class Event(models.Model):
     metadata = models.JSONField(default=dict)
     request_id = models.CharField(max_length=64)
 
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', '-received_at', '-id'], name='event_user_received_idx'),
+            models.Index(fields=['user_id', 'event', '-received_at', '-id'], name='event_user_event_idx'),
+            models.Index(fields=['user_id', 'client_ts'], name='event_user_client_ts_idx'),
+        ]
+
     def __str__(self):
         return f"{self.id}: {self.event}"
 
+
+class TrackingOutbox(models.Model):
+    """
+    One vendor payload awaiting delivery, written in the same transaction as
+    its Event. Rows are deleted once delivered; `dead_at` is set when they
+    run out of attempts.
+    """
+    id = models.BigAutoField(primary_key=True)
+    event_id = models.CharField(max_length=36)
+    vendor = models.CharField(max_length=16)
+    body = models.TextField()
+    created_at = models.DateTimeField()
+    next_attempt_at = models.DateTimeField()
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    dead_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['vendor', 'next_attempt_at'], name='outbox_vendor_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.vendor}: {self.event_id}"
+
+
+class EventRollup(models.Model):
+    """
+    Number of a user's events with one name received in one time bucket.
+    `bucket_seconds` is the bucket size (one of EVENT_ROLLUP_BUCKETS) and
+    `bucket_start` a multiple of it since the epoch. Kept by event_api.rollups.
+    """
+    id = models.BigAutoField(primary_key=True)
+    user_id = models.CharField(max_length=64)
+    event = models.CharField(max_length=64)
+    bucket_seconds = models.PositiveIntegerField()
+    bucket_start = models.DateTimeField()
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user_id', 'bucket_seconds', 'bucket_start', 'event'], name='rollup_bucket_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.event} @ {self.bucket_start.isoformat()}/{self.bucket_seconds}s: {self.count}"
@@ -0,0 +1,145 @@
+"""
+Transactional tracking outbox
+
+With TRACKING_OUTBOX_ENABLED, ingest does not call the vendors. Each event's
+encoded vendor payloads are written to TrackingOutbox in the same transaction
+as the Event rows (save_events). drain_outbox(), run by the Celery task in
+event_api.tasks, then delivers them per vendor in batches. Failed batches are
+retried with exponential backoff, and a vendor whose circuit breaker is open
+is skipped until it recovers. Vendor outages therefore never reach the
+request path, and events are delivered once the vendor is back.
+"""
+import logging
+import random
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import rollups
+from .models import Event, TrackingOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def outbox_rows(events: List[Event]) -> List[TrackingOutbox]:
+    """Rows for the vendor payloads staged on events as `tracking_bodies`"""
+    now = timezone.now()
+    return [
+        TrackingOutbox(event_id=event.id, vendor=vendor, body=body.decode(), created_at=now, next_attempt_at=now)
+        for event in events
+        for vendor, body in (getattr(event, 'tracking_bodies', None) or {}).items()
+    ]
+
+
+def save_events(events: List[Event]) -> None:
+    """
+    Insert events in one transaction with their outbox rows, if any, and
+    their rollup counts when rollups are enabled
+    """
+    rows = outbox_rows(events)
+    count = rollups.enabled()
+    if not rows and not count:
+        Event.objects.bulk_create(events)
+        return
+    with transaction.atomic():
+        Event.objects.bulk_create(events)
+        if rows:
+            TrackingOutbox.objects.bulk_create(rows)
+        if count:
+            rollups.add_events(events)
+
+
+def backoff_delay(attempts: int) -> float:
+    """Seconds before retry number `attempts`: exponential, capped, with jitter"""
+    base = settings.TRACKING_OUTBOX_BACKOFF_BASE
+    delay = min(settings.TRACKING_OUTBOX_BACKOFF_MAX, base * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def drain_outbox(client=None, batch_size: Optional[int] = None, max_batches: int = 10) -> Dict[str, Any]:
+    """
+    Deliver due outbox rows, up to `max_batches` batches per vendor.
+    Returns per-vendor counts of delivered, retried and dead rows, and
+    whether the vendor was skipped because its circuit was open.
+    """
+    if client is None:
+        from .tracking import tracking_client as client
+    batch_size = batch_size or settings.TRACKING_OUTBOX_BATCH_SIZE
+    result = {}
+    for vendor, breaker in client.breakers.items():
+        counts = {'delivered': 0, 'retried': 0, 'dead': 0, 'circuit_open': False}
+        result[vendor] = counts
+        for _ in range(max_batches):
+            if not breaker.allow():
+                counts['circuit_open'] = True
+                break
+            rows = _claim(vendor, batch_size)
+            if not rows:
+                breaker.release()
+                break
+            try:
+                client.send_batch(vendor, [row.body.encode() for row in rows])
+            except Exception as e:
+                breaker.record_failure()
+                logger.warning(f"Outbox delivery of {len(rows)} events to {vendor} failed: {str(e)}")
+                dead = _reschedule(rows, str(e))
+                counts['retried'] += len(rows) - dead
+                counts['dead'] += dead
+                break
+            breaker.record_success()
+            TrackingOutbox.objects.filter(id__in=[row.id for row in rows]).delete()
+            counts['delivered'] += len(rows)
+            if len(rows) < batch_size:
+                break
+    return result
+
+
+def outbox_stats() -> Dict[str, Any]:
+    """Pending and dead rows per vendor"""
+    rows = TrackingOutbox.objects.values('vendor').annotate(
+        pending=Count('id', filter=Q(dead_at__isnull=True)),
+        dead=Count('id', filter=Q(dead_at__isnull=False)),
+    )
+    return {row['vendor']: {'pending': row['pending'], 'dead': row['dead']} for row in rows}
+
+
+def _claim(vendor: str, limit: int) -> List[TrackingOutbox]:
+    """
+    Lease up to `limit` due rows by pushing their next_attempt_at past the
+    lease, so concurrent workers do not deliver them twice. A worker that dies
+    mid-delivery leaves them to be retried when the lease runs out.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            TrackingOutbox.objects.select_for_update(skip_locked=True)
+            .filter(vendor=vendor, dead_at__isnull=True, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:limit]
+        )
+        if rows:
+            TrackingOutbox.objects.filter(id__in=[row.id for row in rows]).update(
+                next_attempt_at=now + timedelta(seconds=settings.TRACKING_OUTBOX_LEASE)
+            )
+    return rows
+
+
+def _reschedule(rows: List[TrackingOutbox], error: str) -> int:
+    """Back off failed rows; returns how many ran out of attempts"""
+    now = timezone.now()
+    dead = 0
+    for row in rows:
+        row.attempts += 1
+        row.last_error = error[:1000]
+        if row.attempts >= settings.TRACKING_OUTBOX_MAX_ATTEMPTS:
+            row.dead_at = now
+            dead += 1
+        else:
+            row.next_attempt_at = now + timedelta(seconds=backoff_delay(row.attempts))
+    TrackingOutbox.objects.bulk_update(rows, ['attempts', 'last_error', 'dead_at', 'next_attempt_at'])
+    if dead:
+        logger.error(f"{dead} outbox rows for {rows[0].vendor} exhausted their attempts")
+    return dead
@@ -0,0 +1,38 @@
+"""
+Opaque keyset cursors for GET /v1/events
+
+A cursor is the (received_at, id) sort key of the last event on a page. The
+next page is every event strictly older than that key, so a page costs
+O(limit) however deep it is.
+"""
+import base64
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+CursorKey = Tuple[int, str]
+
+# The instants a datetime can hold, in epoch microseconds
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MIN_EPOCH_US = (datetime.min.replace(tzinfo=timezone.utc) - _EPOCH) // timedelta(microseconds=1)
+MAX_EPOCH_US = (datetime.max.replace(tzinfo=timezone.utc) - _EPOCH) // timedelta(microseconds=1)
+
+
+def encode_cursor(received_at_us: int, event_id: str) -> str:
+    raw = f"{received_at_us}:{event_id}".encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor: str) -> CursorKey:
+    """Inverse of encode_cursor; raises ValueError for anything malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        received_at_us, event_id = raw.split(':', 1)
+        if not event_id:
+            raise ValueError("Missing event id")
+        received_at_us = int(received_at_us)
+        if not MIN_EPOCH_US <= received_at_us <= MAX_EPOCH_US:
+            raise ValueError("Timestamp out of range")
+        return received_at_us, event_id
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
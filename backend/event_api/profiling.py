@@ -0,0 +1,186 @@
+"""
+Opt-in per-request profiling
+
+ProfilingMiddleware picks a request for profiling when it carries
+`X-Profile: <PROFILING_TOKEN>` or is drawn at PROFILING_SAMPLE_RATE. For a
+profiled request:
+
+- every pipeline stage timed for /metrics (parse, validate, db_save,
+  cache_update, tracking_build, ...) is also added up for the request and
+  returned in a `Server-Timing` header, with the request total;
+- with PROFILING_DIR set, the request runs under cProfile and the stats are
+  written to `<PROFILING_DIR>/<timestamp>-<X-Request-ID>.prof`
+  (read with `python -m pstats` or snakeviz).
+
+With neither a token nor a sample rate configured, the middleware removes
+itself from the stack at startup. Otherwise an unprofiled request costs one
+header lookup and, with sampling, one random draw; stage timers cost one
+context variable lookup.
+
+Only one cProfile session can run per process. When a profiled request
+arrives while another is being captured, it gets Server-Timing only. Under
+ASGI the profile also includes whatever else ran on the event loop meanwhile.
+"""
+import contextvars
+import cProfile
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+
+_current: contextvars.ContextVar[Optional['RequestTimings']] = contextvars.ContextVar(
+    'event_api_request_timings', default=None
+)
+# cProfile cannot run twice at once in one process
+_profiler_lock = threading.Lock()
+
+
+class RequestTimings:
+    """Seconds spent per stage in one request, in first-seen order"""
+    __slots__ = ('stages',)
+
+    def __init__(self):
+        self.stages: Dict[str, List[float]] = {}  # stage -> [seconds, calls]
+
+    def add(self, stage: str, seconds: float) -> None:
+        entry = self.stages.get(stage)
+        if entry is None:
+            self.stages[stage] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def server_timing(self, total: float) -> str:
+        """Server-Timing header value, durations in milliseconds"""
+        metrics = [
+            f'{stage};dur={seconds * 1000:.3f}' + (f';desc="x{calls}"' if calls > 1 else '')
+            for stage, (seconds, calls) in self.stages.items()
+        ]
+        metrics.append(f'total;dur={total * 1000:.3f}')
+        return ', '.join(metrics)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Add a stage duration to the request being profiled, if there is one"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+def _dump_name(request_id: str) -> str:
+    safe_id = re.sub(r'[^A-Za-z0-9_.-]', '_', request_id)[:64]
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{safe_id}.prof"
+
+
+class ProfilingMiddleware:
+    """
+    Adds Server-Timing (and optionally a cProfile dump) to requests selected
+    by the X-Profile header or by sampling. See the module docstring.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.token = getattr(settings, 'PROFILING_TOKEN', '')
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.directory = getattr(settings, 'PROFILING_DIR', '')
+        if not self.token and self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self._selected(request):
+            return self.get_response(request)
+        profiler = self._start_profiler()
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self._stop_profiler(profiler, release=True)
+            raise
+        finally:
+            total = time.perf_counter() - started
+            _current.reset(token)
+        self._stop_profiler(profiler)
+        return self._finish(request, response, timings, total, profiler)
+
+    async def __acall__(self, request):
+        if not self._selected(request):
+            return await self.get_response(request)
+        profiler = self._start_profiler()
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            self._stop_profiler(profiler, release=True)
+            raise
+        finally:
+            total = time.perf_counter() - started
+            _current.reset(token)
+        self._stop_profiler(profiler)
+        return self._finish(request, response, timings, total, profiler)
+
+    def _selected(self, request) -> bool:
+        if self.token and request.headers.get(PROFILE_HEADER) == self.token:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _start_profiler(self) -> Optional[cProfile.Profile]:
+        if not self.directory or not _profiler_lock.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage, ...) owns the hooks
+            _profiler_lock.release()
+            return None
+        return profiler
+
+    @staticmethod
+    def _stop_profiler(profiler: Optional[cProfile.Profile], release: bool = False) -> None:
+        if profiler is not None:
+            profiler.disable()
+            if release:
+                _profiler_lock.release()
+
+    def _finish(self, request, response, timings: RequestTimings, total: float,
+                profiler: Optional[cProfile.Profile]):
+        request_id = response.get('X-Request-ID') or request.headers.get('X-Request-ID')
+        if not request_id:
+            request_id = str(uuid.uuid4())[:8]
+            response['X-Request-ID'] = request_id
+        response['Server-Timing'] = timings.server_timing(total)
+        if profiler is not None:
+            try:
+                path = os.path.join(self.directory, _dump_name(request_id))
+                profiler.dump_stats(path)
+                logger.info("Profiled request %s %s to %s", request.method, request.path, path)
+            except OSError:
+                logger.exception("Could not write profile for request %s", request_id)
+            finally:
+                _profiler_lock.release()
+        return response
@@ -0,0 +1,200 @@
+"""
+Incrementally maintained event counts
+
+With EVENT_ROLLUPS_ENABLED, every insert (outbox.save_events) also adds its
+events to EventRollup: one counter per user, event name and received_at
+bucket, for each bucket size in EVENT_ROLLUP_BUCKETS. The counters are
+updated in the same transaction as the Event rows, so they never count an
+event that was not stored. DELETE removes a user's counters with their events.
+
+GET /api/v1/events/stats is answered by stats() from the counters alone, so
+its cost follows the number of buckets in the range, not the number of
+events. Buckets are aligned to multiples of their size since the epoch (UTC).
+
+rebuild() recomputes the counters from the Event table, for the
+`rebuild_rollups` management command.
+"""
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+
+from . import metrics
+from .models import Event, EventRollup
+from .pagination import MAX_EPOCH_US, MIN_EPOCH_US
+from .storage import from_epoch_us, to_epoch_us
+
+# (user_id, event, bucket_seconds, bucket start in epoch microseconds)
+RollupKey = Tuple[str, str, int, int]
+
+
+def enabled() -> bool:
+    return getattr(settings, 'EVENT_ROLLUPS_ENABLED', False) and bool(bucket_sizes())
+
+
+def bucket_sizes() -> List[int]:
+    """Configured bucket sizes in seconds, smallest first"""
+    return getattr(settings, 'EVENT_ROLLUP_BUCKETS', [3600, 86400])
+
+
+def bucket_floor(timestamp_us: int, size: int) -> int:
+    return timestamp_us - timestamp_us % (size * 1_000_000)
+
+
+def bucket_ceil(timestamp_us: int, size: int) -> int:
+    return -bucket_floor(-timestamp_us, size)
+
+
+def count_events(rows: Iterable[Tuple[str, str, datetime]], sizes: List[int]) -> Counter:
+    """RollupKey -> number of (user_id, event, received_at) rows in that bucket"""
+    counts = Counter()
+    for user_id, event, received_at in rows:
+        received_at_us = to_epoch_us(received_at)
+        for size in sizes:
+            counts[(user_id, event, size, bucket_floor(received_at_us, size))] += 1
+    return counts
+
+
+def _row(key: RollupKey, count: int) -> EventRollup:
+    user_id, event, size, start_us = key
+    return EventRollup(user_id=user_id, event=event, bucket_seconds=size,
+                       bucket_start=from_epoch_us(start_us), count=count)
+
+
+def add_events(events: List[Event]) -> None:
+    """
+    Count events into their buckets. Call inside the transaction inserting
+    them. Three queries per call, however many buckets the events touch:
+    create missing counters, lock the ones touched (in index order, so
+    concurrent writers cannot deadlock) and write the new totals.
+    """
+    started = time.perf_counter()
+    counts = count_events(((event.user_id, event.event, event.received_at) for event in events), bucket_sizes())
+    keys = sorted(counts)
+    EventRollup.objects.bulk_create([_row(key, 0) for key in keys], ignore_conflicts=True)
+    # Selects a superset of the keys when a batch spans several users or
+    # buckets; the extra rows are locked but left alone
+    candidates = EventRollup.objects.select_for_update().filter(
+        user_id__in={key[0] for key in keys},
+        event__in={key[1] for key in keys},
+        bucket_seconds__in={key[2] for key in keys},
+        bucket_start__in={from_epoch_us(key[3]) for key in keys},
+    ).order_by('user_id', 'bucket_seconds', 'bucket_start', 'event')
+    changed = []
+    for rollup in candidates:
+        delta = counts.get((rollup.user_id, rollup.event, rollup.bucket_seconds, to_epoch_us(rollup.bucket_start)))
+        if delta:
+            rollup.count += delta
+            changed.append(rollup)
+    EventRollup.objects.bulk_update(changed, ['count'])
+    metrics.ROLLUP_UPDATE_SECONDS.observe(time.perf_counter() - started)
+
+
+def delete_events(user_id: Optional[str] = None) -> int:
+    """
+    Delete a user's events (everyone's without user_id) and their counters in
+    one transaction. Returns the number of events deleted.
+    """
+    events = Event.objects.all()
+    rollups = EventRollup.objects.all()
+    if user_id:
+        events = events.filter(user_id=user_id)
+        rollups = rollups.filter(user_id=user_id)
+    with transaction.atomic():
+        deleted, _ = events.delete()
+        rollups.delete()
+    return deleted
+
+
+def pick_bucket_size(since_us: Optional[int], until_us: Optional[int]) -> int:
+    """The largest bucket size both bounds fall on, else the smallest size"""
+    sizes = bucket_sizes()
+    for size in reversed(sizes):
+        step = size * 1_000_000
+        if (since_us is None or since_us % step == 0) and (until_us is None or until_us % step == 0):
+            return size
+    return sizes[0]
+
+
+def stats(
+        user_id: str,
+        events: Optional[FrozenSet[str]] = None,
+        since_us: Optional[int] = None,
+        until_us: Optional[int] = None,
+        interval: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    A user's event counts in [since, until), in total and per event name,
+    plus a per-bucket series when `interval` (a configured bucket size) is
+    given. Bounds that do not fall on a bucket boundary are widened to the
+    enclosing buckets, but not past the range a datetime can hold; the
+    response gives the range actually counted.
+    """
+    size = interval or pick_bucket_size(since_us, until_us)
+    if since_us is not None:
+        since_us = max(bucket_floor(since_us, size), MIN_EPOCH_US)
+    if until_us is not None:
+        until_us = min(bucket_ceil(until_us, size), MAX_EPOCH_US)
+
+    rollups = EventRollup.objects.filter(user_id=user_id, bucket_seconds=size)
+    if events is not None:
+        rollups = rollups.filter(event__in=sorted(events))
+    if since_us is not None:
+        rollups = rollups.filter(bucket_start__gte=from_epoch_us(since_us))
+    if until_us is not None:
+        rollups = rollups.filter(bucket_start__lt=from_epoch_us(until_us))
+
+    per_event: Dict[str, int] = {}
+    series = []
+    if interval:
+        for bucket_start, event, count in rollups.order_by('bucket_start', 'event').values_list(
+                'bucket_start', 'event', 'count'):
+            start = bucket_start.isoformat()
+            if not series or series[-1]['start'] != start:
+                series.append({'start': start, 'count': 0, 'events': {}})
+            series[-1]['count'] += count
+            series[-1]['events'][event] = count
+            per_event[event] = per_event.get(event, 0) + count
+    else:
+        for event, count in rollups.values_list('event').annotate(Sum('count')).order_by('event'):
+            per_event[event] = count
+
+    body = {
+        'user_id': user_id,
+        'since': from_epoch_us(since_us).isoformat() if since_us is not None else None,
+        'until': from_epoch_us(until_us).isoformat() if until_us is not None else None,
+        'bucket_seconds': size,
+        'total': sum(per_event.values()),
+        'events': dict(sorted(per_event.items())),
+    }
+    if interval:
+        body['series'] = series
+    return body
+
+
+def rebuild(user_id: Optional[str] = None, chunk_size: int = 2000) -> Dict[str, int]:
+    """
+    Replace the counters (a user's, or everyone's) with ones computed from
+    the Event table, in one transaction. Events inserted while it runs may
+    be counted twice or not at all, so run it with ingest paused.
+    """
+    events = Event.objects.all()
+    rollups = EventRollup.objects.all()
+    if user_id:
+        events = events.filter(user_id=user_id)
+        rollups = rollups.filter(user_id=user_id)
+    sizes = bucket_sizes()
+    with transaction.atomic():
+        rollups.delete()
+        rows = events.values_list('user_id', 'event', 'received_at').iterator(chunk_size=chunk_size)
+        counts = count_events(rows, sizes)
+        EventRollup.objects.bulk_create(
+            [_row(key, count) for key, count in sorted(counts.items())], batch_size=chunk_size
+        )
+    # Every event is in exactly one bucket of each size
+    scanned = sum(count for key, count in counts.items() if key[2] == sizes[0])
+    return {'events': scanned, 'rollups': len(counts)}
@@ -0,0 +1,142 @@
+"""
+Per-vendor routing rules for tracking
+
+Each vendor may have a rule deciding which events it receives:
+
+    {
+        'mixpanel': {
+            'deny': ['heartbeat', 'debug_*'],   # event names, globs allowed
+            'sample_rate': 0.1,                 # keep 10% of users
+            'strip_properties': ['metadata'],   # top-level property keys
+        },
+        'segment': {'allow': ['signup', 'purchase*']},
+    }
+
+An event is dropped for a vendor when `allow` is set and the name matches
+none of it, or when it matches `deny`. Sampling hashes the user_id, so a
+user is either always or never sent to a vendor, in every process. Rules are
+compiled once; routing an event costs a regex match and one crc32 at most,
+and happens before any payload is built.
+"""
+import fnmatch
+import re
+import threading
+import zlib
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Pattern, Tuple
+
+RULE_KEYS = frozenset({'allow', 'deny', 'sample_rate', 'strip_properties'})
+
+# Sampling buckets: a user is kept when crc32(user_id) % SAMPLE_BUCKETS < rate * SAMPLE_BUCKETS
+SAMPLE_BUCKETS = 10000
+
+
+def _compile_names(names: Optional[Iterable[str]]) -> Optional[Pattern]:
+    """One regex matching any of the event names or glob patterns"""
+    if names is None:
+        return None
+    if isinstance(names, str):
+        names = [names]
+    return re.compile('|'.join(f'(?:{fnmatch.translate(name)})' for name in names) or r'(?!)')
+
+
+class VendorRule:
+    """A compiled routing rule for one vendor, with its counters"""
+
+    def __init__(
+            self,
+            vendor: str,
+            allow: Optional[Iterable[str]] = None,
+            deny: Optional[Iterable[str]] = None,
+            sample_rate: float = 1.0,
+            strip_properties: Iterable[str] = ()
+    ):
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError(f"sample_rate for {vendor} must be between 0 and 1, got {sample_rate!r}")
+        self.vendor = vendor
+        self.allow = _compile_names(allow)
+        self.deny = _compile_names(deny)
+        self.sample_rate = sample_rate
+        self.sample_threshold = int(sample_rate * SAMPLE_BUCKETS)
+        self.strip_properties: FrozenSet[str] = frozenset(strip_properties)
+
+        self.routed = 0
+        self.sampled_out = 0
+        self.dropped = 0
+
+    @property
+    def samples(self) -> bool:
+        return self.sample_threshold < SAMPLE_BUCKETS
+
+    def accepts_event(self, event_name: str) -> bool:
+        if self.allow is not None and self.allow.fullmatch(event_name) is None:
+            return False
+        return self.deny is None or self.deny.fullmatch(event_name) is None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'routed': self.routed,
+            'sampled_out': self.sampled_out,
+            'dropped': self.dropped,
+            'sample_rate': self.sample_rate,
+            'strip_properties': sorted(self.strip_properties),
+        }
+
+
+class VendorRouter:
+    """
+    Decides which vendors receive an event. Vendors without a rule receive
+    everything; their events are still counted as routed.
+    """
+
+    def __init__(self, vendors: Iterable[str], rules: Optional[Dict[str, Dict[str, Any]]] = None):
+        rules = rules or {}
+        self.vendors: Tuple[str, ...] = tuple(vendors)
+        unknown = set(rules) - set(self.vendors)
+        if unknown:
+            raise ValueError(f"Routing rules for unknown vendors: {sorted(unknown)}")
+        for vendor, options in rules.items():
+            bad_keys = set(options) - RULE_KEYS
+            if bad_keys:
+                raise ValueError(f"Unknown routing options for {vendor}: {sorted(bad_keys)}, expected {sorted(RULE_KEYS)}")
+        self.rules: Dict[str, VendorRule] = {
+            vendor: VendorRule(vendor, **rules.get(vendor, {})) for vendor in self.vendors
+        }
+        self._filtering = any(
+            rule.allow is not None or rule.deny is not None or rule.samples for rule in self.rules.values()
+        )
+        self._lock = threading.Lock()
+
+    def route(self, user_id: str, event_name: str) -> List[VendorRule]:
+        """Rules of the vendors that should receive this event"""
+        rules = self.rules.values()
+        if not self._filtering:
+            with self._lock:
+                for rule in rules:
+                    rule.routed += 1
+            return list(rules)
+
+        bucket = None
+        routed = []
+        with self._lock:
+            for rule in rules:
+                if not rule.accepts_event(event_name):
+                    rule.dropped += 1
+                    continue
+                if rule.samples:
+                    if bucket is None:
+                        bucket = zlib.crc32(user_id.encode()) % SAMPLE_BUCKETS
+                    if bucket >= rule.sample_threshold:
+                        rule.sampled_out += 1
+                        continue
+                rule.routed += 1
+                routed.append(rule)
+        return routed
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {vendor: rule.stats() for vendor, rule in self.rules.items()}
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            for rule in self.rules.values():
+                rule.routed = rule.sampled_out = rule.dropped = 0
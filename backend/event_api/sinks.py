@@ -0,0 +1,238 @@
+"""
+Per-vendor batching for tracking payloads
+
+A VendorSink collects one vendor's encoded event payloads and sends them as a
+single batch request once `max_events` are waiting, the batch would grow past
+`max_bytes`, or the oldest payload is `max_age` seconds old. The sender gets
+the already-encoded payloads and joins them inside the vendor's envelope
+(TrackingClient.send_batch), so nothing is decoded or encoded again; the sink
+only needs the envelope's size, to keep batches under `max_bytes`.
+
+A failed batch is retried up to `max_retries` times, `retry_backoff` seconds
+apart and doubling, before it is given up. At most `max_pending` payloads
+wait per vendor; past that the oldest waiting batches are dropped, so a slow
+or failing vendor costs bounded memory.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# send(vendor, payloads); raising marks the batch as failed
+BatchSender = Callable[[str, List[bytes]], None]
+
+
+class VendorSink:
+    """
+    Batches payloads for one vendor, sent from a background flusher thread.
+
+    Payloads are encoded JSON bytes. A payload larger than `max_bytes` on its
+    own is sent as a batch of one rather than dropped; the vendor decides
+    whether to accept it. `max_pending` should be at least `max_events`.
+    """
+
+    def __init__(
+            self,
+            vendor: str,
+            send: BatchSender,
+            max_events: int = 100,
+            max_bytes: int = 512 * 1024,
+            max_age: float = 1.0,
+            envelope: Tuple[bytes, bytes] = (b'[', b']'),
+            max_pending: int = 10000,
+            max_retries: int = 3,
+            retry_backoff: float = 1.0,
+            autostart: bool = True
+    ):
+        self.vendor = vendor
+        self.send = send
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.prefix, self.suffix = envelope
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.autostart = autostart
+        self._cond = threading.Condition()
+        self._current: List[bytes] = []
+        self._current_bytes = 0
+        self._current_started = 0.0
+        self._ready: deque = deque()  # (bodies, failed attempts, not before)
+        self._ready_events = 0
+        self._inflight = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self.batches = 0
+        self.sent_events = 0
+        self.sent_bytes = 0
+        self.failed_batches = 0
+        self.failed_events = 0
+        self.retried_batches = 0
+        self.dropped_batches = 0
+        self.dropped_events = 0
+        self.flush_reasons = {'count': 0, 'bytes': 0, 'age': 0, 'flush': 0}
+
+    def add(self, body: bytes) -> None:
+        """Queue one encoded payload; never sends in the caller's thread"""
+        envelope_bytes = len(self.prefix) + len(self.suffix)
+        with self._cond:
+            if self._current and self._current_bytes + 1 + len(body) + envelope_bytes > self.max_bytes:
+                self._seal('bytes')
+            if not self._current:
+                self._current_started = time.monotonic()
+                self._current_bytes = 0
+            else:
+                self._current_bytes += 1  # separating comma
+            self._current.append(body)
+            self._current_bytes += len(body)
+            if len(self._current) >= self.max_events:
+                self._seal('count')
+            self._cond.notify()
+        if self.autostart and self._thread is None:
+            self.start()
+
+    def flush(self) -> int:
+        """
+        Send everything pending now, including batches in flight; returns
+        events sent by this call. Failed batches are retried straight away.
+        """
+        sent = 0
+        with self._cond:
+            if self._current:
+                self._seal('flush')
+        while True:
+            with self._cond:
+                if self._ready:
+                    bodies, attempts = self._take()
+                elif self._inflight:
+                    self._cond.wait()
+                    continue
+                else:
+                    return sent
+            if self._send(bodies, attempts):
+                sent += len(bodies)
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=f'tracking-sink-{self.vendor}', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        """Stop the flusher and send whatever is still pending"""
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            pending = len(self._current) + self._ready_events
+        return {
+            'vendor': self.vendor,
+            'pending': pending,
+            'max_events': self.max_events,
+            'max_bytes': self.max_bytes,
+            'max_age': self.max_age,
+            'batches': self.batches,
+            'sent_events': self.sent_events,
+            'sent_bytes': self.sent_bytes,
+            'failed_batches': self.failed_batches,
+            'failed_events': self.failed_events,
+            'retried_batches': self.retried_batches,
+            'dropped_batches': self.dropped_batches,
+            'dropped_events': self.dropped_events,
+            'avg_batch_size': self.sent_events / self.batches if self.batches else 0.0,
+            'flush_reasons': dict(self.flush_reasons),
+        }
+
+    def _seal(self, reason: str) -> None:
+        """Move the open batch to the ready queue; caller holds the lock"""
+        self._ready.append((self._current, 0, 0.0))
+        self._ready_events += len(self._current)
+        self.flush_reasons[reason] += 1
+        self._current = []
+        self._current_bytes = 0
+        self._trim()
+
+    def _take(self) -> Tuple[List[bytes], int]:
+        """Pop the next ready batch and mark it in flight; caller holds the lock"""
+        bodies, attempts, _ = self._ready.popleft()
+        self._ready_events -= len(bodies)
+        self._inflight += 1
+        return bodies, attempts
+
+    def _trim(self) -> None:
+        """Drop the oldest ready batches while over max_pending; caller holds the lock"""
+        while self._ready and self._ready_events + len(self._current) > self.max_pending:
+            bodies, _, _ = self._ready.popleft()
+            self._ready_events -= len(bodies)
+            self.dropped_batches += 1
+            self.dropped_events += len(bodies)
+            logger.warning(f"Dropped batch of {len(bodies)} events for {self.vendor}: "
+                           f"more than {self.max_pending} waiting")
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    now = time.monotonic()
+                    waits = []
+                    if self._ready:
+                        retry_in = self._ready[0][2] - now
+                        if retry_in <= 0:
+                            break
+                        waits.append(retry_in)
+                    if self._current:
+                        remaining = self._current_started + self.max_age - now
+                        if remaining <= 0:
+                            self._seal('age')
+                            continue
+                        waits.append(remaining)
+                    self._cond.wait(min(waits) if waits else None)
+                if not self._ready:
+                    return
+                bodies, attempts = self._take()
+            self._send(bodies, attempts)
+
+    def _send(self, bodies: List[bytes], attempts: int = 0) -> bool:
+        """Send one batch; a failure is requeued for retry or given up. True if sent."""
+        error = None
+        try:
+            self.send(self.vendor, bodies)
+        except Exception as e:
+            error = e
+        with self._cond:
+            self._inflight -= 1
+            if error is None:
+                self.batches += 1
+                self.sent_events += len(bodies)
+                # The body as sent: payloads, separating commas and envelope
+                self.sent_bytes += len(self.prefix) + sum(map(len, bodies)) + len(bodies) - 1 + len(self.suffix)
+            elif attempts < self.max_retries:
+                delay = self.retry_backoff * 2 ** attempts
+                logger.warning(f"Failed to send batch of {len(bodies)} events to {self.vendor}, "
+                               f"retrying in {delay:.1f}s: {str(error)}")
+                # Back at the front, so the vendor still gets events in order
+                self._ready.appendleft((bodies, attempts + 1, time.monotonic() + delay))
+                self._ready_events += len(bodies)
+                self.retried_batches += 1
+                self._trim()
+            else:
+                logger.error(f"Failed to send batch of {len(bodies)} events to {self.vendor} "
+                             f"after {attempts + 1} attempts: {str(error)}", exc_info=error)
+                self.failed_batches += 1
+                self.failed_events += len(bodies)
+            self._cond.notify_all()
+        return error is None
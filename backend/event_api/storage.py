@@ -1 +1,599 @@
-memory_store = []
+"""
+In-memory event cache indexed by user_id
+"""
+import heapq
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from operator import attrgetter
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .models import Event
+from .pagination import CursorKey
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch_us(value: datetime) -> int:
+    """Aware datetime -> integer microseconds since the epoch"""
+    return (value - EPOCH) // ONE_MICROSECOND
+
+
+def from_epoch_us(value: int) -> datetime:
+    """Integer microseconds since the epoch -> aware UTC datetime"""
+    return EPOCH + timedelta(microseconds=value)
+
+
+class EventRecord:
+    """
+    Compact cached form of an Event.
+
+    Timestamps are held as epoch microseconds and only formatted when
+    EventResponseSerializer reads `received_at` / `client_ts`. Event names and
+    user ids are interned so repeated values share one string object.
+    """
+
+    __slots__ = ('id', 'event', 'user_id', 'received_at_us', 'client_ts_us', '_metadata', 'request_id')
+
+    def __init__(
+            self,
+            id: str,
+            event: str,
+            user_id: str,
+            received_at_us: int,
+            client_ts_us: int,
+            metadata: Optional[Dict[str, Any]],
+            request_id: str
+    ):
+        self.id = id
+        self.event = sys.intern(event)
+        self.user_id = sys.intern(user_id)
+        self.received_at_us = received_at_us
+        self.client_ts_us = client_ts_us
+        self._metadata = metadata or None
+        self.request_id = request_id
+
+    @classmethod
+    def from_model(cls, event) -> 'EventRecord':
+        return cls(
+            id=event.id,
+            event=event.event,
+            user_id=event.user_id,
+            received_at_us=to_epoch_us(event.received_at),
+            client_ts_us=to_epoch_us(event.client_ts),
+            metadata=event.metadata,
+            request_id=event.request_id,
+        )
+
+    @property
+    def received_at(self) -> str:
+        return from_epoch_us(self.received_at_us).isoformat()
+
+    @property
+    def client_ts(self) -> str:
+        return from_epoch_us(self.client_ts_us).isoformat()
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self._metadata if self._metadata is not None else {}
+
+    def __repr__(self) -> str:
+        return f"EventRecord({self.id}: {self.event})"
+
+
+sort_key = attrgetter('received_at_us', 'id')
+client_key = attrgetter('client_ts_us', 'id')
+
+
+def metadata_text(value: Any) -> str:
+    """
+    How GET metadata filters compare a value: strings as is, the rest as
+    JSON, with integral floats written as ints so 3.0 compares like 3
+    """
+    if isinstance(value, str):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return json.dumps(value)
+
+
+def _insert(records: List[EventRecord], record: EventRecord, key) -> None:
+    if not records or key(records[-1]) <= key(record):
+        records.append(record)
+    else:
+        insort(records, record, key=key)
+
+
+def _discard(records: List[EventRecord], record: EventRecord, key) -> None:
+    index = bisect_left(records, key(record), key=key)
+    if index < len(records) and records[index] is record:
+        del records[index]
+
+
+def _newest_first(records: List[EventRecord], start: int, end: int):
+    for i in range(end - 1, start - 1, -1):
+        yield records[i]
+
+
+class _LogIndex:
+    """
+    Secondary indexes over one user's cached events, for filtered GETs:
+    events per event name and per scalar metadata (key, value), each sorted
+    by (received_at, id), and all events sorted by (client_ts, id).
+
+    Built on a log's first filtered read and kept up to date from then on,
+    so users who are never filtered on pay nothing for them.
+    """
+    __slots__ = ('by_event', 'by_metadata', 'by_client_ts')
+
+    def __init__(self, records: List[EventRecord]):
+        self.by_event: Dict[str, List[EventRecord]] = {}
+        self.by_metadata: Dict[Tuple[str, str], List[EventRecord]] = {}
+        for record in records:
+            self.by_event.setdefault(record.event, []).append(record)
+            for pair in self._metadata_pairs(record):
+                self.by_metadata.setdefault(pair, []).append(record)
+        self.by_client_ts = sorted(records, key=client_key)
+
+    @staticmethod
+    def _metadata_pairs(record: EventRecord):
+        if record._metadata:
+            for key, value in record._metadata.items():
+                if value is None or isinstance(value, (str, bool, int, float)):
+                    yield key, metadata_text(value)
+
+    def add(self, record: EventRecord) -> None:
+        _insert(self.by_event.setdefault(record.event, []), record, sort_key)
+        for pair in self._metadata_pairs(record):
+            _insert(self.by_metadata.setdefault(pair, []), record, sort_key)
+        _insert(self.by_client_ts, record, client_key)
+
+    def remove(self, record: EventRecord) -> None:
+        self._discard_from(self.by_event, record.event, record)
+        for pair in self._metadata_pairs(record):
+            self._discard_from(self.by_metadata, pair, record)
+        _discard(self.by_client_ts, record, client_key)
+
+    @staticmethod
+    def _discard_from(index: Dict[Any, List[EventRecord]], key: Any, record: EventRecord) -> None:
+        records = index.get(key)
+        if records is not None:
+            _discard(records, record, sort_key)
+            if not records:
+                del index[key]
+
+
+class _UserLog:
+    """
+    One user's cached events, sorted oldest -> newest by (received_at, id).
+
+    Backed by a list so a cursor can be found with bisect. Evicting from the
+    front only advances `head`; the dead prefix is trimmed once it makes up
+    half the list, keeping eviction amortised O(1).
+
+    `filled_at` is when the log was last merged with the Event table and
+    `complete` says whether it then held the user's entire history; only a
+    filled log can answer reads on its own.
+    """
+
+    __slots__ = ('records', 'head', 'filled_at', 'complete', 'index')
+
+    def __init__(self):
+        self.records: List[Optional[EventRecord]] = []
+        self.head = 0
+        self.filled_at: Optional[float] = None
+        self.complete = False
+        self.index: Optional[_LogIndex] = None
+
+    def __len__(self) -> int:
+        return len(self.records) - self.head
+
+    def append(self, record: EventRecord) -> None:
+        records = self.records
+        if len(records) > self.head and sort_key(record) < sort_key(records[-1]):
+            # Concurrent requests can finish slightly out of order
+            insort(records, record, lo=self.head, key=sort_key)
+        else:
+            records.append(record)
+        if self.index is not None:
+            self.index.add(record)
+
+    def oldest(self) -> EventRecord:
+        return self.records[self.head]
+
+    def popleft(self) -> EventRecord:
+        self.complete = False
+        record = self.records[self.head]
+        self.records[self.head] = None
+        self.head += 1
+        if self.head >= 32 and self.head * 2 >= len(self.records):
+            del self.records[:self.head]
+            self.head = 0
+        if self.index is not None:
+            self.index.remove(record)
+        return record
+
+    def __contains__(self, record: EventRecord) -> bool:
+        index = bisect_left(self.records, sort_key(record), lo=self.head, key=sort_key)
+        return index < len(self.records) and self.records[index] is record
+
+    def drop_older_than(self, key: CursorKey) -> int:
+        """Remove records sorting before `key`, returning how many were removed"""
+        index = bisect_left(self.records, key, lo=self.head, key=sort_key)
+        removed = index - self.head
+        if removed:
+            del self.records[:index]
+            self.head = 0
+            self.index = None
+        return removed
+
+    def merge(self, records: List[EventRecord]) -> List[EventRecord]:
+        """Add records not already cached, returning the ones added"""
+        cached = {record.id for record in self}
+        added = [record for record in records if record.id not in cached]
+        if added:
+            self.records = sorted(self.records[self.head:] + added, key=sort_key)
+            self.head = 0
+            self.index = None
+        return added
+
+    def newest(self, limit: int, before: Optional[CursorKey] = None) -> List[EventRecord]:
+        """Up to `limit` records strictly older than `before`, newest first"""
+        end = len(self.records)
+        if before is not None:
+            end = bisect_left(self.records, before, lo=self.head, key=sort_key)
+        start = max(self.head, end - limit)
+        return self.records[start:end][::-1]
+
+    def matching(self, query, limit: int, before: Optional[CursorKey] = None) -> List[EventRecord]:
+        """
+        Up to `limit` records passing `query` (an EventFilter) and older than
+        `before`, newest first. Scans the smallest candidate list the indexes
+        offer, so the cost follows the number of candidates, not the log size.
+        """
+        if self.index is None:
+            self.index = _LogIndex(self.records[self.head:])
+        index = self.index
+
+        # Bounds in (received_at, id) order, applied to every ordered list
+        low = high = None
+        if query.time_field == 'received_at':
+            if query.since_us is not None:
+                low = (query.since_us, '')
+            if query.until_us is not None:
+                high = (query.until_us, '')
+        if before is not None and (high is None or before < high):
+            high = before
+
+        def bounded(records: List[EventRecord], lo: int = 0) -> Tuple[List[EventRecord], int, int]:
+            start = lo if low is None else bisect_left(records, low, lo=lo, key=sort_key)
+            end = len(records) if high is None else bisect_left(records, high, lo=lo, key=sort_key)
+            return records, start, max(start, end)
+
+        # Candidate plans: (ordered, slices). Every plan holds all matches;
+        # ordered slices are in (received_at, id) order, so a scan can stop
+        # after `limit` matches.
+        plans = [(True, [bounded(self.records, self.head)])]
+        if query.events is not None:
+            plans.append((True, [bounded(index.by_event[name]) for name in query.events if name in index.by_event]))
+        for key, texts in query.metadata_texts():
+            plans.append((True, [bounded(index.by_metadata[(key, text)]) for text in texts
+                                 if (key, text) in index.by_metadata]))
+        if query.time_field == 'client_ts' and (query.since_us is not None or query.until_us is not None):
+            by_client = index.by_client_ts
+            start = 0 if query.since_us is None else bisect_left(by_client, (query.since_us, ''), key=client_key)
+            end = len(by_client) if query.until_us is None else bisect_left(
+                by_client, (query.until_us, ''), key=client_key)
+            plans.append((False, [(by_client, start, max(start, end))]))
+        ordered, slices = min(plans, key=lambda plan: sum(end - start for _, start, end in plan[1]))
+        if not slices:
+            return []
+
+        if not ordered:
+            found = [
+                record for records, start, end in slices for record in records[start:end]
+                if (before is None or sort_key(record) < before) and query.matches(record)
+            ]
+            found.sort(key=sort_key, reverse=True)
+            return found[:limit]
+
+        newest_first = [_newest_first(records, start, end) for records, start, end in slices]
+        candidates = newest_first[0] if len(newest_first) == 1 else heapq.merge(
+            *newest_first, key=sort_key, reverse=True)
+        page = []
+        for record in candidates:
+            if query.matches(record):
+                page.append(record)
+                if len(page) == limit:
+                    break
+        return page
+
+    def covers(self, query) -> bool:
+        """
+        Whether every event passing `query` is cached: the query starts
+        (by received_at) after the oldest cached event, and a cached log has
+        no gaps.
+        """
+        return (query.time_field == 'received_at' and query.since_us is not None
+                and len(self) > 0 and query.since_us > self.oldest().received_at_us)
+
+    def __iter__(self):
+        return iter(self.records[self.head:])
+
+
+class EventStore:
+    """
+    Bounded process-local cache of recent events, keyed by user_id.
+
+    Each user's events are kept oldest -> newest so an append is O(1) and a
+    page read costs O(log n + limit), whether it starts at the newest event or
+    at a keyset cursor.
+
+    Two capacities apply: `max_events` caps the whole cache and evicts the
+    globally oldest event, `max_events_per_user` caps each user's history and
+    evicts that user's oldest event. Either way a user's log only ever loses
+    its oldest event, so it stays a gapless run ending at the newest.
+    Either may be None for no limit.
+
+    The Event table is the source of truth; the cache is read-through:
+      - POST writes the row first, then appends to the user's log.
+      - GET is served from the log only if it was filled from the table within
+        `ttl` seconds and holds a full page (or the user's whole history).
+        Anything else is a miss: the page is read from the table and merged in.
+      - DELETE removes the rows first, then drops the user's log.
+    `ttl` bounds how long events written by other worker processes can be
+    missing from this process's cache; None trusts a filled log forever.
+    """
+
+    def __init__(
+            self,
+            max_events: Optional[int] = None,
+            max_events_per_user: Optional[int] = None,
+            ttl: Optional[float] = None
+    ):
+        self.max_events = max_events
+        self.max_events_per_user = max_events_per_user
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._by_user: Dict[str, _UserLog] = {}
+        # Global insertion order, used to find the oldest event to evict. Entries
+        # for events already dropped per-user or by DELETE are skipped lazily.
+        self._order: deque = deque()
+        self._size = 0
+        self.evicted_global = 0
+        self.evicted_per_user = 0
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, max_events: Optional[int] = None, max_events_per_user: Optional[int] = None) -> None:
+        """Change capacities, evicting immediately if the cache is now over them"""
+        with self._lock:
+            self.max_events = max_events
+            self.max_events_per_user = max_events_per_user
+            for user_id in list(self._by_user):
+                self._enforce_user_cap(user_id, self._by_user[user_id])
+            self._enforce_global_cap()
+
+    def add(self, event: EventRecord) -> None:
+        """Append an event to its user's history, evicting old events if over capacity"""
+        with self._lock:
+            user_id = event.user_id
+            user_events = self._by_user.get(user_id)
+            if user_events is None:
+                user_events = self._by_user[user_id] = _UserLog()
+            user_events.append(event)
+            self._order.append(event)
+            self._size += 1
+            self._enforce_user_cap(user_id, user_events)
+            self._enforce_global_cap()
+
+    def add_many(self, events: List[EventRecord]) -> None:
+        """add() for a batch, taking the lock once"""
+        with self._lock:
+            for event in events:
+                self.add(event)
+
+    def recent(self, user_id: str, limit: int, before: Optional[CursorKey] = None) -> List[EventRecord]:
+        """Return up to `limit` cached events for a user older than `before`, most recent first"""
+        with self._lock:
+            user_events = self._by_user.get(user_id)
+            if not user_events:
+                return []
+            return user_events.newest(limit, before)
+
+    def lookup(
+            self,
+            user_id: str,
+            limit: int,
+            before: Optional[CursorKey] = None,
+            query=None
+    ) -> Optional[List[EventRecord]]:
+        """
+        Like recent(), but None when the cache cannot answer on its own.
+        With `query` (an EventFilter) only matching events are returned.
+        """
+        with self._lock:
+            user_events = self._by_user.get(user_id)
+            if user_events is not None and self._is_fresh(user_events):
+                if query is None:
+                    page = user_events.newest(limit, before)
+                    answered = len(page) == limit or user_events.complete
+                else:
+                    page = user_events.matching(query, limit, before)
+                    answered = len(page) == limit or user_events.complete or user_events.covers(query)
+                if answered:
+                    self.hits += 1
+                    return page
+            self.misses += 1
+            return None
+
+    def fill(
+            self,
+            user_id: str,
+            records: List[EventRecord],
+            limit: int,
+            before: Optional[CursorKey] = None
+    ) -> List[EventRecord]:
+        """
+        Merge the result of Event.objects.page(user_id, limit, before) into the
+        cache and return the page, including any cached events the table does
+        not have yet.
+
+        A first page always replaces the user's range; a cursor page is only
+        merged if it continues directly on from a fresh cached range, so a log
+        never has gaps.
+        """
+        with self._lock:
+            user_events = self._by_user.get(user_id)
+            if before is None:
+                if user_events is None:
+                    if not records:
+                        return []
+                    user_events = self._by_user[user_id] = _UserLog()
+                if len(records) == limit:
+                    # Cached events older than a full page may not be contiguous
+                    # with it (other workers may have written in between)
+                    self._size -= user_events.drop_older_than(sort_key(records[-1]))
+                user_events.filled_at = time.monotonic()
+                user_events.complete = len(records) < limit
+            elif (user_events is None or not self._is_fresh(user_events)
+                    or before < sort_key(user_events.oldest())):
+                return records
+            elif len(records) < limit:
+                user_events.complete = True
+
+            added = user_events.merge(records)
+            self._order.extend(added)
+            self._size += len(added)
+            page = user_events.newest(limit, before)
+            self._enforce_user_cap(user_id, user_events)
+            self._enforce_global_cap()
+            return page
+
+    def delete_user(self, user_id: str) -> int:
+        """Drop every cached event for a user, returning how many were removed"""
+        with self._lock:
+            user_events = self._by_user.pop(user_id, None)
+            if not user_events:
+                return 0
+            self._size -= len(user_events)
+            self._maybe_compact()
+            return len(user_events)
+
+    def clear(self) -> int:
+        """Drop every cached event, returning how many were removed"""
+        with self._lock:
+            removed = self._size
+            self._by_user.clear()
+            self._order.clear()
+            self._size = 0
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Size, capacity, eviction and hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            'size': self._size,
+            'users': len(self._by_user),
+            'max_events': self.max_events,
+            'max_events_per_user': self.max_events_per_user,
+            'evicted_global': self.evicted_global,
+            'evicted_per_user': self.evicted_per_user,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else None,
+        }
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _is_fresh(self, user_events: _UserLog) -> bool:
+        if user_events.filled_at is None:
+            return False
+        return self.ttl is None or time.monotonic() - user_events.filled_at <= self.ttl
+
+    def _enforce_user_cap(self, user_id: str, user_events: _UserLog) -> None:
+        if self.max_events_per_user is None:
+            return
+        while len(user_events) > self.max_events_per_user:
+            user_events.popleft()
+            self._size -= 1
+            self.evicted_per_user += 1
+        if not user_events:
+            del self._by_user[user_id]
+        self._maybe_compact()
+
+    def _enforce_global_cap(self) -> None:
+        if self.max_events is None:
+            return
+        while self._size > self.max_events:
+            oldest = self._order.popleft()
+            user_id = oldest.user_id
+            user_events = self._by_user.get(user_id)
+            if not user_events or oldest not in user_events:
+                continue  # already removed by per-user eviction or DELETE
+            if user_events.oldest() is not oldest:
+                # fill() cached older rows after this event; dropping it would
+                # leave a gap in a log still trusted to hold the newest events.
+                # Evict the user's oldest instead and requeue this one.
+                self._order.append(oldest)
+            user_events.popleft()
+            if not user_events:
+                del self._by_user[user_id]
+            self._size -= 1
+            self.evicted_global += 1
+
+    def _maybe_compact(self) -> None:
+        # Stale order entries keep deleted events alive; rebuild once they
+        # outnumber live ones so the cost stays amortised O(1) per removal.
+        if len(self._order) <= 2 * self._size + 1024:
+            return
+        live = {id(event) for user_events in self._by_user.values() for event in user_events}
+        self._order = deque(event for event in self._order if id(event) in live)
+
+
+memory_store = EventStore(
+    max_events=getattr(settings, 'EVENT_CACHE_MAX_EVENTS', None),
+    max_events_per_user=getattr(settings, 'EVENT_CACHE_MAX_EVENTS_PER_USER', None),
+    ttl=getattr(settings, 'EVENT_CACHE_TTL', None),
+)
+
+
+def read_events(user_id: str, limit: int, before: Optional[CursorKey] = None, query=None) -> List[EventRecord]:
+    """
+    GET path: serve a page from the cache, reading through to the Event table
+    on a miss. A filtered page read from the table is not cached, since it
+    is not a contiguous stretch of the user's history.
+    """
+    page = memory_store.lookup(user_id, limit, before, query)
+    if page is not None:
+        return page
+    db_before = None if before is None else (from_epoch_us(before[0]), before[1])
+    if query is not None:
+        return [EventRecord.from_model(row) for row in Event.objects.page(user_id, limit, db_before, query)]
+    rows = Event.objects.page(user_id, limit, before=db_before)
+    return memory_store.fill(user_id, [EventRecord.from_model(row) for row in rows], limit, before)
+
+
+async def aread_events(
+        user_id: str,
+        limit: int,
+        before: Optional[CursorKey] = None,
+        query=None
+) -> List[EventRecord]:
+    """read_events for async views, using the async ORM on a miss"""
+    page = memory_store.lookup(user_id, limit, before, query)
+    if page is not None:
+        return page
+    db_before = None if before is None else (from_epoch_us(before[0]), before[1])
+    if query is not None:
+        return [EventRecord.from_model(row) async for row in Event.objects.page(user_id, limit, db_before, query)]
+    rows = [EventRecord.from_model(row) async for row in Event.objects.page(user_id, limit, before=db_before)]
+    return memory_store.fill(user_id, rows, limit, before)
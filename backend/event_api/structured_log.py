@@ -0,0 +1,125 @@
+"""
+Structured, level-gated, sampled logging for event_api
+
+    log = get_logger(__name__)
+    log.info('track', 'TRACK', vendor=vendor, body=lambda: body.decode())
+
+Every call names a category ('track', 'cache', 'exception', ...). Nothing is
+built unless the logger is enabled for the level and the category's sample
+rate lets the line through; field values that are callables are only called
+then (in the caller's thread, so they see current state). The message and
+fields are rendered later, by whichever handler emits the record: JSONFormatter writes them as one JSON object per line, plain
+formatters as "<message> {json fields}". With the queue handler configured
+in LOGGING, that rendering happens on the log listener thread.
+
+Sample rates come from LOG_SAMPLE_RATES, e.g. {'track': 0.01} keeps 1% of
+TRACK lines. Categories without a rate are always logged.
+"""
+import json
+import logging
+import random
+import sys
+import threading
+from typing import Any, Dict
+
+from django.conf import settings
+
+_sample_rates: Dict[str, float] = dict(getattr(settings, 'LOG_SAMPLE_RATES', {}))
+_counts_lock = threading.Lock()
+# category -> [emitted, sampled_out]
+_counts: Dict[str, list] = {}
+
+
+def set_sample_rates(rates: Dict[str, float]) -> None:
+    """Replace the per-category sample rates (0 drops a category, 1 keeps it all)"""
+    global _sample_rates
+    _sample_rates = dict(rates)
+
+
+def sample_rates() -> Dict[str, float]:
+    return dict(_sample_rates)
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    """Lines emitted and sampled out per category since start (or reset_stats)"""
+    with _counts_lock:
+        return {category: {'emitted': emitted, 'sampled_out': sampled_out}
+                for category, (emitted, sampled_out) in _counts.items()}
+
+
+def reset_stats() -> None:
+    with _counts_lock:
+        _counts.clear()
+
+
+def _count(category: str, emitted: bool) -> None:
+    with _counts_lock:
+        counts = _counts.get(category)
+        if counts is None:
+            counts = _counts[category] = [0, 0]
+        counts[0 if emitted else 1] += 1
+
+
+class StructuredMessage:
+    """A log message plus fields, rendered only when a handler formats it"""
+    __slots__ = ('message', 'fields')
+
+    def __init__(self, message: str, fields: Dict[str, Any]):
+        self.message = message
+        self.fields = fields
+
+    def __str__(self) -> str:
+        if not self.fields:
+            return self.message
+        return f"{self.message} {json.dumps(self.fields, default=str)}"
+
+
+class StructuredLogger:
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    # Each level method checks the level itself, so a disabled call costs
+    # one isEnabledFor and never repacks its fields
+    def debug(self, category: str, message: str, **fields) -> None:
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._log(logging.DEBUG, category, message, None, fields)
+
+    def info(self, category: str, message: str, **fields) -> None:
+        if self.logger.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, category, message, None, fields)
+
+    def warning(self, category: str, message: str, **fields) -> None:
+        if self.logger.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, category, message, None, fields)
+
+    def error(self, category: str, message: str, exc_info: Any = None, **fields) -> None:
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, category, message, exc_info, fields)
+
+    def log(self, level: int, category: str, message: str, exc_info: Any = None, **fields) -> None:
+        if self.logger.isEnabledFor(level):
+            self._log(level, category, message, exc_info, fields)
+
+    def _log(self, level: int, category: str, message: str, exc_info: Any, fields: Dict[str, Any]) -> None:
+        rate = _sample_rates.get(category, 1.0)
+        if rate < 1.0 and (rate <= 0.0 or random.random() >= rate):
+            _count(category, False)
+            return
+        _count(category, True)
+        for key, value in fields.items():
+            if callable(value):
+                fields[key] = value()
+        if exc_info and not isinstance(exc_info, tuple):
+            exc_info = sys.exc_info()
+        # makeRecord directly: the category says where a line came from, so
+        # skip Logger.findCaller's stack walk
+        record = self.logger.makeRecord(
+            self.logger.name, level, '(structured)', 0, StructuredMessage(message, fields), None, exc_info,
+            extra={'category': category},
+        )
+        self.logger.handle(record)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(logging.getLogger(name))
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .outbox import drain_outbox
+
+
+@shared_task(name="event_api.tasks.drain_tracking_outbox", ignore_result=True)
+def drain_tracking_outbox(max_batches: int = 10):
+    """Deliver due tracking outbox rows; scheduled by CELERY_BEAT_SCHEDULE"""
+    return drain_outbox(max_batches=max_batches)
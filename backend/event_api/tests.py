@@ -1,10 +1,47 @@
+import asyncio
 import json
+import os
+import pstats
+import random
+import tempfile
 import logging
+import queue
+import threading
+import time
 from io import StringIO
+from logging.handlers import QueueListener
+from datetime import datetime, timedelta, timezone
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.http import HttpResponse
 from django.urls import reverse
+from django.utils.timezone import now as timezone_now
 from rest_framework import status
+from unittest import mock
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
 from rest_framework.test import APITestCase
-from .storage import memory_store
+from .storage import EventRecord, EventStore, memory_store, to_epoch_us
+from .models import Event, EventRollup, TrackingOutbox
+from .ids import new_event_id
+from .pagination import decode_cursor, encode_cursor
+from .filters import EventFilter
+from .ingest import build_event
+from .writebehind import BufferFull, WriteBehindBuffer
+from .views import AsyncEventView
+from .serializers import EventSerializer
+from .tracking import VENDORS, TrackingClient
+from .dispatch import DispatchQueue
+from .circuit import CircuitBreaker
+from .outbox import drain_outbox, save_events
+from .tasks import drain_tracking_outbox
+from .sinks import VendorSink
+from .vendor_stub import VendorStub
+from .transport import HTTPTransport, TransportError
+from .validation import validate_event
+from .error_capture import ErrorCaptureMiddleware, ExceptionDeduplicator, exception_fingerprint
+from .log_handlers import JSONFormatter, NonBlockingQueueHandler
+from . import metrics, structured_log
+from .profiling import ProfilingMiddleware, RequestTimings, record_stage
 
 class EventAPITests(APITestCase):
     def setUp(self):
@@ -26,9 +63,9 @@ class EventAPITests(APITestCase):
         self.assertIn('id', response.data)
         self.assertTrue(response.data['id'].startswith('evt_'))
         self.assertEqual(len(memory_store), 1)
-        stored_event = memory_store[0]
-        self.assertEqual(stored_event['event'], data['event'])
-        self.assertEqual(stored_event['user_id'], data['user_id'])
+        stored_event = memory_store.recent(data['user_id'], 1)[0]
+        self.assertEqual(stored_event.event, data['event'])
+        self.assertEqual(stored_event.user_id, data['user_id'])
     def test_metadata_too_large(self):
         url = reverse('create-event')
         large_metadata = {"key": "x" * 3000}
@@ -58,8 +95,8 @@ class EventAPITests(APITestCase):
         self.assertEqual(response['X-Request-ID'], custom_request_id)
         
         # Verify the custom request ID was stored with the event
-        stored_event = memory_store[0]
-        self.assertEqual(stored_event['request_id'], custom_request_id)
+        stored_event = memory_store.recent(data['user_id'], 1)[0]
+        self.assertEqual(stored_event.request_id, custom_request_id)
 
 class EventListTests(APITestCase):
     
@@ -71,26 +108,29 @@ class EventListTests(APITestCase):
         self.other_user = "u_other_456"
         
         for i in range(10):
-            memory_store.insert(0, {
-                'id': f'evt_{i:08d}',
-                'received_at': f'2026-01-07T11:{i:02d}:00Z',
-                'client_ts': f'2026-01-07T11:{i:02d}:00Z',
-                'event': f'event_{i}',
-                'user_id': self.test_user,
-                'metadata': {'index': i},
-                'request_id': f'req_{i}'
-            })
+            self._create_event(
+                id=f'evt_{i:08d}',
+                ts=datetime(2026, 1, 7, 11, i, tzinfo=timezone.utc),
+                event=f'event_{i}',
+                user_id=self.test_user,
+                metadata={'index': i},
+                request_id=f'req_{i}'
+            )
         
         for i in range(5):
-            memory_store.insert(0, {
-                'id': f'evt_other_{i:03d}',
-                'received_at': f'2026-01-07T12:{i:02d}:00Z',
-                'client_ts': f'2026-01-07T12:{i:02d}:00Z',
-                'event': f'other_event_{i}',
-                'user_id': self.other_user,
-                'metadata': {},
-                'request_id': f'req_other_{i}'
-            })
+            self._create_event(
+                id=f'evt_other_{i:03d}',
+                ts=datetime(2026, 1, 7, 12, i, tzinfo=timezone.utc),
+                event=f'other_event_{i}',
+                user_id=self.other_user,
+                metadata={},
+                request_id=f'req_other_{i}'
+            )
+
+    def _create_event(self, ts, **fields):
+        """Store an event the way POST does: table row first, then cache"""
+        event = Event.objects.create(received_at=ts, client_ts=ts, **fields)
+        memory_store.add(EventRecord.from_model(event))
     
     def tearDown(self):
         """Clean up after each test"""
@@ -112,6 +152,1508 @@ class EventListTests(APITestCase):
             expected_index = 9 - i  # Most recent first
             self.assertEqual(event['event'], f'event_{expected_index}')
             self.assertEqual(event['metadata']['index'], expected_index)
+            self.assertEqual(event['received_at'], f'2026-01-07T11:{expected_index:02d}:00+00:00')
+
+    def test_get_events_respects_limit(self):
+        """Test that only the newest `limit` events are returned"""
+        url = reverse('create-event')
+        response = self.client.get(url, {'user_id': self.test_user, 'limit': 3})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [event['event'] for event in response.data['events']],
+            ['event_9', 'event_8', 'event_7']
+        )
+
+    def test_cursor_pages_through_history(self):
+        """Test that next_cursor walks older pages without repeats"""
+        url = reverse('create-event')
+        seen = []
+        params = {'user_id': self.test_user, 'limit': 4}
+        while True:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(event['event'] for event in response.data['events'])
+            if not response.data['next_cursor']:
+                break
+            params['cursor'] = response.data['next_cursor']
+
+        self.assertEqual(seen, [f'event_{i}' for i in range(9, -1, -1)])
+
+    def test_invalid_cursor_rejected(self):
+        url = reverse('create-event')
+        for cursor in ('not-a-cursor', encode_cursor(10 ** 20, 'evt_x')):
+            response = self.client.get(url, {'user_id': self.test_user, 'cursor': cursor})
+
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('cursor', response.data['error']['details'])
+
+    def test_db_page_uses_keyset_cursor(self):
+        """Test that the Event queryset pages by (received_at, id)"""
+        first = list(Event.objects.page(self.test_user, 3))
+        last = first[-1]
+        second = list(Event.objects.page(self.test_user, 3, before=(last.received_at, last.id)))
+
+        self.assertEqual([e.event for e in first], ['event_9', 'event_8', 'event_7'])
+        self.assertEqual([e.event for e in second], ['event_6', 'event_5', 'event_4'])
+
+    def test_cache_miss_reads_through_to_database(self):
+        """Test that an empty cache (e.g. after a restart) is filled from the table"""
+        memory_store.clear()
+        url = reverse('create-event')
+        hits, misses = memory_store.hits, memory_store.misses
+
+        first = self.client.get(url, {'user_id': self.test_user, 'limit': 5})
+        second = self.client.get(url, {'user_id': self.test_user, 'limit': 5})
+
+        self.assertEqual([e['event'] for e in first.data['events']], [f'event_{i}' for i in range(9, 4, -1)])
+        self.assertEqual(second.data['events'], first.data['events'])
+        self.assertEqual(memory_store.misses - misses, 1)
+        self.assertEqual(memory_store.hits - hits, 1)
+        self.assertEqual(len(memory_store.recent(self.test_user, 20)), 5)
+
+    def test_partial_page_reads_through_and_marks_history_complete(self):
+        """Test that a page larger than the cached history is topped up from the table"""
+        memory_store.clear()
+        memory_store.add(EventRecord.from_model(Event.objects.get(id='evt_00000009')))
+        url = reverse('create-event')
+
+        response = self.client.get(url, {'user_id': self.test_user})
+        self.assertEqual(response.data['count'], 10)
+
+        misses = memory_store.misses
+        response = self.client.get(url, {'user_id': self.test_user, 'limit': 50})
+        self.assertEqual(response.data['count'], 10)
+        self.assertEqual(memory_store.misses, misses)
+
+    def test_delete_user_keeps_other_users_cached(self):
+        """Test that DELETE for one user leaves other users' index intact"""
+        url = reverse('delete-events')
+        response = self.client.delete(f"{url}?user_id={self.test_user}")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['deleted_cache'], 10)
+        self.assertEqual(len(memory_store), 5)
+        self.assertEqual(memory_store.recent(self.test_user, 20), [])
+        self.assertEqual(len(memory_store.recent(self.other_user, 20)), 5)
+
+class EventFilterTests(APITestCase):
+    NAMES = ('page_view', 'click', 'signup')
+
+    def setUp(self):
+        memory_store.clear()
+        self.base = datetime(2026, 1, 7, 10, 0, tzinfo=timezone.utc)
+        self.rows = []
+        for i in range(30):
+            # client_ts runs backwards, so client_ts and received_at orders differ
+            self.rows.append(Event.objects.create(
+                id=f'evt_{i:08d}', received_at=self.base + timedelta(minutes=i),
+                client_ts=self.base + timedelta(minutes=30 - i), event=self.NAMES[i % 3], user_id='u_f',
+                metadata={'plan': 'pro' if i % 4 == 0 else 'free', 'n': i, 'beta': i % 2 == 0}, request_id='req',
+            ))
+        Event.objects.create(id='evt_other', received_at=self.base, client_ts=self.base, event='click',
+                             user_id='u_other', metadata={'plan': 'pro'}, request_id='req')
+
+    def tearDown(self):
+        memory_store.clear()
+
+    def _ids(self, **params):
+        response = self.client.get(reverse('create-event'), {'user_id': 'u_f', 'limit': 100, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return [event['id'] for event in response.data['events']]
+
+    def _expected(self, keep):
+        return [row.id for row in sorted(self.rows, key=lambda row: row.received_at, reverse=True) if keep(row)]
+
+    def _assert_same_from_table_and_cache(self, params, keep):
+        expected = self._expected(keep)
+        memory_store.clear()
+        misses = memory_store.misses
+        self.assertEqual(self._ids(**params), expected)
+        self.assertEqual(memory_store.misses - misses, 1)
+        self.assertEqual(len(memory_store), 0)  # filtered pages are not cached
+
+        self._ids()  # an unfiltered read loads the user's whole history
+        hits = memory_store.hits
+        self.assertEqual(self._ids(**params), expected)
+        self.assertEqual(memory_store.hits - hits, 1)
+
+    def test_filter_by_event_names(self):
+        self._assert_same_from_table_and_cache({'event': 'click'}, lambda row: row.event == 'click')
+        self._assert_same_from_table_and_cache(
+            {'event': ['click', 'signup']}, lambda row: row.event in ('click', 'signup'))
+        self._assert_same_from_table_and_cache(
+            {'event': 'click,signup'}, lambda row: row.event in ('click', 'signup'))
+        self._assert_same_from_table_and_cache({'event': 'missing'}, lambda row: False)
+
+    def test_filter_by_received_at_range(self):
+        since, until = self.base + timedelta(minutes=5), self.base + timedelta(minutes=12)
+        self._assert_same_from_table_and_cache(
+            {'since': since.isoformat(), 'until': until.isoformat()},
+            lambda row: since <= row.received_at < until)
+
+    def test_filter_by_client_ts_range(self):
+        since = self.base + timedelta(minutes=20)
+        self._assert_same_from_table_and_cache(
+            {'since': '2026-01-07T10:20:00Z', 'time_field': 'client_ts', 'event': 'page_view'},
+            lambda row: row.client_ts >= since and row.event == 'page_view')
+
+    def test_filter_by_metadata(self):
+        self._assert_same_from_table_and_cache(
+            {'metadata.plan': 'pro'}, lambda row: row.metadata['plan'] == 'pro')
+        self._assert_same_from_table_and_cache(
+            {'metadata.n': '7'}, lambda row: row.metadata['n'] == 7)
+        self._assert_same_from_table_and_cache(
+            {'metadata.beta': 'true', 'metadata.plan': 'free', 'event': 'signup'},
+            lambda row: row.metadata['beta'] and row.metadata['plan'] == 'free' and row.event == 'signup')
+
+    def test_metadata_keys_named_like_lookups(self):
+        for i, metadata in enumerate(({'contains': 'x', 'isnull': True, 'in': 'y', 'gt': 'b'},
+                                      {'contains': 'xy', 'isnull': False, 'in': 'z', 'gt': 'a'})):
+            self.rows.append(Event.objects.create(
+                id=f'evt_lookup_{i}', received_at=self.base + timedelta(hours=1, minutes=i),
+                client_ts=self.base, event='click', user_id='u_f', metadata=metadata, request_id='req',
+            ))
+        for key, value, expected in (('contains', 'x', 'x'), ('isnull', 'true', True),
+                                     ('in', 'y', 'y'), ('gt', 'a', 'a')):
+            self._assert_same_from_table_and_cache(
+                {f'metadata.{key}': value}, lambda row: row.metadata.get(key, object()) == expected)
+
+    def test_numeric_metadata_matches_alike_from_table_and_cache(self):
+        for i, count in enumerate((3, 3.0, '3', '3.0', 3.5, True)):
+            self.rows.append(Event.objects.create(
+                id=f'evt_count_{i}', received_at=self.base + timedelta(hours=1, minutes=i),
+                client_ts=self.base, event='click', user_id='u_f', metadata={'count': count}, request_id='req',
+            ))
+        # Numbers match by value, strings by text
+        for value, matching in (('3', (0, 1, 2)), ('3.0', (0, 1, 3)), ('3.50', (4,)), ('true', (5,))):
+            ids = {f'evt_count_{i}' for i in matching}
+            self._assert_same_from_table_and_cache({'metadata.count': value}, lambda row: row.id in ids)
+
+    def test_cursor_pages_keep_filters(self):
+        expected = self._expected(lambda row: row.event == 'click')
+        url = reverse('create-event')
+        params = {'user_id': 'u_f', 'limit': 3, 'event': 'click'}
+        seen = []
+        while True:
+            response = self.client.get(url, params)
+            seen.extend(event['id'] for event in response.data['events'])
+            if not response.data['next_cursor']:
+                break
+            params['cursor'] = response.data['next_cursor']
+        self.assertEqual(seen, expected)
+
+    def test_recent_range_served_from_partial_cache(self):
+        """Test that a since newer than the oldest cached event needs no table read"""
+        self._ids(limit=10)  # caches the newest 10 only
+        self.assertFalse(memory_store._by_user['u_f'].complete)
+        since = self.base + timedelta(minutes=25)
+        misses = memory_store.misses
+        self.assertEqual(self._ids(since=since.isoformat(), event='click'),
+                         self._expected(lambda row: row.received_at >= since and row.event == 'click'))
+        self.assertEqual(memory_store.misses, misses)
+
+    def test_invalid_filters_rejected(self):
+        url = reverse('create-event')
+        for params, field in (
+                ({'since': 'yesterday'}, 'since'),
+                # Valid datetimes whose offset puts them outside the UTC datetime range
+                ({'since': '0001-01-01T00:00:00+05:00'}, 'since'),
+                ({'until': '9999-12-31T23:59:59-05:00'}, 'until'),
+                ({'since': '2026-01-07T11:00:00Z', 'until': '2026-01-07T10:00:00Z'}, 'until'),
+                ({'time_field': 'created_at', 'since': '2026-01-07T10:00:00Z'}, 'time_field'),
+                ({'event': 'a,,b'}, 'event'),
+                ({'metadata.a__b': 'x'}, 'metadata.a__b'),
+        ):
+            response = self.client.get(url, {'user_id': 'u_f', **params})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+            self.assertIn(field, response.data['error']['details'])
+
+
+@override_settings(EVENT_ROLLUPS_ENABLED=True, EVENT_ROLLUP_BUCKETS=[3600, 86400], EVENT_STATS_MAX_BUCKETS=48)
+class EventRollupTests(APITestCase):
+
+    def setUp(self):
+        memory_store.clear()
+        self.base = datetime(2026, 1, 7, 0, 0, tzinfo=timezone.utc)
+
+    def tearDown(self):
+        memory_store.clear()
+
+    def _event(self, minutes, event='page_view', user_id='u_r'):
+        received_at = self.base + timedelta(minutes=minutes)
+        return Event(id=new_event_id(), received_at=received_at, client_ts=received_at, event=event,
+                     user_id=user_id, metadata={}, request_id='req')
+
+    def _stats(self, **params):
+        response = self.client.get(reverse('event-stats'), {'user_id': 'u_r', **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response.data
+
+    def _counts(self):
+        return {
+            (r.user_id, r.event, r.bucket_seconds, r.bucket_start): r.count for r in EventRollup.objects.all()
+        }
+
+    def test_inserts_count_into_every_bucket_size(self):
+        save_events([self._event(5), self._event(50), self._event(70, 'click')])
+        save_events([self._event(55)])
+
+        hour = timedelta(hours=1)
+        self.assertEqual(self._counts(), {
+            ('u_r', 'page_view', 3600, self.base): 3,
+            ('u_r', 'click', 3600, self.base + hour): 1,
+            ('u_r', 'page_view', 86400, self.base): 3,
+            ('u_r', 'click', 86400, self.base): 1,
+        })
+
+    def test_posts_are_counted(self):
+        self.client.post(reverse('create-event'), {"event": "page_view", "user_id": "u_r"}, format='json')
+        events = [{"event": "click", "user_id": "u_r"}, {"event": "click", "user_id": "u_other"}]
+        self.client.post(reverse('create-event-batch'), {"events": events}, format='json')
+
+        body = self._stats()
+        self.assertEqual(body['total'], 2)
+        self.assertEqual(body['events'], {'click': 1, 'page_view': 1})
+        self.assertEqual(body['bucket_seconds'], 86400)
+
+    def test_totals_and_series_come_from_buckets(self):
+        save_events([self._event(m, 'click' if m % 2 else 'page_view') for m in (10, 20, 61, 130, 1500)])
+
+        body = self._stats(since='2026-01-07T00:00:00Z', until='2026-01-07T03:00:00Z', interval=3600)
+        self.assertEqual(body['total'], 4)
+        self.assertEqual(body['events'], {'click': 1, 'page_view': 3})
+        self.assertEqual(body['series'], [
+            {'start': '2026-01-07T00:00:00+00:00', 'count': 2, 'events': {'page_view': 2}},
+            {'start': '2026-01-07T01:00:00+00:00', 'count': 1, 'events': {'click': 1}},
+            {'start': '2026-01-07T02:00:00+00:00', 'count': 1, 'events': {'page_view': 1}},
+        ])
+
+        body = self._stats(event='click', since='2026-01-07T00:00:00Z', until='2026-01-08T00:00:00Z')
+        self.assertEqual((body['bucket_seconds'], body['total']), (86400, 1))
+
+        # Unaligned bounds widen to the enclosing hours
+        body = self._stats(since='2026-01-07T00:30:00Z', until='2026-01-07T01:10:00Z')
+        self.assertEqual(body['bucket_seconds'], 3600)
+        self.assertEqual((body['since'], body['until']), ('2026-01-07T00:00:00+00:00', '2026-01-07T02:00:00+00:00'))
+        self.assertEqual(body['total'], 3)
+
+        # ...but not past the last datetime
+        body = self._stats(since='2026-01-07T00:00:00Z', until='9999-12-31T23:30:00Z')
+        self.assertEqual(body['until'], datetime.max.replace(tzinfo=timezone.utc).isoformat())
+        self.assertEqual(body['total'], 5)
+
+    def test_stats_cost_does_not_grow_with_events(self):
+        save_events([self._event(i % 120) for i in range(500)])
+
+        with self.assertNumQueries(1):
+            body = self._stats(since='2026-01-07T00:00:00Z', until='2026-01-07T02:00:00Z', interval=3600)
+        self.assertEqual([bucket['count'] for bucket in body['series']], [260, 240])
+
+    def test_delete_drops_the_users_rollups(self):
+        save_events([self._event(5), self._event(6, user_id='u_other')])
+
+        response = self.client.delete(f"{reverse('delete-events')}?user_id=u_r")
+        self.assertEqual(response.data['deleted_db'], 1)
+        self.assertEqual(self._stats()['total'], 0)
+        self.assertEqual(set(EventRollup.objects.values_list('user_id', flat=True)), {'u_other'})
+
+        self.client.delete(reverse('delete-events'))
+        self.assertEqual(EventRollup.objects.count(), 0)
+
+    async def test_async_view_counts_and_deletes(self):
+        view = AsyncEventView.as_view()
+        factory = AsyncRequestFactory()
+        request = factory.post('/api/v1/events', data={"event": "page_view", "user_id": "u_r"},
+                               content_type='application/json')
+        self.assertEqual((await view(request)).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(await EventRollup.objects.filter(user_id='u_r', count=1).acount(), 2)
+
+        await view(factory.delete('/api/v1/events/?user_id=u_r'))
+        self.assertEqual(await EventRollup.objects.acount(), 0)
+
+    def test_rebuild_matches_incremental_counts(self):
+        rng = random.Random(7)
+        events = [
+            self._event(rng.randrange(3 * 24 * 60), rng.choice(['click', 'page_view']), rng.choice(['u_r', 'u_s']))
+            for _ in range(300)
+        ]
+        for start in range(0, len(events), 40):
+            save_events(events[start:start + 40])
+        incremental = self._counts()
+
+        EventRollup.objects.update(count=0)
+        out = StringIO()
+        call_command('rebuild_rollups', '--chunk-size', '50', stdout=out)
+        self.assertIn('Counted 300 events', out.getvalue())
+        self.assertEqual(self._counts(), incremental)
+
+        call_command('rebuild_rollups', '--user-id', 'u_s', stdout=StringIO())
+        self.assertEqual(self._counts(), incremental)
+
+        for since_hour in (0, 7, 30):
+            since = self.base + timedelta(hours=since_hour)
+            until = since + timedelta(hours=17)
+            expected = sum(1 for e in events if e.user_id == 'u_r' and e.event == 'click'
+                           and since <= e.received_at < until)
+            body = self._stats(event='click', since=since.isoformat(), until=until.isoformat())
+            self.assertEqual(body['total'], expected)
+
+    def test_invalid_parameters(self):
+        url = reverse('event-stats')
+        for params, field in (
+                ({}, 'user_id'),
+                ({'user_id': 'u_r', 'interval': '60'}, 'interval'),
+                ({'user_id': 'u_r', 'interval': '3600'}, 'interval'),
+                ({'user_id': 'u_r', 'interval': '3600', 'since': '2026-01-01T00:00:00Z',
+                  'until': '2026-01-05T00:00:00Z'}, 'interval'),
+                ({'user_id': 'u_r', 'metadata.plan': 'pro'}, 'metadata.plan'),
+                ({'user_id': 'u_r', 'time_field': 'client_ts'}, 'time_field'),
+                ({'user_id': 'u_r', 'since': 'yesterday'}, 'since'),
+        ):
+            response = self.client.get(url, params, HTTP_X_REQUEST_ID='req_stats')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+            self.assertIn(field, response.data['error']['details'])
+            self.assertEqual(response['X-Request-ID'], 'req_stats')
+
+    @override_settings(EVENT_ROLLUPS_ENABLED=False)
+    def test_disabled(self):
+        save_events([self._event(5)])
+        self.assertEqual(EventRollup.objects.count(), 0)
+        response = self.client.get(reverse('event-stats'), {'user_id': 'u_r'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class EventBatchTests(APITestCase):
+
+    def setUp(self):
+        memory_store.clear()
+
+    def tearDown(self):
+        memory_store.clear()
+
+    def test_batch_persisted_with_single_insert(self):
+        url = reverse('create-event-batch')
+        events = [{"event": "page_view", "user_id": "u_batch", "metadata": {"n": i}} for i in range(5)]
+
+        with self.assertNumQueries(1):
+            response = self.client.post(url, {"events": events}, format='json', HTTP_X_REQUEST_ID='req_batch')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['accepted'], 5)
+        self.assertEqual(Event.objects.filter(user_id='u_batch', request_id='req_batch').count(), 5)
+        cached = memory_store.recent('u_batch', 10)
+        self.assertEqual([e.metadata['n'] for e in cached], [4, 3, 2, 1, 0])
+
+    def test_batch_reports_per_item_results(self):
+        url = reverse('create-event-batch')
+        events = [
+            {"event": "page_view", "user_id": "u_batch"},
+            {"event": "x", "user_id": "u_batch"},
+            "not-an-object",
+        ]
+        response = self.client.post(url, {"events": events}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        results = response.data['results']
+        self.assertTrue(results[0]['accepted'])
+        self.assertTrue(results[0]['id'].startswith('evt_'))
+        self.assertIn('event', results[1]['details'])
+        self.assertFalse(results[2]['accepted'])
+        self.assertEqual(Event.objects.count(), 1)
+
+    def test_batch_size_limit(self):
+        url = reverse('create-event-batch')
+        events = [{"event": "page_view", "user_id": "u_batch"}] * 3
+
+        with self.settings(EVENT_BATCH_MAX_SIZE=2):
+            response = self.client.post(url, {"events": events}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('events', response.data['details'])
+        self.assertEqual(Event.objects.count(), 0)
+
+class EventStreamTests(APITestCase):
+
+    def setUp(self):
+        memory_store.clear()
+
+    def tearDown(self):
+        memory_store.clear()
+
+    def test_ndjson_lines_stored_in_chunks(self):
+        url = reverse('stream-events')
+        body = '\n'.join(
+            json.dumps({"event": "backfill", "user_id": "u_stream", "metadata": {"n": i}}) for i in range(5)
+        ) + '\n'
+
+        with self.settings(EVENT_STREAM_CHUNK_SIZE=2), mock.patch('event_api.ingest.track_events') as track:
+            response = self.client.post(f"{url}?track=false", data=body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['lines'], 5)
+        self.assertEqual(response.data['accepted'], 5)
+        self.assertEqual(Event.objects.filter(user_id='u_stream').count(), 5)
+        track.assert_not_called()
+
+    def test_ndjson_reports_rejected_lines(self):
+        url = reverse('stream-events')
+        body = '\n'.join([
+            json.dumps({"event": "backfill", "user_id": "u_stream"}),
+            '',
+            '{not json',
+            json.dumps(["not", "an", "object"]),
+            json.dumps({"event": "x", "user_id": "u_stream"}),
+        ])
+
+        response = self.client.post(url, data=body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['accepted'], 1)
+        self.assertEqual(response.data['rejected'], 3)
+        self.assertEqual([error['line'] for error in response.data['errors']], [3, 4, 5])
+        self.assertIn('event', response.data['errors'][2]['details'])
+
+    def test_overlong_line_skipped(self):
+        url = reverse('stream-events')
+        long_line = json.dumps({"event": "backfill", "user_id": "u_stream", "metadata": {"k": "x" * 200}})
+        body = long_line + '\n' + json.dumps({"event": "backfill", "user_id": "u_stream"}) + '\n'
+
+        with self.settings(EVENT_STREAM_MAX_LINE_BYTES=64):
+            response = self.client.post(url, data=body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.data['accepted'], 1)
+        self.assertEqual(response.data['errors'][0]['line'], 1)
+
+class AsyncEventViewTests(TestCase):
+
+    def setUp(self):
+        memory_store.clear()
+        self.view = AsyncEventView.as_view()
+        self.factory = AsyncRequestFactory()
+
+    def tearDown(self):
+        memory_store.clear()
+
+    async def test_post_get_delete_round_trip(self):
+        request = self.factory.post(
+            '/api/v1/events',
+            data={"event": "page_view", "user_id": "u_async", "metadata": {"page": "/"}},
+            content_type='application/json',
+            headers={'X-Request-ID': 'req_async'},
+        )
+        response = await self.view(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response['X-Request-ID'], 'req_async')
+        event_id = json.loads(response.content)['id']
+        self.assertEqual(await Event.objects.filter(id=event_id, request_id='req_async').acount(), 1)
+
+        memory_store.clear()
+        response = await self.view(self.factory.get('/api/v1/events', {'user_id': 'u_async'}))
+        body = json.loads(response.content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([e['id'] for e in body['events']], [event_id])
+
+        response = await self.view(self.factory.delete('/api/v1/events/?user_id=u_async'))
+        self.assertEqual(json.loads(response.content)['deleted_db'], 1)
+        self.assertEqual(await Event.objects.acount(), 0)
+
+    async def test_validation_errors_match_sync_view(self):
+        request = self.factory.post(
+            '/api/v1/events', data={"event": "x", "user_id": "u_async"}, content_type='application/json'
+        )
+        response = await self.view(request)
+        body = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(body['error'], 'VALIDATION_ERROR')
+        self.assertIn('event', body['details'])
+
+        response = await self.view(self.factory.get('/api/v1/events'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class WriteBehindTests(APITestCase):
+
+    def setUp(self):
+        memory_store.clear()
+        self.buffer = WriteBehindBuffer(max_batch=2, max_queue=4, autostart=False)
+        patcher = mock.patch('event_api.writebehind.write_behind', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        memory_store.clear()
+
+    def _events(self, count):
+        return [
+            build_event({'event': 'page_view', 'user_id': 'u_wb', 'request_id': 'req_wb'})
+            for _ in range(count)
+        ]
+
+    def test_flush_commits_in_batches(self):
+        self.buffer.submit(self._events(3))
+        self.assertEqual(Event.objects.count(), 0)
+
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(Event.objects.count(), 3)
+        stats = self.buffer.stats()
+        self.assertEqual(stats['flushes'], 2)
+        self.assertEqual(stats['max_batch_size'], 2)
+        self.assertEqual(stats['pending'], 0)
+
+    def test_queue_is_bounded(self):
+        self.buffer.submit(self._events(3))
+        with self.assertRaises(BufferFull):
+            self.buffer.submit(self._events(2))
+        self.assertEqual(self.buffer.stats()['rejected_events'], 2)
+
+    @override_settings(EVENT_WRITE_BEHIND_ENABLED=True, EVENT_WRITE_BEHIND_ACK='accepted')
+    def test_post_is_readable_before_commit_and_delete_flushes_first(self):
+        url = reverse('create-event')
+        response = self.client.post(url, {"event": "page_view", "user_id": "u_wb"}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Event.objects.count(), 0)
+        self.assertEqual(memory_store.recent('u_wb', 1)[0].id, response.data['id'])
+
+        response = self.client.delete(f"{reverse('delete-events')}?user_id=u_wb")
+        self.assertEqual(response.data['deleted_db'], 1)
+        self.assertEqual(self.buffer.stats()['pending'], 0)
+        self.assertEqual(Event.objects.count(), 0)
+
+    @override_settings(EVENT_WRITE_BEHIND_ENABLED=True)
+    def test_full_queue_returns_503(self):
+        self.buffer.submit(self._events(4))
+        url = reverse('create-event')
+        response = self.client.post(url, {"event": "page_view", "user_id": "u_wb"}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(memory_store.recent('u_wb', 1), [])
+
+class WriteBehindFlusherTests(TransactionTestCase):
+
+    def test_background_flusher_commits_durably(self):
+        buffer = WriteBehindBuffer(max_batch=100, flush_interval=0.01)
+        events = [build_event({'event': 'page_view', 'user_id': 'u_wb', 'request_id': 'req_wb'})]
+        try:
+            ticket = buffer.submit(events)
+            self.assertTrue(ticket.wait(5))
+        finally:
+            buffer.stop()
+        self.assertEqual(Event.objects.filter(user_id='u_wb').count(), 1)
+
+class EventStoreTests(SimpleTestCase):
+
+    def _event(self, user_id, index):
+        return EventRecord(f'evt_{user_id}_{index}', f'event_{index}', user_id, index, index, None, 'req')
+
+    def test_global_cap_evicts_oldest_event(self):
+        store = EventStore(max_events=3)
+        store.add(self._event('u_a', 0))
+        store.add(self._event('u_b', 0))
+        store.add(self._event('u_a', 1))
+        store.add(self._event('u_b', 1))
+
+        self.assertEqual(len(store), 3)
+        self.assertEqual([e.id for e in store.recent('u_a', 10)], ['evt_u_a_1'])
+        self.assertEqual(store.stats()['evicted_global'], 1)
+
+    def test_per_user_cap_evicts_that_users_oldest_event(self):
+        store = EventStore(max_events_per_user=2)
+        for i in range(4):
+            store.add(self._event('u_a', i))
+        store.add(self._event('u_b', 0))
+
+        self.assertEqual([e.id for e in store.recent('u_a', 10)], ['evt_u_a_3', 'evt_u_a_2'])
+        self.assertEqual(len(store.recent('u_b', 10)), 1)
+        self.assertEqual(store.stats()['evicted_per_user'], 2)
+
+    def test_global_eviction_skips_events_already_removed(self):
+        store = EventStore(max_events=2)
+        store.add(self._event('u_a', 0))
+        store.delete_user('u_a')
+        store.add(self._event('u_b', 0))
+        store.add(self._event('u_b', 1))
+        store.add(self._event('u_b', 2))
+
+        self.assertEqual([e.id for e in store.recent('u_b', 10)], ['evt_u_b_2', 'evt_u_b_1'])
+        self.assertEqual(store.stats()['evicted_global'], 1)
+
+    def test_global_eviction_never_drops_a_filled_logs_newest_event(self):
+        store = EventStore(max_events=10)
+        store.add(self._event('u_a', 5))
+        older = [self._event('u_a', i) for i in (4, 3, 2, 1, 0)]
+        page = store.fill('u_a', [store.recent('u_a', 1)[0]] + older[:2], 3)
+        self.assertEqual([e.id for e in page], ['evt_u_a_5', 'evt_u_a_4', 'evt_u_a_3'])
+        for i in range(8):
+            store.add(self._event(f'u_{i}', 10 + i))
+
+        # evt_u_a_5 was queued for eviction first; the log's oldest event goes instead
+        self.assertEqual([e.id for e in store.lookup('u_a', 2)], ['evt_u_a_5', 'evt_u_a_4'])
+        self.assertEqual(len(store), 10)
+        self.assertEqual(store.stats()['evicted_global'], 1)
+
+    def test_record_formats_timestamps_on_read(self):
+        ts = datetime(2026, 1, 7, 11, 30, 15, 250000, tzinfo=timezone.utc)
+        record = EventRecord('evt_1', 'page_view', 'u_a', to_epoch_us(ts), to_epoch_us(ts), {}, 'req')
+
+        self.assertEqual(record.received_at, ts.isoformat())
+        self.assertEqual(record.client_ts, ts.isoformat())
+        self.assertEqual(record.metadata, {})
+
+    def test_out_of_order_add_keeps_history_sorted(self):
+        store = EventStore()
+        for index in (1, 3, 2):
+            store.add(self._event('u_a', index))
+
+        self.assertEqual([e.id for e in store.recent('u_a', 10)], ['evt_u_a_3', 'evt_u_a_2', 'evt_u_a_1'])
+        self.assertEqual([e.id for e in store.recent('u_a', 10, before=(3, 'evt_u_a_3'))], ['evt_u_a_2', 'evt_u_a_1'])
+
+    def test_full_page_fill_drops_older_cached_events(self):
+        """Test that a cached event older than a full DB page is not served across a gap"""
+        store = EventStore(ttl=None)
+        store.add(self._event('u_a', 1))
+        page = store.fill('u_a', [self._event('u_a', 9), self._event('u_a', 8)], limit=2)
+
+        self.assertEqual([e.id for e in page], ['evt_u_a_9', 'evt_u_a_8'])
+        self.assertIsNone(store.lookup('u_a', 3))
+        self.assertEqual(len(store), 2)
+
+    def test_filtered_lookup_uses_maintained_indexes(self):
+        store = EventStore(max_events_per_user=50, ttl=None)
+        for i in range(60):
+            store.add(EventRecord(f'evt_{i:04d}', f'event_{i % 3}', 'u_a', i, 100 - i,
+                                  {'even': i % 2 == 0}, 'req'))
+        store.fill('u_a', [], 100)
+        query = EventFilter(events=frozenset({'event_1'}), metadata=(('even', 'true'),))
+        expected = [f'evt_{i:04d}' for i in range(59, 9, -1) if i % 3 == 1 and i % 2 == 0]
+
+        self.assertEqual([e.id for e in store.lookup('u_a', 100, query=query)], expected)
+        # Index kept in step with appends and per-user eviction (which also
+        # makes the log incomplete, so lookup() would now read the table)
+        store.add(EventRecord('evt_0064', 'event_1', 'u_a', 64, 36, {'even': True}, 'req'))
+        self.assertIsNone(store.lookup('u_a', 100, query=query))
+        self.assertEqual([e.id for e in store._by_user['u_a'].matching(query, 100)], ['evt_0064'] + expected[:-1])
+        index = store._by_user['u_a'].index
+        self.assertEqual(len(index.by_client_ts), 50)
+        self.assertEqual(sum(len(records) for records in index.by_event.values()), 50)
+
+        log = store._by_user['u_a']
+        by_client = EventFilter(time_field='client_ts', since_us=45, until_us=50)
+        self.assertEqual([e.id for e in log.matching(by_client, 100)], [f'evt_{i:04d}' for i in range(55, 50, -1)])
+        self.assertEqual([e.id for e in log.matching(by_client, 2, before=(54, 'evt_0054'))],
+                         ['evt_0053', 'evt_0052'])
+
+    def test_filtered_lookup_matches_brute_force(self):
+        rng = random.Random(7)
+        store = EventStore(ttl=None)
+        records = [
+            EventRecord(f'evt_{i:04d}', rng.choice('abcd'), 'u_a', rng.randrange(500), rng.randrange(500),
+                        {'k': rng.choice(['x', 'y', 1, True, None])}, 'req')
+            for i in range(300)
+        ]
+        for record in records:
+            store.add(record)
+        store.fill('u_a', [], 1000)
+        newest_first = sorted(records, key=lambda r: (r.received_at_us, r.id), reverse=True)
+
+        for _ in range(200):
+            since = rng.choice([None, rng.randrange(500)])
+            query = EventFilter(
+                events=rng.choice([None, frozenset(rng.sample('abcde', rng.randint(1, 3)))]),
+                time_field=rng.choice(['received_at', 'client_ts']),
+                since_us=since,
+                until_us=rng.choice([None, (since or 0) + rng.randrange(1, 200)]),
+                metadata=rng.choice([(), (('k', rng.choice(['x', '1', 'true', 'null'])),)]),
+            )
+            before = rng.choice([None, (rng.randrange(500), 'evt_0150')])
+            limit = rng.randint(1, 40)
+            expected = [r.id for r in newest_first
+                        if (before is None or (r.received_at_us, r.id) < before) and query.matches(r)][:limit]
+            self.assertEqual([r.id for r in store.lookup('u_a', limit, before, query)], expected, query)
+
+    def test_configure_shrinks_existing_cache(self):
+        store = EventStore()
+        for i in range(5):
+            store.add(self._event('u_a', i))
+        store.configure(max_events=10, max_events_per_user=2)
+
+        self.assertEqual(len(store), 2)
+        self.assertEqual([e.id for e in store.recent('u_a', 10)], ['evt_u_a_4', 'evt_u_a_3'])
+
+class EventIdTests(SimpleTestCase):
+
+    def test_ids_are_monotonic_and_sortable(self):
+        ids = [new_event_id() for _ in range(1000)]
+
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertTrue(all(event_id.startswith('evt_') and len(event_id) == 30 for event_id in ids))
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(123, 'evt_x')), (123, 'evt_x'))
+        with self.assertRaises(ValueError):
+            decode_cursor('%%%')
+        with self.assertRaises(ValueError):
+            decode_cursor(encode_cursor(10 ** 20, 'evt_x'))
+
+class EventValidationTests(SimpleTestCase):
+    """validate_event must accept, normalise and reject exactly like EventSerializer"""
+
+    CASES = [
+        {'event': 'click', 'user_id': 'u_1'},
+        {'event': '  click  ', 'user_id': ' u_1 ', 'request_id': ' req_1 '},
+        {'event': 'click', 'user_id': 'u_1', 'client_ts': '2025-01-01T10:00:00Z'},
+        {'event': 'click', 'user_id': 'u_1', 'client_ts': '2025-01-01T12:00:00+02:00'},
+        {'event': 'click', 'user_id': 'u_1', 'client_ts': '2025-01-01T10:00:00'},
+        {'event': 'click', 'user_id': 'u_1', 'client_ts': '2025-01-01'},
+        {'event': 'click', 'user_id': 'u_1', 'client_ts': 'yesterday'},
+        {'event': 'click', 'user_id': 'u_1', 'client_ts': None},
+        {'event': 'click', 'user_id': 'u_1', 'client_ts': 1700000000},
+        {'event': 'click', 'user_id': 'u_1', 'metadata': {'page': 'home', 'n': [1, 2.5, None]}},
+        {'event': 'click', 'user_id': 'u_1', 'metadata': {'blob': 'x' * 2030}},
+        {'event': 'click', 'user_id': 'u_1', 'metadata': {'blob': 'x' * 2040}},
+        {'event': 'click', 'user_id': 'u_1', 'metadata': ['not', 'an', 'object']},
+        {'event': 'click', 'user_id': 'u_1', 'metadata': None},
+        {'event': 'click', 'user_id': 'u_1', 'metadata': {'bad': float('nan')}},
+        {'event': 'click', 'user_id': 12345},
+        {'event': 'ab', 'user_id': 'u_1'},
+        {'event': 'x' * 65, 'user_id': 'u_1'},
+        {'event': '   ', 'user_id': 'u_1'},
+        {'event': 'cl\x00ick', 'user_id': 'u_1'},
+        {'event': 'cl\ud800ick', 'user_id': 'u_1'},
+        {'event': 'clíck', 'user_id': 'üser'},
+        {'event': None, 'user_id': 'u_1'},
+        {'user_id': 'u_1'},
+        {'event': 'click', 'user_id': 'u_1', 'request_id': 'r'},
+        {},
+        ['event', 'click'],
+        'click',
+    ]
+
+    def _serializer_result(self, data, request_id=None):
+        if request_id is not None:
+            data = {**data, 'request_id': request_id}
+        serializer = EventSerializer(data=data)
+        if serializer.is_valid():
+            return dict(serializer.validated_data), None
+        return None, serializer.errors
+
+    def _assert_same(self, data, request_id=None):
+        validated, errors = validate_event(data, request_id=request_id)
+        expected, expected_errors = self._serializer_result(data, request_id)
+        self.assertEqual(errors, expected_errors, data)
+        if expected is None:
+            self.assertIsNone(validated)
+            return
+        metadata_json = validated.pop('metadata_json')
+        if metadata_json is not None:
+            self.assertEqual(json.loads(metadata_json), validated['metadata'])
+        if isinstance(data, dict) and data.get('client_ts') is None:
+            # Both default to now(); only the type and timezone can be compared
+            self.assertEqual(validated.pop('client_ts').utcoffset(), expected.pop('client_ts').utcoffset())
+        self.assertEqual(validated, expected, data)
+
+    def test_matches_event_serializer(self):
+        for data in self.CASES:
+            with self.subTest(data=data):
+                self._assert_same(data)
+
+    def test_request_id_override_matches_event_serializer(self):
+        for data in self.CASES:
+            if isinstance(data, dict):
+                with self.subTest(data=data):
+                    self._assert_same(data, request_id='req_header')
+                    self._assert_same(data, request_id='x')
+
+    def test_encoded_metadata_is_reused_for_tracking(self):
+        metadata = {'page': 'home', 'items': [1, 2]}
+        validated, _ = validate_event({'event': 'click', 'user_id': 'u_1', 'metadata': metadata})
+        client = TrackingClient()
+        bodies = client._encode_vendor_payloads(
+            'u_1', 'click', {'event_id': 'evt_1', 'metadata': metadata}, 'req_1', validated['metadata_json']
+        )
+        plain = client._encode_vendor_payloads('u_1', 'click', {'event_id': 'evt_1', 'metadata': metadata}, 'req_1', None)
+
+        for vendor, body in bodies.items():
+            decoded, expected = json.loads(body), json.loads(plain[vendor])
+            for payload in (decoded, expected):
+                payload.pop('timestamp', None)
+                payload['properties'].pop('time', None)
+            self.assertEqual(decoded, expected)
+            self.assertEqual(decoded['properties']['metadata'], metadata)
+
+class DispatchQueueTests(SimpleTestCase):
+
+    def _blocked_queue(self, **options):
+        """Queue whose single worker is parked on the first job until `release` is set"""
+        release = threading.Event()
+        handled = []
+
+        def handler(job):
+            release.wait(5)
+            handled.append(job)
+
+        queue = DispatchQueue(handler, workers=1, **options)
+        self.addCleanup(queue.stop, 5)
+        self.addCleanup(release.set)
+        queue.submit('first')
+        while queue.stats()['active'] == 0:
+            time.sleep(0.001)
+        return queue, release, handled
+
+    def test_jobs_are_handled_and_drained(self):
+        handled = []
+        queue = DispatchQueue(handled.append, workers=3)
+        self.addCleanup(queue.stop)
+        for i in range(50):
+            self.assertTrue(queue.submit(i))
+
+        self.assertTrue(queue.drain(5))
+        self.assertEqual(sorted(handled), list(range(50)))
+        stats = queue.stats()
+        self.assertEqual((stats['depth'], stats['enqueued'], stats['processed'], stats['dropped']), (0, 50, 50, 0))
+
+    def test_drop_newest_rejects_when_full(self):
+        queue, release, handled = self._blocked_queue(max_queue=2)
+        self.assertTrue(queue.submit('a'))
+        self.assertTrue(queue.submit('b'))
+        self.assertFalse(queue.submit('c'))
+
+        release.set()
+        queue.drain(5)
+        self.assertEqual(handled, ['first', 'a', 'b'])
+        self.assertEqual(queue.stats()['dropped'], 1)
+
+    def test_drop_oldest_makes_room(self):
+        queue, release, handled = self._blocked_queue(max_queue=2, overflow='drop_oldest')
+        for job in ('a', 'b', 'c'):
+            self.assertTrue(queue.submit(job))
+
+        release.set()
+        queue.drain(5)
+        self.assertEqual(handled, ['first', 'b', 'c'])
+        self.assertEqual(queue.stats()['dropped'], 1)
+
+    def test_block_waits_then_gives_up(self):
+        queue, release, handled = self._blocked_queue(max_queue=1, overflow='block', block_timeout=0.05)
+        self.assertTrue(queue.submit('a'))
+        started = time.monotonic()
+        self.assertFalse(queue.submit('b'))
+        self.assertGreaterEqual(time.monotonic() - started, 0.04)
+
+        release.set()
+        queue.drain(5)
+        self.assertEqual(handled, ['first', 'a'])
+
+    def test_failed_jobs_are_counted(self):
+        def handler(job):
+            raise RuntimeError('vendor down')
+
+        queue = DispatchQueue(handler, workers=1)
+        self.addCleanup(queue.stop)
+        with self.assertLogs('event_api.dispatch', level='ERROR'):
+            queue.submit('x')
+            queue.drain(5)
+        self.assertEqual(queue.stats()['failed'], 1)
+
+    def test_stop_drains_before_exiting(self):
+        handled = []
+        queue = DispatchQueue(lambda job: (time.sleep(0.001), handled.append(job)), workers=2)
+        for i in range(20):
+            queue.submit(i)
+        queue.stop(5)
+
+        self.assertEqual(len(handled), 20)
+        self.assertFalse(queue.submit('late'))
+
+    def test_track_event_returns_before_vendor_sends(self):
+        client = TrackingClient()
+        dispatcher = client.enable_dispatch(workers=1)
+        self.addCleanup(dispatcher.stop)
+        sent = []
+
+        def slow_send(vendor, body):
+            time.sleep(0.05)
+            sent.append(vendor)
+
+        with mock.patch.object(client, '_send_to_vendor', side_effect=slow_send):
+            started = time.monotonic()
+            self.assertTrue(client.track_event('u_1', 'click', {'metadata': {}}, 'req_1'))
+            self.assertLess(time.monotonic() - started, 0.05)
+            self.assertTrue(dispatcher.drain(5))
+
+        self.assertEqual(sorted(sent), ['mixpanel', 'posthog', 'segment'])
+
+class VendorSinkTests(SimpleTestCase):
+
+    def _sink(self, envelope=(b'[', b']'), **options):
+        sent = []
+        prefix, suffix = envelope
+        sink = VendorSink(
+            'segment', lambda vendor, bodies: sent.append((len(bodies), prefix + b','.join(bodies) + suffix)),
+            envelope=envelope, autostart=False, **options)
+        return sink, sent
+
+    def test_flushes_by_count(self):
+        sink, sent = self._sink(max_events=2, envelope=(b'{"batch":[', b']}'))
+        for i in range(5):
+            sink.add(json.dumps({'n': i}).encode())
+        sink.flush()
+
+        self.assertEqual([count for count, _ in sent], [2, 2, 1])
+        self.assertEqual(json.loads(sent[0][1]), {'batch': [{'n': 0}, {'n': 1}]})
+        self.assertEqual(sink.stats()['sent_bytes'], sum(len(body) for _, body in sent))
+        self.assertEqual(sink.stats()['flush_reasons'], {'count': 2, 'bytes': 0, 'age': 0, 'flush': 1})
+
+    def test_flushes_by_bytes(self):
+        sink, sent = self._sink(max_events=100, max_bytes=75)
+        body = json.dumps({'blob': 'x' * 10}).encode()  # 22 bytes; three fit in a 70-byte batch
+        for _ in range(7):
+            sink.add(body)
+        sink.flush()
+
+        self.assertEqual([count for count, _ in sent], [3, 3, 1])
+        self.assertTrue(all(len(batch) <= 75 for _, batch in sent))
+        self.assertEqual(json.loads(sent[0][1]), [{'blob': 'x' * 10}] * 3)
+
+    def test_oversized_payload_is_sent_alone(self):
+        sink, sent = self._sink(max_bytes=10)
+        sink.add(b'"small"')
+        sink.add(json.dumps('x' * 50).encode())
+        sink.flush()
+
+        self.assertEqual([count for count, _ in sent], [1, 1])
+
+    def test_flushes_by_age(self):
+        sent = []
+        sink = VendorSink('posthog', lambda vendor, bodies: sent.append(len(bodies)), max_age=0.02)
+        self.addCleanup(sink.stop)
+        sink.add(b'{}')
+        deadline = time.monotonic() + 2
+        while not sent and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+        self.assertEqual(sent, [1])
+        self.assertEqual(sink.stats()['flush_reasons']['age'], 1)
+
+    def test_failed_batches_are_counted(self):
+        def send(vendor, bodies):
+            raise RuntimeError('vendor down')
+
+        sink = VendorSink('mixpanel', send, autostart=False)
+        sink.add(b'{}')
+        with self.assertLogs('event_api.sinks', level='ERROR'):
+            sink.flush()
+        self.assertEqual((sink.stats()['failed_batches'], sink.stats()['failed_events']), (1, 1))
+
+    def test_failed_batch_is_retried_after_backoff(self):
+        attempts = []
+
+        def send(vendor, bodies):
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise RuntimeError('vendor down')
+
+        sink = VendorSink('posthog', send, max_events=1, retry_backoff=0.05)
+        self.addCleanup(sink.stop)
+        with self.assertLogs('event_api.sinks', level='WARNING'):
+            sink.add(b'{}')
+            deadline = time.monotonic() + 2
+            while len(attempts) < 2 and time.monotonic() < deadline:
+                time.sleep(0.005)
+
+        self.assertEqual(len(attempts), 2)
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.05)
+        stats = sink.stats()
+        self.assertEqual((stats['sent_events'], stats['retried_batches'], stats['failed_batches']), (1, 1, 0))
+
+    def test_pending_payloads_are_bounded(self):
+        sink, sent = self._sink(max_events=2, max_pending=5)
+        with self.assertLogs('event_api.sinks', level='WARNING'):
+            for i in range(9):
+                sink.add(json.dumps(i).encode())
+
+        self.assertEqual(sink.stats()['pending'], 5)
+        self.assertEqual((sink.stats()['dropped_batches'], sink.stats()['dropped_events']), (2, 4))
+        sink.flush()
+        self.assertEqual([json.loads(body) for _, body in sent], [[4, 5], [6, 7], [8]])
+
+
+class HTTPTransportTests(SimpleTestCase):
+
+    def setUp(self):
+        self.stub = VendorStub().start()
+        self.addCleanup(self.stub.stop)
+        self.transport = HTTPTransport(max_connections=2)
+        self.addCleanup(self.transport.close)
+
+    def test_keep_alive_connection_is_reused(self):
+        for i in range(20):
+            self.assertEqual(self.transport.send(f'{self.stub.url}/segment', b'{"n": %d}' % i, 2), 200)
+
+        self.assertEqual(self.stub.connections, 1)
+        self.assertEqual(len(self.stub.requests_for('segment')), 20)
+        stats = self.transport.stats()
+        self.assertEqual((stats['connections_opened'], stats['connections_reused']), (1, 19))
+
+    def test_gzip_bodies(self):
+        self.transport.gzip_enabled = True
+        self.transport.gzip_min_bytes = 100
+        body = json.dumps([{'event': 'click', 'n': i} for i in range(50)]).encode()
+        self.transport.send(f'{self.stub.url}/mixpanel/batch', body, 2)
+        self.transport.send(f'{self.stub.url}/mixpanel', b'{}', 2)
+
+        gzipped, plain = self.stub.requests_for('mixpanel')
+        self.assertEqual(gzipped.headers.get('Content-Encoding'), 'gzip')
+        self.assertEqual(gzipped.body, body)
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertLess(self.transport.stats()['bytes_sent'], self.transport.stats()['bytes_in'])
+
+    def test_error_status_raises(self):
+        self.stub.error_rate = 1.0
+        with self.assertRaises(TransportError) as raised:
+            self.transport.send(f'{self.stub.url}/posthog', b'{}', 2)
+        self.assertEqual(raised.exception.status, 503)
+        self.assertEqual(self.transport.stats()['errors'], 1)
+
+    def test_concurrency_is_capped_per_host(self):
+        self.stub.latency = 0.05
+        threads = [
+            threading.Thread(target=self.transport.send, args=(f'{self.stub.url}/segment', b'{}', 5))
+            for _ in range(6)
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.stub.requests), 6)
+        self.assertLessEqual(self.stub.connections, 2)
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+    def test_stale_connection_is_replaced(self):
+        stub = VendorStub(idle_timeout=0.05).start()
+        self.addCleanup(stub.stop)
+        self.transport.send(f'{stub.url}/segment', b'{}', 2)
+        time.sleep(0.2)  # the stub drops the idle connection
+        self.transport.send(f'{stub.url}/segment', b'{}', 2)
+
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual(self.transport.stats()['errors'], 0)
+
+    def test_connection_refused_raises(self):
+        stub = VendorStub()
+        url = stub.url
+        stub._server.server_close()
+        with self.assertRaises(TransportError):
+            self.transport.send(f'{url}/segment', b'{}', 1)
+
+
+class TrackingBatchDeliveryTests(SimpleTestCase):
+    """TrackingClient batches per vendor against the local vendor stub"""
+
+    def setUp(self):
+        self.stub = VendorStub().start()
+        self.addCleanup(self.stub.stop)
+        self.client = TrackingClient()
+        self.client.use_vendor_url(self.stub.url)
+        self.client.enable_batching({
+            'segment': {'max_events': 100},
+            'posthog': {'max_events': 1000},
+            'mixpanel': {'max_events': 50},
+        })
+        for sink in self.client.sinks.values():
+            self.addCleanup(sink.stop)
+
+    def test_batches_respect_per_vendor_limits(self):
+        for i in range(250):
+            self.client.track_event(f'u_{i % 7}', 'click', {'event_id': f'evt_{i}', 'metadata': {'i': i}}, 'req_1')
+        self.client.flush()
+
+        # flush() and the flusher thread may send batches concurrently, so arrival order varies
+        self.assertEqual(sorted(len(r.json()['batch']) for r in self.stub.requests_for('segment')), [50, 100, 100])
+        self.assertEqual(len(self.stub.requests_for('posthog')), 1)
+        self.assertEqual([len(r.json()) for r in self.stub.requests_for('mixpanel')], [50] * 5)
+        self.assertEqual(self.stub.requests_for('posthog')[0].json()['api_key'], 'dummy_posthog_key_456')
+
+        segment_events = {e['properties']['event_id']: e for e in self.stub.events_for('segment')}
+        self.assertEqual(set(segment_events), {f'evt_{i}' for i in range(250)})
+        self.assertEqual(segment_events['evt_3']['properties']['metadata'], {'i': 3})
+        self.assertEqual(segment_events['evt_3']['userId'], 'u_3')
+        self.assertEqual(self.client.sinks['segment'].stats()['sent_events'], 250)
+
+    def test_vendor_errors_count_as_failed_batches(self):
+        self.stub.error_rate = 1.0
+        self.client.track_event('u_1', 'click', {'metadata': {}}, 'req_1')
+        with self.assertLogs('event_api.sinks', level='ERROR'):
+            self.client.flush()
+
+        stats = self.client.sinks['segment'].stats()
+        self.assertEqual((stats['failed_batches'], stats['retried_batches']), (1, 3))
+        self.assertEqual(len(self.stub.requests_for('segment')), 4)
+
+class TrackingPayloadTests(SimpleTestCase):
+
+    def test_vendor_payloads(self):
+        properties = {'event_id': 'evt_1', 'metadata': {'page': 'home'}, 'source': 'api_v1'}
+        bodies = TrackingClient()._encode_vendor_payloads('u_1', 'click', properties, 'req_1', '{"page": "home"}')
+        segment, posthog, mixpanel = (json.loads(bodies[vendor]) for vendor in ('segment', 'posthog', 'mixpanel'))
+
+        timestamp = segment['timestamp']
+        epoch = int(datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc).timestamp())
+        self.assertEqual(segment, {
+            'writeKey': 'dummy_write_key_123', 'type': 'track', 'timestamp': timestamp,
+            'event': 'click', 'userId': 'u_1', 'properties': properties,
+            'context': {'library': {'name': 'event-intake-service', 'version': '1.0.0'}, 'requestId': 'req_1'},
+        })
+        self.assertEqual(posthog, {
+            'api_key': 'dummy_posthog_key_456', 'event': 'click', 'distinct_id': 'u_1',
+            'properties': {**properties, 'distinct_id': 'u_1'}, 'timestamp': timestamp,
+        })
+        self.assertEqual(mixpanel, {
+            'event': 'click',
+            'properties': {'token': 'dummy_mixpanel_token_789', 'distinct_id': 'u_1', 'time': epoch,
+                           **properties, 'mp_lib': 'python'},
+        })
+
+    def test_empty_properties_and_unicode(self):
+        bodies = TrackingClient()._encode_vendor_payloads('üser', 'clíck "quoted"', None, None, None)
+
+        self.assertTrue(all(isinstance(body, bytes) for body in bodies.values()))
+        mixpanel = json.loads(bodies['mixpanel'])
+        self.assertEqual(mixpanel['event'], 'clíck "quoted"')
+        self.assertEqual(set(mixpanel['properties']), {'token', 'distinct_id', 'time', 'mp_lib'})
+        self.assertEqual(json.loads(bodies['posthog'])['properties'], {'distinct_id': 'üser'})
+        self.assertTrue(json.loads(bodies['segment'])['context']['requestId'].startswith('req_'))
+
+
+class VendorRoutingTests(SimpleTestCase):
+
+    def _client(self, rules):
+        client = TrackingClient()
+        client.set_routing_rules(rules)
+        return client
+
+    def test_no_rules_routes_everything(self):
+        client = TrackingClient()
+        bodies = client.encode_event('u_1', 'click', {'event_id': 'evt_1'})
+
+        self.assertEqual(set(bodies), set(VENDORS))
+        self.assertEqual({vendor: stats['routed'] for vendor, stats in client.router.stats().items()},
+                         {vendor: 1 for vendor in VENDORS})
+
+    def test_allow_and_deny_lists(self):
+        client = self._client({
+            'mixpanel': {'deny': ['heartbeat', 'debug_*']},
+            'segment': {'allow': ['signup', 'purchase*']},
+        })
+
+        self.assertEqual(set(client.encode_event('u_1', 'heartbeat')), {'posthog'})
+        self.assertEqual(set(client.encode_event('u_1', 'debug_render')), {'posthog'})
+        self.assertEqual(set(client.encode_event('u_1', 'purchase_completed')), set(VENDORS))
+        self.assertEqual(set(client.encode_event('u_1', 'click')), {'posthog', 'mixpanel'})
+
+        stats = client.router.stats()
+        self.assertEqual((stats['mixpanel']['dropped'], stats['mixpanel']['routed']), (2, 2))
+        self.assertEqual((stats['segment']['dropped'], stats['segment']['routed']), (3, 1))
+        self.assertEqual(stats['posthog']['routed'], 4)
+
+    def test_event_wanted_by_no_vendor_is_not_encoded(self):
+        client = self._client({vendor: {'deny': ['noise']} for vendor in VENDORS})
+
+        with mock.patch.object(client, '_build_payload_parts') as build:
+            self.assertIsNone(client.encode_event('u_1', 'noise'))
+            self.assertFalse(client.track_event('u_1', 'noise'))
+        build.assert_not_called()
+
+    def test_sampling_is_deterministic_per_user(self):
+        client = self._client({'mixpanel': {'sample_rate': 0.25}})
+        users = [f'user_{i}' for i in range(2000)]
+
+        first = {user for user in users if 'mixpanel' in client.encode_event(user, 'click')}
+        second = {user for user in users if 'mixpanel' in client.encode_event(user, 'page_view')}
+
+        self.assertEqual(first, second)
+        self.assertAlmostEqual(len(first) / len(users), 0.25, delta=0.05)
+        stats = client.router.stats()['mixpanel']
+        self.assertEqual(stats['routed'] + stats['sampled_out'], 2 * len(users))
+        self.assertEqual(client.router.stats()['segment']['routed'], 2 * len(users))
+
+    def test_sample_rate_bounds(self):
+        client = self._client({'segment': {'sample_rate': 0.0}, 'posthog': {'sample_rate': 1.0}})
+        self.assertEqual(set(client.encode_event('u_1', 'click')), {'posthog', 'mixpanel'})
+
+        with self.assertRaises(ValueError):
+            TrackingClient().set_routing_rules({'segment': {'sample_rate': 1.5}})
+
+    def test_strip_properties(self):
+        client = self._client({
+            'mixpanel': {'strip_properties': ['metadata']},
+            'posthog': {'strip_properties': ['metadata']},
+        })
+        properties = {'event_id': 'evt_1', 'metadata': {'email': 'a@example.com'}, 'source': 'api_v1'}
+        bodies = client.encode_event('u_1', 'click', properties, 'req_1', '{"email": "a@example.com"}')
+
+        self.assertEqual(json.loads(bodies['segment'])['properties'], properties)
+        self.assertEqual(json.loads(bodies['posthog'])['properties'],
+                         {'event_id': 'evt_1', 'source': 'api_v1', 'distinct_id': 'u_1'})
+        mixpanel = json.loads(bodies['mixpanel'])['properties']
+        self.assertNotIn('metadata', mixpanel)
+        self.assertEqual(mixpanel['event_id'], 'evt_1')
+        self.assertEqual(properties['metadata'], {'email': 'a@example.com'})
+
+    def test_invalid_rules(self):
+        with self.assertRaises(ValueError):
+            TrackingClient().set_routing_rules({'amplitude': {'deny': ['x']}})
+        with self.assertRaises(ValueError):
+            TrackingClient().set_routing_rules({'segment': {'block': ['x']}})
+
+
+class TrackingFanOutTests(SimpleTestCase):
+
+    LATENCY = {'segment': 0.03, 'posthog': 0.06, 'mixpanel': 0.09}
+
+    def _client(self, fanout, fail=(), **options):
+        client = TrackingClient()
+        client.fanout = fanout
+        for name, value in options.items():
+            setattr(client, name, value)
+
+        def send(vendor, body):
+            time.sleep(self.LATENCY[vendor])
+            if vendor in fail:
+                raise RuntimeError('vendor down')
+
+        patcher = mock.patch.object(client, '_send_to_vendor', side_effect=send)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return client
+
+    def _timed(self, client):
+        started = time.monotonic()
+        outcomes = client.deliver_event('u_1', 'click', {'metadata': {}}, 'req_1')
+        return outcomes, time.monotonic() - started
+
+    def test_concurrent_latency_is_the_slowest_vendor(self):
+        outcomes, elapsed = self._timed(self._client('concurrent'))
+
+        self.assertEqual(outcomes, {'segment': 'ok', 'posthog': 'ok', 'mixpanel': 'ok'})
+        self.assertGreaterEqual(elapsed, 0.09)
+        self.assertLess(elapsed, 0.17)
+
+    def test_serial_latency_is_the_sum(self):
+        outcomes, elapsed = self._timed(self._client('serial'))
+
+        self.assertEqual(set(outcomes.values()), {'ok'})
+        self.assertGreaterEqual(elapsed, 0.18)
+
+    def test_per_vendor_timeout_and_errors(self):
+        client = self._client('concurrent', fail=('segment',), vendor_timeouts={'mixpanel': 0.02})
+        with self.assertLogs('event_api.tracking', level='WARNING'):
+            outcomes, elapsed = self._timed(client)
+
+        self.assertEqual(outcomes, {'segment': 'error', 'posthog': 'ok', 'mixpanel': 'timeout'})
+        self.assertLess(elapsed, 0.09)
+
+    def test_deadline_bounds_the_whole_fan_out(self):
+        client = self._client('concurrent', fanout_deadline=0.04)
+        with self.assertLogs('event_api.tracking', level='WARNING'):
+            outcomes, elapsed = self._timed(client)
+
+        self.assertEqual(outcomes, {'segment': 'ok', 'posthog': 'timeout', 'mixpanel': 'timeout'})
+        self.assertLess(elapsed, 0.09)
+
+    def test_sends_still_queued_at_the_deadline_are_cancelled(self):
+        client = self._client('concurrent', fanout_deadline=0.04, fanout_workers=1)
+        with self.assertLogs('event_api.tracking', level='WARNING') as logs:
+            outcomes, _ = self._timed(client)
+        time.sleep(0.12)  # posthog, already running, finishes; mixpanel must never start
+
+        self.assertEqual(outcomes, {'segment': 'ok', 'posthog': 'timeout', 'mixpanel': 'timeout'})
+        self.assertEqual([call.args[0] for call in client._send_to_vendor.call_args_list], ['segment', 'posthog'])
+        self.assertIn('No fan-out worker free for mixpanel', '\n'.join(logs.output))
+        self.assertEqual(client.breakers['mixpanel']._failures, 0)
+
+    def test_async_serial_skips_vendors_past_the_deadline(self):
+        client = TrackingClient()
+        client.fanout = 'serial'
+        client.fanout_deadline = 0.04
+
+        async def send(vendor, body):
+            await asyncio.sleep(self.LATENCY[vendor])
+
+        async def run():
+            with mock.patch.object(client, '_asend_to_vendor', side_effect=send) as sender:
+                with self.assertLogs('event_api.tracking', level='WARNING'):
+                    outcomes = await client._adeliver({'segment': b'{}', 'posthog': b'{}', 'mixpanel': b'{}'})
+                return outcomes, [call.args[0] for call in sender.call_args_list]
+
+        failures = metrics.VENDOR_FAILURES.labels('mixpanel', 'timeout')
+        before = failures.values()[0]
+        outcomes, sent = asyncio.run(run())
+
+        self.assertEqual(outcomes, {'segment': 'ok', 'posthog': 'timeout', 'mixpanel': 'timeout'})
+        self.assertEqual(sent, ['segment', 'posthog'])
+        self.assertEqual(client.breakers['mixpanel']._failures, 0)
+        self.assertEqual(client.breakers['posthog']._failures, 1)
+        self.assertEqual(failures.values()[0], before)
+
+    def test_async_fan_out_is_concurrent(self):
+        client = TrackingClient()
+        client.vendor_timeouts = {'mixpanel': 0.02}
+
+        async def send(vendor, body):
+            await asyncio.sleep(self.LATENCY[vendor])
+
+        async def run():
+            with mock.patch.object(client, '_asend_to_vendor', side_effect=send):
+                started = time.monotonic()
+                with self.assertLogs('event_api.tracking', level='WARNING'):
+                    outcomes = await client._adeliver({'segment': b'{}', 'posthog': b'{}', 'mixpanel': b'{}'})
+                return outcomes, time.monotonic() - started
+
+        outcomes, elapsed = asyncio.run(run())
+        self.assertEqual(outcomes, {'segment': 'ok', 'posthog': 'ok', 'mixpanel': 'timeout'})
+        self.assertLess(elapsed, 0.09)
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def test_opens_after_threshold_and_recovers_through_trial(self):
+        breaker = CircuitBreaker('segment', failure_threshold=2, reset_timeout=0.02)
+        for _ in range(2):
+            self.assertTrue(breaker.allow())
+            breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.state, 'open')
+
+        time.sleep(0.03)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # only one trial at a time
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+        self.assertEqual(breaker.stats()['opened'], 1)
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker('segment', failure_threshold=1, reset_timeout=0.02)
+        breaker.record_failure()
+        time.sleep(0.03)
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+    def test_open_vendor_is_skipped_on_the_hot_path(self):
+        client = TrackingClient()
+        client.fanout = 'serial'
+        client.breakers['segment'] = CircuitBreaker('segment', failure_threshold=1, reset_timeout=60)
+        with mock.patch.object(client, '_send_to_vendor', side_effect=RuntimeError('down')) as send:
+            with self.assertLogs('event_api.tracking', level='ERROR'):
+                client.deliver_event('u_1', 'click', {'metadata': {}}, 'req_1')
+            send.reset_mock()
+            outcomes = client.deliver_event('u_1', 'click', {'metadata': {}}, 'req_1')
+
+        self.assertEqual(outcomes['segment'], 'circuit_open')
+        self.assertNotIn('segment', [call.args[0] for call in send.call_args_list])
+
+
+@override_settings(TRACKING_OUTBOX_ENABLED=True, TRACKING_OUTBOX_MAX_ATTEMPTS=3)
+class TrackingOutboxTests(APITestCase):
+
+    def setUp(self):
+        memory_store.clear()
+        self.stub = VendorStub().start()
+        self.addCleanup(self.stub.stop)
+        self.client_tracking = TrackingClient()
+        self.client_tracking.use_vendor_url(self.stub.url)
+        for vendor in self.client_tracking.breakers:
+            self.client_tracking.breakers[vendor] = CircuitBreaker(vendor, failure_threshold=2, reset_timeout=60)
+
+    def _post(self, count):
+        for i in range(count):
+            response = self.client.post(reverse('create-event'), {'event': 'click', 'user_id': f'u_{i}'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_post_writes_outbox_instead_of_calling_vendors(self):
+        with mock.patch('event_api.ingest.track_events') as track:
+            self._post(2)
+
+        track.assert_not_called()
+        self.assertEqual(TrackingOutbox.objects.count(), 6)
+        event = Event.objects.first()
+        self.assertEqual(
+            sorted(TrackingOutbox.objects.filter(event_id=event.id).values_list('vendor', flat=True)),
+            ['mixpanel', 'posthog', 'segment']
+        )
+
+    def test_outbox_rows_commit_with_their_events(self):
+        events = [build_event({'event': 'click', 'user_id': 'u_1', 'request_id': 'req_1'})]
+        events[0].tracking_bodies = {'segment': b'{}'}
+        with mock.patch.object(TrackingOutbox.objects, 'bulk_create', side_effect=RuntimeError('disk full')):
+            with self.assertRaises(RuntimeError):
+                save_events(events)
+
+        self.assertEqual(Event.objects.count(), 0)
+
+    def test_drain_delivers_batches_and_deletes_rows(self):
+        self._post(3)
+        result = drain_outbox(self.client_tracking)
+
+        self.assertEqual({vendor: r['delivered'] for vendor, r in result.items()},
+                         {'segment': 3, 'posthog': 3, 'mixpanel': 3})
+        self.assertEqual(TrackingOutbox.objects.count(), 0)
+        self.assertEqual(len(self.stub.requests_for('segment')), 1)
+        self.assertEqual(len(self.stub.events_for('segment')), 3)
+
+    def test_failing_vendor_backs_off_opens_circuit_and_recovers(self):
+        self._post(2)
+        self.stub.error_rate = 1.0
+        with self.assertLogs('event_api.outbox', level='WARNING'):
+            result = drain_outbox(self.client_tracking)
+        self.assertEqual(result['segment']['retried'], 2)
+        row = TrackingOutbox.objects.filter(vendor='segment').first()
+        self.assertEqual(row.attempts, 1)
+        self.assertGreater(row.next_attempt_at, timezone_now())
+
+        # Due again, still failing: the second failure opens the breaker
+        TrackingOutbox.objects.update(next_attempt_at=timezone_now())
+        with self.assertLogs('event_api.outbox', level='WARNING'):
+            drain_outbox(self.client_tracking)
+        self.assertEqual(self.client_tracking.breakers['segment'].state, 'open')
+
+        TrackingOutbox.objects.update(next_attempt_at=timezone_now())
+        self.stub.reset()
+        result = drain_outbox(self.client_tracking)
+        self.assertTrue(result['segment']['circuit_open'])
+        self.assertEqual(self.stub.requests, [])
+
+        # Vendor back and breaker half-open: everything is delivered
+        self.stub.error_rate = 0.0
+        for breaker in self.client_tracking.breakers.values():
+            breaker.reset_timeout = 0
+        drain_outbox(self.client_tracking)
+        self.assertEqual(TrackingOutbox.objects.count(), 0)
+        self.assertEqual(len(self.stub.events_for('segment')), 2)
+
+    def test_rows_are_dead_after_max_attempts(self):
+        self._post(1)
+        self.stub.error_rate = 1.0
+        self.client_tracking.breakers['posthog'] = CircuitBreaker('posthog', failure_threshold=100)
+        for _ in range(3):
+            TrackingOutbox.objects.update(next_attempt_at=timezone_now())
+            with self.assertLogs('event_api.outbox', level='WARNING'):
+                result = drain_outbox(self.client_tracking)
+
+        self.assertEqual(result['posthog']['dead'], 1)
+        self.assertIsNotNone(TrackingOutbox.objects.get(vendor='posthog').dead_at)
+
+    def test_celery_task_drains_the_outbox(self):
+        self._post(1)
+        with mock.patch('event_api.tracking.tracking_client', self.client_tracking):
+            drain_tracking_outbox.apply()
+
+        self.assertEqual(TrackingOutbox.objects.count(), 0)
+        self.assertEqual(len(self.stub.requests), 3)
 
 # class TrackingTests(APITestCase):
 #     def test_tracking_log_output(self):
@@ -188,4 +1730,365 @@ class EventListTests(APITestCase):
 #         }
         
 #         response = self.client.post(url, data, format='json')
-#         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
\ No newline at end of file
+#         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+def _raise_value_error(message):
+    raise ValueError(message)
+
+
+def _raise_key_error(message):
+    raise KeyError(message)
+
+
+def _caught(raiser, message='boom'):
+    try:
+        raiser(message)
+    except Exception as e:
+        return e
+
+
+class ErrorCaptureTests(SimpleTestCase):
+
+    def _middleware(self, limit=2, window=60.0):
+        middleware = ErrorCaptureMiddleware(lambda request: None)
+        middleware.deduplicator = ExceptionDeduplicator(limit=limit, window=window)
+        return middleware
+
+    def _logged_entries(self, middleware, exceptions):
+        with self.assertLogs('event_api.error_capture', level='ERROR') as logs:
+            logging.getLogger('event_api.error_capture').error('marker')
+            for exception in exceptions:
+                middleware._log_exception(exception)
+        return [json.loads(line.split('FANCYLOG', 1)[1]) for line in logs.output if 'FANCYLOG' in line]
+
+    def test_fingerprint_ignores_message_but_not_type_or_location(self):
+        first = exception_fingerprint(_caught(_raise_value_error, 'user 1'))
+        self.assertEqual(first, exception_fingerprint(_caught(_raise_value_error, 'user 2')))
+        self.assertNotEqual(first, exception_fingerprint(_caught(_raise_key_error, 'user 1')))
+        self.assertNotEqual(first, exception_fingerprint(ValueError('never raised')))
+
+    def test_repeats_beyond_limit_are_counted_not_logged(self):
+        middleware = self._middleware(limit=2)
+        exceptions = [_caught(_raise_value_error, f'user {i}') for i in range(5)]
+
+        with mock.patch.object(middleware, '_get_stack_trace', wraps=middleware._get_stack_trace) as stack_trace:
+            entries = self._logged_entries(middleware, exceptions + [_caught(_raise_key_error)])
+
+        self.assertEqual([entry['occurrences'] for entry in entries], [1, 2, 1])
+        self.assertEqual(entries[0]['fingerprint'], entries[1]['fingerprint'])
+        self.assertIn('_raise_value_error', entries[0]['stack_trace'])
+        self.assertEqual(stack_trace.call_count, 3)
+        self.assertEqual(middleware.deduplicator.stats()['suppressed'], 3)
+
+    def test_suppressed_count_reported_in_next_window(self):
+        middleware = self._middleware(limit=1, window=0.05)
+        self._logged_entries(middleware, [_caught(_raise_value_error) for _ in range(4)])
+        time.sleep(0.06)
+
+        entries = self._logged_entries(middleware, [_caught(_raise_value_error)])
+        self.assertEqual(entries[0]['occurrences'], 1)
+        self.assertEqual(entries[0]['suppressed_in_previous_window'], 3)
+
+    def test_tracked_fingerprints_are_bounded(self):
+        deduplicator = ExceptionDeduplicator(limit=1, max_fingerprints=10)
+        for i in range(50):
+            deduplicator.record(f'fp_{i}')
+        self.assertEqual(deduplicator.stats()['fingerprints'], 10)
+
+    @override_settings(ERROR_CAPTURE_DEDUP_LIMIT=1)
+    def test_explode_storm_logs_once(self):
+        self.client.raise_request_exception = False
+        payload = {'user_id': 'user_1', 'event': 'explode', 'metadata': {}}
+        with self.assertLogs('event_api.error_capture', level='ERROR') as logs:
+            for _ in range(3):
+                response = self.client.post(reverse('create-event'), payload, content_type='application/json')
+                self.assertEqual(response.status_code, 500)
+
+        self.assertEqual(sum('FANCYLOG' in line for line in logs.output), 1)
+
+
+class NonBlockingQueueHandlerTests(SimpleTestCase):
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=2))
+        record = logging.LogRecord('event_api', logging.INFO, __file__, 1, 'message %s', ('x',), None)
+        for _ in range(5):
+            handler.handle(record)
+
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+        self.assertEqual(handler.queue.get_nowait().getMessage(), 'message x')
+
+    def test_listener_delivers_to_target_handlers(self):
+        stream = StringIO()
+        target = logging.StreamHandler(stream)
+        handler = NonBlockingQueueHandler(queue.Queue())
+        handler.listener = QueueListener(handler.queue, target)
+        test_logger = logging.getLogger('event_api.tests.queue')
+        test_logger.addHandler(handler)
+        test_logger.propagate = False
+        self.addCleanup(test_logger.removeHandler, handler)
+
+        test_logger.warning('first')
+        test_logger.warning('second %d', 2)
+        handler.stop_listener()
+        handler.stop_listener()  # a second stop, like the one at exit, is a no-op
+
+        self.assertEqual(stream.getvalue().splitlines(), ['first', 'second 2'])
+
+    def test_records_are_queued_unformatted(self):
+        handler = NonBlockingQueueHandler(queue.Queue())
+        record = logging.LogRecord('event_api', logging.INFO, __file__, 1, 'message %s', ('x',), None)
+        with mock.patch.object(handler, 'format') as format_record:
+            handler.handle(record)
+
+        format_record.assert_not_called()
+        queued = handler.queue.get_nowait()
+        self.assertEqual((queued.msg, queued.args), ('message %s', ('x',)))
+
+
+class StructuredLogTests(SimpleTestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('event_api.tests.structured')
+        self.log = structured_log.get_logger('event_api.tests.structured')
+        previous_rates = structured_log.sample_rates()
+        self.addCleanup(structured_log.set_sample_rates, previous_rates)
+        structured_log.reset_stats()
+
+    def test_nothing_is_built_below_the_level(self):
+        build = mock.Mock(return_value='expensive')
+        with self.assertLogs(self.logger, level='INFO') as logs:
+            self.log.debug('track', 'hidden', body=build)
+            self.log.info('track', 'shown', body=build)
+
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(logs.output, ['INFO:event_api.tests.structured:shown {"body": "expensive"}'])
+
+    def test_category_sampling(self):
+        structured_log.set_sample_rates({'track': 0.2, 'cache': 0.0})
+        build = mock.Mock(return_value='x')
+        with self.assertLogs(self.logger, level='INFO') as logs:
+            for _ in range(2000):
+                self.log.info('track', 'TRACK', body=build)
+                self.log.info('cache', 'append', body=build)
+            self.log.info('request', 'always')
+
+        stats = structured_log.stats()
+        self.assertAlmostEqual(stats['track']['emitted'] / 2000, 0.2, delta=0.05)
+        self.assertEqual(stats['track']['emitted'] + stats['track']['sampled_out'], 2000)
+        self.assertEqual(stats['cache'], {'emitted': 0, 'sampled_out': 2000})
+        self.assertEqual(build.call_count, stats['track']['emitted'])
+        self.assertEqual(len(logs.records), stats['track']['emitted'] + 1)
+
+    def test_json_formatter(self):
+        with self.assertLogs(self.logger, level='INFO') as logs:
+            self.log.info('track', 'TRACK', vendor='segment', bytes=12)
+            self.logger.warning('plain %s', 'message')
+            try:
+                raise ValueError('bad')
+            except ValueError:
+                self.log.error('exception', 'failed', exc_info=True, code=7)
+
+        structured, plain, failed = (json.loads(JSONFormatter().format(record)) for record in logs.records)
+        self.assertEqual(
+            {key: structured[key] for key in ('level', 'logger', 'category', 'message', 'vendor', 'bytes')},
+            {'level': 'INFO', 'logger': 'event_api.tests.structured', 'category': 'track',
+             'message': 'TRACK', 'vendor': 'segment', 'bytes': 12})
+        self.assertEqual(plain['message'], 'plain message')
+        self.assertNotIn('category', plain)
+        self.assertEqual(failed['code'], 7)
+        self.assertIn('ValueError: bad', failed['exc_info'])
+
+
+class MetricsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_histogram_buckets_render_cumulative(self):
+        histogram = metrics.Histogram('t_seconds', 'Test', ['stage'], registry=self.registry, buckets=(0.1, 1.0))
+        child = histogram.labels(stage='db_save')
+        for value in (0.05, 0.1, 0.5, 3.0):
+            child.observe(value)
+
+        lines = self.registry.render().splitlines()
+        self.assertEqual(lines[:2], ['# HELP t_seconds Test', '# TYPE t_seconds histogram'])
+        self.assertEqual(lines[2:], [
+            't_seconds_bucket{stage="db_save",le="0.1"} 2',
+            't_seconds_bucket{stage="db_save",le="1"} 3',
+            't_seconds_bucket{stage="db_save",le="+Inf"} 4',
+            't_seconds_sum{stage="db_save"} 3.65',
+            't_seconds_count{stage="db_save"} 4',
+        ])
+
+    def test_counter_sums_shards_of_live_and_exited_threads(self):
+        counter = metrics.Counter('t_total', 'Test', registry=self.registry)
+        barrier = threading.Barrier(4)
+
+        def work():
+            for _ in range(1000):
+                counter.inc()
+            barrier.wait()
+
+        threads = [threading.Thread(target=work) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()  # the three threads are still alive here
+        self.assertEqual(counter.labels().values(), [3000])
+        for thread in threads:
+            thread.join()
+        counter.inc(5)
+        self.assertEqual(counter.labels().values(), [3005])
+
+    def test_labels_validated_and_escaped(self):
+        counter = metrics.Counter('t_failures_total', 'Test', ['vendor', 'reason'], registry=self.registry)
+        with self.assertRaises(ValueError):
+            counter.labels('segment')
+        counter.labels(vendor='a"b\\c', reason='line\nbreak').inc()
+        self.assertIn('t_failures_total{vendor="a\\"b\\\\c",reason="line\\nbreak"} 1', self.registry.render())
+        with self.assertRaises(ValueError):
+            metrics.Counter('t_failures_total', 'Again', registry=self.registry)
+
+    def test_gauge_function_read_at_scrape(self):
+        gauge = metrics.Gauge('t_depth', 'Test', registry=self.registry)
+        depth = [3]
+        gauge.set_function(lambda: depth[0])
+        depth[0] = 7
+        self.assertIn('t_depth 7\n', self.registry.render())
+
+    def test_multiprocess_merge(self):
+        counter = metrics.Counter('t_total', 'Test', registry=self.registry)
+        gauge = metrics.Gauge('t_depth', 'Test', registry=self.registry)
+        counter.inc(2)
+        gauge.set(1)
+        with tempfile.TemporaryDirectory() as directory:
+            other = {'t_total': {'[]': [5]}, 't_depth': {'[]': [4]}}
+            for pid, written_at in ((1, time.time()), (2, time.time() - 3600)):
+                with open(os.path.join(directory, f'metrics-{pid}.json'), 'w') as f:
+                    json.dump({'written_at': written_at, 'metrics': other}, f)
+
+            writer = metrics.MultiProcessWriter(directory, interval=5, registry=self.registry)
+            rendered = self.registry.render(writer.merged())
+
+        # Counters from every file; gauges only from the stale-free ones
+        self.assertIn('t_total 12\n', rendered)
+        self.assertIn('t_depth 5\n', rendered)
+
+    def test_timed_decorator_sync_and_async(self):
+        histogram = metrics.Histogram('t_request_seconds', 'Test', registry=self.registry)
+
+        @metrics.timed(histogram.labels())
+        def handler():
+            return 'ok'
+
+        @metrics.timed(histogram.labels())
+        async def ahandler():
+            return 'ok'
+
+        self.assertEqual(handler(), 'ok')
+        self.assertEqual(asyncio.run(ahandler()), 'ok')
+        self.assertEqual(histogram.labels().values()[-2], 2)
+
+
+class MetricsEndpointTests(APITestCase):
+    def setUp(self):
+        memory_store.clear()
+
+    def tearDown(self):
+        memory_store.clear()
+
+    def _scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return {
+            line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+            for line in response.content.decode().splitlines() if not line.startswith('#')
+        }
+
+    def test_post_recorded_per_stage(self):
+        before = self._scrape()
+        url = reverse('create-event')
+        with mock.patch('event_api.ingest.track_events'):
+            self.client.post(url, {"event": "page_view", "user_id": "u_m"}, format='json')
+            self.client.post(url, {"event": "", "user_id": "u_m"}, format='json')
+        after = self._scrape()
+
+        def delta(key):
+            return after.get(key, 0) - before.get(key, 0)
+
+        self.assertEqual(delta('event_api_events_accepted_total'), 1)
+        self.assertEqual(delta('event_api_events_rejected_total'), 1)
+        self.assertEqual(delta('event_api_request_seconds_count{endpoint="events",method="post"}'), 2)
+        self.assertEqual(delta('event_api_stage_seconds_count{stage="validate"}'), 2)
+        self.assertEqual(delta('event_api_stage_seconds_count{stage="db_save"}'), 1)
+        self.assertEqual(delta('event_api_stage_seconds_count{stage="cache_update"}'), 1)
+        self.assertEqual(after['event_api_cache_events'], 1)
+
+
+class ProfilingTests(APITestCase):
+    def setUp(self):
+        memory_store.clear()
+        self.directory = tempfile.mkdtemp()
+        patcher = mock.patch('event_api.ingest.track_events')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        memory_store.clear()
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+
+    def _post(self, **headers):
+        return self.client.post(reverse('create-event'), {"event": "page_view", "user_id": "u_p"},
+                                format='json', **headers)
+
+    def _stages(self, response):
+        return [part.split(';')[0] for part in response['Server-Timing'].split(', ')]
+
+    def test_not_loaded_without_token_or_sampling(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+        self.assertFalse(self._post().has_header('Server-Timing'))
+
+    def test_header_token_selects_request(self):
+        with self.settings(PROFILING_TOKEN='s3cret', PROFILING_DIR=self.directory):
+            plain = self._post()
+            wrong = self._post(HTTP_X_PROFILE='guess')
+            profiled = self._post(HTTP_X_PROFILE='s3cret', HTTP_X_REQUEST_ID='req/prof 1')
+
+        self.assertFalse(plain.has_header('Server-Timing'))
+        self.assertFalse(wrong.has_header('Server-Timing'))
+        self.assertEqual(self._stages(profiled), ['parse', 'validate', 'db_save', 'cache_update', 'total'])
+        dumps = os.listdir(self.directory)
+        self.assertEqual(len(dumps), 1)
+        self.assertTrue(dumps[0].endswith('-req_prof_1.prof'))
+        stats = pstats.Stats(os.path.join(self.directory, dumps[0]))
+        self.assertTrue(any(name == 'validate_event' for _, _, name in stats.stats))
+
+    def test_sampled_request_gets_timing_and_request_id(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1.0):
+            response = self.client.post(reverse('create-event'), {"event": ""}, format='json')
+        self.assertIn('validate', self._stages(response))
+        self.assertTrue(response.has_header('X-Request-ID'))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_async_stack(self):
+        async def view(request):
+            record_stage('validate', 0.002)
+            record_stage('validate', 0.001)
+            return HttpResponse('ok')
+
+        with self.settings(PROFILING_SAMPLE_RATE=1.0):
+            middleware = ProfilingMiddleware(view)
+        response = asyncio.run(middleware(AsyncRequestFactory().get('/')))
+        self.assertTrue(response['Server-Timing'].startswith('validate;dur=3.000;desc="x2", total;dur='))
+
+    def test_record_stage_outside_profiled_request_is_ignored(self):
+        record_stage('validate', 1.0)
+        timings = RequestTimings()
+        timings.add('db_save', 0.0125)
+        self.assertEqual(timings.server_timing(0.02), 'db_save;dur=12.500, total;dur=20.000')
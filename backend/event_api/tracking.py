@@ -1,13 +1,61 @@
+import asyncio
+import atexit
 import json
 import logging 
 import logging
 import uuid
-from datetime import datetime
-from typing import Dict, Any, Optional
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Any, List, Optional
 import hashlib
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from django.conf import settings
+
+from .circuit import CircuitBreaker
+from . import metrics, structured_log
+from .dispatch import BLOCK, DispatchQueue
+from .routing import VendorRouter
+from .sinks import VendorSink
+from .transport import HTTPTransport, SimulatedTransport, Transport
 
 logger = logging.getLogger(__name__)
+log = structured_log.get_logger(__name__)
+
+# Stands in for properties['metadata'] when the caller already has it encoded;
+# the encoded metadata is spliced into each vendor body in place of this string
+_METADATA_PLACEHOLDER = '\x00metadata\x00'
+_ENCODED_PLACEHOLDER = json.dumps(_METADATA_PLACEHOLDER)
+
+VENDORS = ('segment', 'posthog', 'mixpanel')
+
+_LIBRARY_JSON = json.dumps({'name': 'event-intake-service', 'version': '1.0.0'})
+
+
+class _PayloadParts:
+    """One event's fields, each JSON-encoded once and shared by every vendor payload"""
+    __slots__ = ('timestamp', 'epoch_seconds', 'event', 'user_id', 'properties', 'properties_inner', 'context')
+
+    def __init__(self, timestamp, epoch_seconds, event, user_id, properties, context):
+        self.timestamp = timestamp
+        self.epoch_seconds = epoch_seconds
+        self.event = event
+        self.user_id = user_id
+        self.properties = properties
+        # Object members without braces, ready to merge into another object
+        self.properties_inner = properties[1:-1] + ',' if len(properties) > 2 else ''
+        self.context = context
+
+    def with_properties(self, properties:str)->'_PayloadParts':
+        return _PayloadParts(self.timestamp, self.epoch_seconds, self.event, self.user_id, properties, self.context)
+
+# Per-vendor delivery outcomes reported by deliver_event
+OUTCOME_OK = 'ok'
+OUTCOME_ERROR = 'error'
+OUTCOME_TIMEOUT = 'timeout'
+OUTCOME_BATCHED = 'batched'
+OUTCOME_CIRCUIT_OPEN = 'circuit_open'
 
 class TrackingClient:
     
@@ -18,89 +66,436 @@ class TrackingClient:
             'mixpanel_token': 'dummy_mixpanel_token_789',
             'enable_tracking': True
         }
+        # Vendor keys as JSON string literals, spliced into every payload
+        self._encoded_config = {key: json.dumps(value) for key, value in self.config.items() if isinstance(value, str)}
         self.simulated_failure_rate = float(os.getenv("TRACKING_SIMULATED_FAILURE_RATE", "0.0"))
+        # Where vendor requests are POSTed: <vendor_url>/<vendor> unless the
+        # vendor has its own endpoint. With neither, sends are simulated.
+        self.vendor_url = getattr(settings, 'TRACKING_VENDOR_URL', '').rstrip('/')
+        self.vendor_endpoints: Dict[str, str] = dict(getattr(settings, 'TRACKING_VENDOR_ENDPOINTS', {}))
+        if self.vendor_url or self.vendor_endpoints:
+            self.transport: Transport = self._http_transport()
+        else:
+            self.transport = SimulatedTransport(failure_rate=self.simulated_failure_rate)
+        # When set, track_event only queues the vendor sends (see enable_dispatch)
+        self.dispatcher: Optional[DispatchQueue] = None
+        # Vendors whose payloads are batched (see enable_batching)
+        self.sinks: Dict[str, VendorSink] = {}
+        # "concurrent" sends to all vendors at once from a shared thread pool,
+        # "serial" one after another. Each vendor send is bounded by its
+        # timeout, and the whole fan-out by fanout_deadline.
+        self.fanout = getattr(settings, 'TRACKING_FANOUT', 'concurrent')
+        self.fanout_workers = getattr(settings, 'TRACKING_FANOUT_WORKERS', 16)
+        self.fanout_deadline = getattr(settings, 'TRACKING_FANOUT_DEADLINE', 5.0)
+        self.vendor_timeout = getattr(settings, 'TRACKING_VENDOR_TIMEOUT', 2.0)
+        self.vendor_timeouts: Dict[str, float] = dict(getattr(settings, 'TRACKING_VENDOR_TIMEOUTS', {}))
+        self._fanout_pool: Optional[ThreadPoolExecutor] = None
+        # Vendors that keep failing are skipped until their breaker lets a trial through
+        self.breakers: Dict[str, CircuitBreaker] = {
+            vendor: CircuitBreaker(
+                vendor,
+                failure_threshold=getattr(settings, 'TRACKING_BREAKER_FAILURE_THRESHOLD', 5),
+                reset_timeout=getattr(settings, 'TRACKING_BREAKER_RESET_TIMEOUT', 30.0),
+            )
+            for vendor in VENDORS
+        }
+        # Which vendors get each event; see event_api.routing for the rule format
+        self.router = VendorRouter(VENDORS, getattr(settings, 'TRACKING_ROUTING_RULES', {}))
+
+    def set_routing_rules(self, rules:Dict[str, Dict[str, Any]])->VendorRouter:
+        """Replace the per-vendor routing rules (allow, deny, sample_rate, strip_properties)"""
+        self.router = VendorRouter(VENDORS, rules)
+        return self.router
+
+    def use_vendor_url(self, vendor_url:str, transport:Optional[Transport]=None)->None:
+        """Deliver over HTTP to <vendor_url>/<vendor>, e.g. a local vendor stub"""
+        self.vendor_url = vendor_url.rstrip('/')
+        self.transport = transport or self._http_transport()
+
+    def _http_transport(self)->HTTPTransport:
+        return HTTPTransport(
+            max_connections=getattr(settings, 'TRACKING_HTTP_MAX_CONNECTIONS', 8),
+            gzip_enabled=getattr(settings, 'TRACKING_HTTP_GZIP', False),
+            gzip_min_bytes=getattr(settings, 'TRACKING_HTTP_GZIP_MIN_BYTES', 1024),
+        )
+
+    def enable_dispatch(self, **options) -> DispatchQueue:
+        """Deliver to vendors from background workers; options go to DispatchQueue"""
+        self.dispatcher = DispatchQueue(self._deliver, name='tracking-dispatch', **options)
+        return self.dispatcher
+
+    def enable_batching(self, limits:Optional[Dict[str, Dict[str, Any]]]=None)->Dict[str, VendorSink]:
+        """
+        Send each vendor's payloads in batches. `limits` maps a vendor to
+        VendorSink options (max_events, max_bytes, max_age, max_pending,
+        max_retries, retry_backoff).
+        """
+        limits = limits or {}
+        self.sinks = {
+            vendor: VendorSink(vendor, self.send_batch, envelope=self._batch_envelope(vendor), **limits.get(vendor, {}))
+            for vendor in VENDORS
+        }
+        return self.sinks
+
+    def flush(self)->None:
+        """Deliver everything queued or batched so far"""
+        if self.dispatcher is not None:
+            self.dispatcher.drain()
+        for sink in self.sinks.values():
+            sink.flush()
 
     def track_event(
             self,
             user_id:str,
             event_name:str,
             properties:Optional[Dict[str, Any]]=None,
-            request_id:Optional[str]=None
+            request_id:Optional[str]=None,
+            metadata_json:Optional[str]=None
     )->bool:
+        vendor_bodies = self._encode_vendor_payloads(user_id, event_name, properties, request_id, metadata_json)
+        if vendor_bodies is None:
+            return False
+        if self.dispatcher is not None:
+            return self.dispatcher.submit(vendor_bodies)
+
+        self._deliver(vendor_bodies)
+        return True
+
+    def encode_event(
+            self,
+            user_id:str,
+            event_name:str,
+            properties:Optional[Dict[str, Any]]=None,
+            request_id:Optional[str]=None,
+            metadata_json:Optional[str]=None
+    )->Optional[Dict[str, bytes]]:
+        """Encoded payload per vendor, for callers that deliver later (the outbox)"""
+        return self._encode_vendor_payloads(user_id, event_name, properties, request_id, metadata_json)
+
+    def deliver_event(
+            self,
+            user_id:str,
+            event_name:str,
+            properties:Optional[Dict[str, Any]]=None,
+            request_id:Optional[str]=None,
+            metadata_json:Optional[str]=None
+    )->Dict[str, str]:
+        """
+        Send one event to every vendor now, bypassing the dispatch queue, and
+        return each vendor's outcome (ok, error, timeout, batched or
+        circuit_open). Empty when tracking is disabled, the event is invalid
+        or routing sends it to no vendor.
+        """
+        vendor_bodies = self._encode_vendor_payloads(user_id, event_name, properties, request_id, metadata_json)
+        if vendor_bodies is None:
+            return {}
+        return self._deliver(vendor_bodies)
+
+    def send_batch(self, vendor:str, bodies:List[bytes])->None:
+        """
+        Send already encoded payloads (from encode_event) to one vendor as a
+        single batch request, inside the vendor's batch envelope. Raises if
+        the request fails, so the caller decides whether to retry.
+        """
+        prefix, suffix = self._batch_envelope(vendor)
+        body = prefix + b','.join(bodies) + suffix
+        log.info('track', 'sending batch', vendor=vendor, events=len(bodies), bytes=len(body))
+        started = time.monotonic()
+        try:
+            self.transport.send(self._endpoint(vendor) + '/batch', body, self._timeout_for(vendor))
+        except Exception:
+            metrics.VENDOR_FAILURES.labels(vendor, 'batch_error').inc()
+            raise
+        finally:
+            metrics.TRACKING_SEND_SECONDS.observe(time.monotonic() - started)
+
+    async def atrack_event(
+            self,
+            user_id:str,
+            event_name:str,
+            properties:Optional[Dict[str, Any]]=None,
+            request_id:Optional[str]=None,
+            metadata_json:Optional[str]=None
+    )->bool:
+        """track_event for async callers: vendor I/O is awaited instead of blocking the thread"""
+        vendor_bodies = self._encode_vendor_payloads(user_id, event_name, properties, request_id, metadata_json)
+        if vendor_bodies is None:
+            return False
+        if self.dispatcher is not None:
+            if self.dispatcher.overflow == BLOCK:
+                # A full queue may block; wait for room off the event loop
+                return await asyncio.to_thread(self.dispatcher.submit, vendor_bodies)
+            return self.dispatcher.submit(vendor_bodies)
+
+        await self._adeliver(vendor_bodies)
+        return True
+
+    def _deliver(self, vendor_bodies:Dict[str, bytes])->Dict[str, str]:
+        """Send one event's encoded payloads to every vendor; failures are logged and reported, not raised"""
+        outcomes, direct = self._route_to_sinks(vendor_bodies)
+        if self.fanout == 'concurrent' and len(direct) > 1:
+            outcomes.update(self._fan_out(direct))
+            return outcomes
+
+        deadline = time.monotonic() + self.fanout_deadline
+        for vendor, body in direct.items():
+            if time.monotonic() >= deadline:
+                logger.warning(f"Tracking deadline passed, skipping {vendor}")
+                outcomes[vendor] = OUTCOME_TIMEOUT
+                continue
+            outcomes[vendor] = self._send_one(vendor, body)
+        return outcomes
+
+    async def _adeliver(self, vendor_bodies:Dict[str, bytes])->Dict[str, str]:
+        outcomes, direct = self._route_to_sinks(vendor_bodies)
+        if self.fanout == 'concurrent':
+            timeouts = [min(self._timeout_for(vendor), self.fanout_deadline) for vendor in direct]
+            results = await asyncio.gather(*(
+                self._asend_one(vendor, body, timeout) for (vendor, body), timeout in zip(direct.items(), timeouts)
+            ))
+            outcomes.update(zip(direct, results))
+            return outcomes
+
+        deadline = time.monotonic() + self.fanout_deadline
+        for vendor, body in direct.items():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"Tracking deadline passed, skipping {vendor}")
+                outcomes[vendor] = OUTCOME_TIMEOUT
+                continue
+            outcomes[vendor] = await self._asend_one(vendor, body, min(self._timeout_for(vendor), remaining))
+        return outcomes
+
+    def _route_to_sinks(self, vendor_bodies:Dict[str, bytes])->tuple:
+        """(outcomes for batched vendors, bodies still to send directly)"""
+        outcomes: Dict[str, str] = {}
+        direct: Dict[str, bytes] = {}
+        for vendor, body in vendor_bodies.items():
+            log.info('track', 'TRACK', vendor=vendor, body=body.decode)
+            sink = self.sinks.get(vendor)
+            if sink is not None:
+                sink.add(body)
+                outcomes[vendor] = OUTCOME_BATCHED
+            else:
+                direct[vendor] = body
+        return outcomes, direct
+
+    def _fan_out(self, vendor_bodies:Dict[str, bytes])->Dict[str, str]:
+        """
+        Send to every vendor at once. A send still running when its timeout or
+        the deadline passes is reported as a timeout; it cannot be interrupted,
+        but HTTP sends are themselves bounded by the same vendor timeout. A
+        send still waiting for a free worker by then is cancelled, so a busy
+        pool never builds up a backlog of sends nobody is waiting for.
+        """
+        if self._fanout_pool is None:
+            self._fanout_pool = ThreadPoolExecutor(self.fanout_workers, thread_name_prefix='tracking-fanout')
+        started = time.monotonic()
+        futures = {vendor: self._fanout_pool.submit(self._send_one, vendor, body) for vendor, body in vendor_bodies.items()}
+        outcomes = {}
+        for vendor, future in futures.items():
+            limit = min(self._timeout_for(vendor), self.fanout_deadline)
+            try:
+                outcomes[vendor] = future.result(max(0.0, started + limit - time.monotonic()))
+            except FutureTimeout:
+                if future.cancel():
+                    logger.warning(f"No fan-out worker free for {vendor} within {limit}s, skipping it")
+                else:
+                    logger.warning(f"Timed out sending to {vendor} after {limit}s")
+                outcomes[vendor] = OUTCOME_TIMEOUT
+        return outcomes
+
+    def _send_one(self, vendor:str, body:bytes)->str:
+        breaker = self.breakers[vendor]
+        if not breaker.allow():
+            return OUTCOME_CIRCUIT_OPEN
+        started = time.monotonic()
+        try:
+            self._send_to_vendor(vendor, body)
+        except Exception as e:
+            breaker.record_failure()
+            metrics.VENDOR_FAILURES.labels(vendor, OUTCOME_ERROR).inc()
+            logger.error(f"Failed to send to {vendor}: {str(e)}", exc_info=True)
+            return OUTCOME_ERROR
+        finally:
+            metrics.TRACKING_SEND_SECONDS.observe(time.monotonic() - started)
+        if time.monotonic() - started > self._timeout_for(vendor):
+            # Delivered, but too slowly: count it against the vendor
+            breaker.record_failure()
+            metrics.VENDOR_FAILURES.labels(vendor, OUTCOME_TIMEOUT).inc()
+            return OUTCOME_TIMEOUT
+        breaker.record_success()
+        return OUTCOME_OK
+
+    async def _asend_one(self, vendor:str, body:bytes, timeout:float)->str:
+        breaker = self.breakers[vendor]
+        if not breaker.allow():
+            return OUTCOME_CIRCUIT_OPEN
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._asend_to_vendor(vendor, body), max(0.0, timeout))
+        except asyncio.TimeoutError:
+            breaker.record_failure()
+            metrics.VENDOR_FAILURES.labels(vendor, OUTCOME_TIMEOUT).inc()
+            logger.warning(f"Timed out sending to {vendor} after {timeout}s")
+            return OUTCOME_TIMEOUT
+        except Exception as e:
+            breaker.record_failure()
+            metrics.VENDOR_FAILURES.labels(vendor, OUTCOME_ERROR).inc()
+            logger.error(f"Failed to send to {vendor}: {str(e)}", exc_info=True)
+            return OUTCOME_ERROR
+        finally:
+            metrics.TRACKING_SEND_SECONDS.observe(time.monotonic() - started)
+        breaker.record_success()
+        return OUTCOME_OK
+
+    def _timeout_for(self, vendor:str)->float:
+        return self.vendor_timeouts.get(vendor, self.vendor_timeout)
+
+    def _encode_vendor_payloads(
+            self,
+            user_id:str,
+            event_name:str,
+            properties:Optional[Dict[str, Any]],
+            request_id:Optional[str],
+            metadata_json:Optional[str]
+    )->Optional[Dict[str, bytes]]:
+        """
+        Encoded JSON body per routed vendor. Each is built once, as bytes, and
+        reused for logging, sending, batching and the outbox. `metadata_json`
+        is properties['metadata'] already encoded by validation. Routing runs
+        first, so an event no vendor wants is never encoded.
+        """
+        if not self._trackable(user_id, event_name):
+            return None
+        started = time.perf_counter()
+        rules = self.router.route(user_id, event_name)
+        if not rules:
+            return None
+
+        parts = self._build_payload_parts(user_id, event_name, properties, request_id, metadata_json)
+        stripped_parts = {}
+        vendor_bodies = {}
+        for rule in rules:
+            vendor_parts = parts
+            if rule.strip_properties and properties:
+                vendor_parts = stripped_parts.get(rule.strip_properties)
+                if vendor_parts is None:
+                    kept = {key: value for key, value in properties.items() if key not in rule.strip_properties}
+                    vendor_parts = parts.with_properties(self._encode_properties(kept, metadata_json))
+                    stripped_parts[rule.strip_properties] = vendor_parts
+            vendor_bodies[rule.vendor] = self._builders[rule.vendor](self, vendor_parts)
+        metrics.TRACKING_BUILD_SECONDS.observe(time.perf_counter() - started)
+        return vendor_bodies
+
+    def _trackable(self, user_id:str, event_name:str)->bool:
         if not self.config['enable_tracking']:
             logger.info("Tracking is disabled in configuration.")
             return False
-        
+
         if not user_id or not event_name:
             logger.warning(f"Invalid: user_id ={user_id}, event_name = {event_name}")
             return False
-        
-        base_payload = {
-            'timestamp': datetime.utcnow().isoformat() + 'Z',
-            'userId': user_id,
-            'event': event_name,
-            'properties': properties or {},
-            'context': {
-                'library': {
-                    'name': 'event-intake-service',
-                    'version': '1.0.0'
-                },
-                'requestId': request_id or f'req_{uuid.uuid4().hex[:8]}'
-            }
-        }
-        vendor_payloads ={
-            'segment': self._build_segment_payload(base_payload),
-            'posthog': self._build_posthog_payload(base_payload),
-            'mixpanel': self._build_mixpanel_payload(base_payload)
-        }
+        return True
 
-        for vendor, payload in vendor_payloads.items():
-            logger.info(f"TRACK: {vendor}: {json.dumps(payload)}")
-            try:
-                self._send_to_vendor(vendor, payload)
-            except Exception as e:
-                logger.error(f"Failed to send to {vendor}: {str(e)}", exc_info=True)
+    @staticmethod
+    def _encode_properties(properties:Optional[Dict[str, Any]], metadata_json:Optional[str])->str:
+        if metadata_json is not None and properties and 'metadata' in properties:
+            return json.dumps({**properties, 'metadata': _METADATA_PLACEHOLDER}).replace(
+                _ENCODED_PLACEHOLDER, metadata_json, 1)
+        return json.dumps(properties or {})
 
-        return True
-    def _build_segment_payload(self, base_payload:Dict[str, Any])->Dict[str, Any]:
-        segment_payload = {
-            'writeKey': self.config['segment_write_key'],
-            'type': 'track',
-            'timestamp': base_payload['timestamp'],
-            'event': base_payload['event'],
-            'userId': base_payload['userId'],
-            'properties': {**base_payload['properties']} ,
-            'context': {**base_payload['context']}
-        }
-        return segment_payload
-    def _build_posthog_payload(self, base_payload:Dict[str, Any])->Dict[str, Any]:
-        return {
-            'api_key': self.config['posthog_api_key'],
-            'event': base_payload['event'],
-            'distinct_id': base_payload['userId'],
-            'properties': {**base_payload['properties'],'distinct_id': base_payload['userId'],},
-            'timestamp': base_payload['timestamp']
+    def _build_payload_parts(
+            self,
+            user_id:str,
+            event_name:str,
+            properties:Optional[Dict[str, Any]],
+            request_id:Optional[str],
+            metadata_json:Optional[str]
+    )->'_PayloadParts':
+        # One clock read gives both the ISO timestamp and Mixpanel's epoch seconds
+        now = time.time()
+        timestamp = datetime.fromtimestamp(now, dt_timezone.utc).strftime('"%Y-%m-%dT%H:%M:%S.%fZ"')
+        request_id = request_id or f'req_{uuid.uuid4().hex[:8]}'
+        return _PayloadParts(
+            timestamp=timestamp,
+            epoch_seconds=int(now),
+            event=json.dumps(event_name),
+            user_id=json.dumps(user_id),
+            properties=self._encode_properties(properties, metadata_json),
+            context=f'{{"library":{_LIBRARY_JSON},"requestId":{json.dumps(request_id)}}}'
+        )
+
+    def _build_segment_payload(self, parts:'_PayloadParts')->bytes:
+        return (
+            f'{{"writeKey":{self._encoded_config["segment_write_key"]},"type":"track",'
+            f'"timestamp":{parts.timestamp},"event":{parts.event},"userId":{parts.user_id},'
+            f'"properties":{parts.properties},"context":{parts.context}}}'
+        ).encode()
+
+    def _build_posthog_payload(self, parts:'_PayloadParts')->bytes:
+        # Later keys win when decoded, as with {**properties, 'distinct_id': ...}
+        return (
+            f'{{"api_key":{self._encoded_config["posthog_api_key"]},"event":{parts.event},'
+            f'"distinct_id":{parts.user_id},'
+            f'"properties":{{{parts.properties_inner}"distinct_id":{parts.user_id}}},'
+            f'"timestamp":{parts.timestamp}}}'
+        ).encode()
+
+    def _build_mixpanel_payload(self, parts:'_PayloadParts')->bytes:
+        return (
+            f'{{"event":{parts.event},"properties":{{"token":{self._encoded_config["mixpanel_token"]},'
+            f'"distinct_id":{parts.user_id},"time":{parts.epoch_seconds},'
+            f'{parts.properties_inner}"mp_lib":"python"}}}}'
+        ).encode()
+
+    _builders = {
+        'segment': _build_segment_payload,
+        'posthog': _build_posthog_payload,
+        'mixpanel': _build_mixpanel_payload,
+    }
+
+    def _batch_envelope(self, vendor:str)->tuple:
+        """Bytes around the comma-joined payloads of a batch request"""
+        if vendor == 'segment':
+            return b'{"batch":[', b']}'
+        if vendor == 'posthog':
+            return b'{"api_key":' + self._encoded_config['posthog_api_key'].encode() + b',"batch":[', b']}'
+        return b'[', b']'
+
+    def _endpoint(self, vendor:str)->str:
+        return self.vendor_endpoints.get(vendor) or f"{self.vendor_url}/{vendor}"
+
+    def _send_to_vendor(self, vendor:str, body:bytes)->None:
+        log.debug('track', 'sending', vendor=vendor, bytes=len(body))
+        self.transport.send(self._endpoint(vendor), body, self._timeout_for(vendor))
+
+    async def _asend_to_vendor(self, vendor:str, body:bytes)->None:
+        log.debug('track', 'sending', vendor=vendor, bytes=len(body))
+        await self.transport.asend(self._endpoint(vendor), body, self._timeout_for(vendor))
 
-        }
-    def _build_mixpanel_payload(self, base_payload:Dict[str, Any])->Dict[str, Any]:
-        return {
-            'event': base_payload['event'],
-            'properties': {
-                'token': self.config['mixpanel_token'],
-                'distinct_id': base_payload['userId'],
-                'time': int(datetime.strptime(base_payload['timestamp'], "%Y-%m-%dT%H:%M:%S.%fZ").timestamp()),
-                **base_payload['properties'],
-                'mp_lib':'python'
-            }
-        }
-    
-    def _send_to_vendor(self, vendor:str, payload:Dict[str, Any])->None:
-        logger.info(f"Sending event to {vendor}: {json.dumps(payload)}")
-        import time
-        time.sleep(0.01)
-
-        import random
-        if self.simulated_failure_rate > 0 and random.random() < self.simulated_failure_rate:
-            raise Exception("Simulated network error")
-        
 tracking_client = TrackingClient()
+if getattr(settings, 'TRACKING_BATCH_ENABLED', False):
+    _defaults = {
+        'max_events': getattr(settings, 'TRACKING_BATCH_MAX_EVENTS', 100),
+        'max_bytes': getattr(settings, 'TRACKING_BATCH_MAX_BYTES', 512 * 1024),
+        'max_age': getattr(settings, 'TRACKING_BATCH_MAX_AGE', 1.0),
+        'max_pending': getattr(settings, 'TRACKING_BATCH_MAX_PENDING', 10000),
+        'max_retries': getattr(settings, 'TRACKING_BATCH_MAX_RETRIES', 3),
+        'retry_backoff': getattr(settings, 'TRACKING_BATCH_RETRY_BACKOFF', 1.0),
+    }
+    _vendor_limits = getattr(settings, 'TRACKING_BATCH_VENDOR_LIMITS', {})
+    for _sink in tracking_client.enable_batching(
+            {vendor: {**_defaults, **_vendor_limits.get(vendor, {})} for vendor in VENDORS}).values():
+        atexit.register(_sink.stop)
+if getattr(settings, 'TRACKING_DISPATCH_ENABLED', False):
+    tracking_client.enable_dispatch(
+        workers=getattr(settings, 'TRACKING_DISPATCH_WORKERS', 4),
+        max_queue=getattr(settings, 'TRACKING_DISPATCH_MAX_QUEUE', 10000),
+        overflow=getattr(settings, 'TRACKING_DISPATCH_OVERFLOW', 'drop_newest'),
+        block_timeout=getattr(settings, 'TRACKING_DISPATCH_BLOCK_TIMEOUT', 0.05),
+    )
+    atexit.register(tracking_client.dispatcher.stop, getattr(settings, 'TRACKING_DISPATCH_DRAIN_TIMEOUT', 5.0))
+atexit.register(lambda: tracking_client.transport.close())
+metrics.DISPATCH_QUEUE_DEPTH.set_function(
+    lambda: tracking_client.dispatcher.stats()['depth'] if tracking_client.dispatcher is not None else 0)
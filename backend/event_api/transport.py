@@ -0,0 +1,238 @@
+"""
+Vendor delivery transports
+
+TrackingClient hands every encoded payload or batch to a Transport:
+
+  - SimulatedTransport: sleeps and fails at random, standing in for vendors
+    when no vendor URL is configured (the default).
+  - HTTPTransport: real POSTs over pooled keep-alive connections, one pool
+    per vendor host. Each pool caps concurrent requests to the host, and
+    bodies can be gzipped.
+"""
+import asyncio
+import gzip
+import http.client
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class TransportError(Exception):
+    """The request failed or the vendor answered with a non-2xx status"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class Transport:
+
+    def send(self, url: str, body: bytes, timeout: float) -> int:
+        """POST `body` to `url`; returns the HTTP status or raises TransportError"""
+        raise NotImplementedError
+
+    async def asend(self, url: str, body: bytes, timeout: float) -> int:
+        return await asyncio.to_thread(self.send, url, body, timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    def close(self) -> None:
+        pass
+
+
+class SimulatedTransport(Transport):
+    """`latency` seconds per request, failing with probability `failure_rate`"""
+
+    def __init__(self, latency: float = 0.01, failure_rate: float = 0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+    def send(self, url: str, body: bytes, timeout: float) -> int:
+        time.sleep(self.latency)
+        return self._result()
+
+    async def asend(self, url: str, body: bytes, timeout: float) -> int:
+        await asyncio.sleep(self.latency)
+        return self._result()
+
+    def _result(self) -> int:
+        if self.failure_rate > 0 and random.random() < self.failure_rate:
+            raise TransportError("Simulated network error")
+        return 200
+
+
+class _HostPool:
+    """Idle keep-alive connections to one host, plus a cap on requests in flight"""
+
+    def __init__(self, scheme: str, host: str, port: Optional[int], max_connections: int):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.idle: List[http.client.HTTPConnection] = []
+        self.lock = threading.Lock()
+
+    def connect(self, timeout: float) -> http.client.HTTPConnection:
+        connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=timeout)
+
+    def take(self) -> Optional[http.client.HTTPConnection]:
+        with self.lock:
+            return self.idle.pop() if self.idle else None
+
+    def give_back(self, connection: http.client.HTTPConnection) -> None:
+        with self.lock:
+            self.idle.append(connection)
+
+    def close(self) -> None:
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            connection.close()
+
+
+class HTTPTransport(Transport):
+    """
+    Keep-alive HTTP/1.1 POSTs with one connection pool per (scheme, host, port).
+
+    At most `max_connections` requests per host are in flight at once; more
+    callers wait for a free slot, up to their timeout. Idle connections are
+    reused. A request that fails on a reused connection (the server may have
+    closed it while idle) is retried once on a fresh one. Bodies of at least
+    `gzip_min_bytes` are gzipped when `gzip_enabled` is set.
+    """
+    # Errors meaning a pooled connection had gone stale before we used it
+    STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+    def __init__(
+            self,
+            max_connections: int = 8,
+            gzip_enabled: bool = False,
+            gzip_min_bytes: int = 1024,
+            gzip_level: int = 5
+    ):
+        self.max_connections = max_connections
+        self.gzip_enabled = gzip_enabled
+        self.gzip_min_bytes = gzip_min_bytes
+        self.gzip_level = gzip_level
+        self._pools: Dict[Tuple[str, str, Optional[int]], _HostPool] = {}
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.errors = 0
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.bytes_in = 0
+        self.bytes_sent = 0
+
+    def send(self, url: str, body: bytes, timeout: float) -> int:
+        parts = urlsplit(url)
+        pool = self._pool(parts.scheme or 'http', parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        headers = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+        payload = body
+        if self.gzip_enabled and len(body) >= self.gzip_min_bytes:
+            payload = gzip.compress(body, self.gzip_level)
+            headers['Content-Encoding'] = 'gzip'
+
+        if not pool.slots.acquire(timeout=timeout):
+            self._count(error=True)
+            raise TransportError(f"No free connection to {pool.host} within {timeout}s")
+        try:
+            status = self._request(pool, path, payload, headers, timeout)
+        except (OSError, http.client.HTTPException) as e:
+            self._count(error=True)
+            raise TransportError(f"POST {url} failed: {e}") from e
+        finally:
+            pool.slots.release()
+
+        self._count(body_in=len(body), body_sent=len(payload), error=not 200 <= status < 300)
+        if not 200 <= status < 300:
+            raise TransportError(f"POST {url} returned {status}", status)
+        return status
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            idle = sum(len(pool.idle) for pool in self._pools.values())
+            return {
+                'hosts': len(self._pools),
+                'idle_connections': idle,
+                'requests': self.requests,
+                'errors': self.errors,
+                'connections_opened': self.connections_opened,
+                'connections_reused': self.connections_reused,
+                'bytes_in': self.bytes_in,
+                'bytes_sent': self.bytes_sent,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.close()
+
+    def _pool(self, scheme: str, host: str, port: Optional[int]) -> _HostPool:
+        key = (scheme, host, port)
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.setdefault(key, _HostPool(scheme, host, port, self.max_connections))
+        return pool
+
+    def _request(self, pool: _HostPool, path: str, payload: bytes, headers: Dict[str, str], timeout: float) -> int:
+        connection = pool.take()
+        reused = connection is not None
+        if reused:
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+        else:
+            connection = self._open(pool, timeout)
+        try:
+            response = self._exchange(connection, path, payload, headers)
+        except self.STALE_ERRORS:
+            if not reused:
+                raise
+            connection = self._open(pool, timeout)
+            reused = False
+            response = self._exchange(connection, path, payload, headers)
+
+        if reused:
+            with self._lock:
+                self.connections_reused += 1
+        if response.will_close:
+            connection.close()
+        else:
+            pool.give_back(connection)
+        return response.status
+
+    def _open(self, pool: _HostPool, timeout: float) -> http.client.HTTPConnection:
+        with self._lock:
+            self.connections_opened += 1
+        return pool.connect(timeout)
+
+    @staticmethod
+    def _exchange(connection, path, payload, headers) -> http.client.HTTPResponse:
+        """One request/response; the connection is closed if it fails"""
+        try:
+            connection.request('POST', path, body=payload, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except BaseException:
+            connection.close()
+            raise
+        return response
+
+    def _count(self, body_in: int = 0, body_sent: int = 0, error: bool = False) -> None:
+        with self._lock:
+            self.requests += 1
+            self.bytes_in += body_in
+            self.bytes_sent += body_sent
+            if error:
+                self.errors += 1
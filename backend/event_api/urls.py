@@ -1,7 +1,14 @@
+from django.conf import settings
 from django.urls import path
-from .views import EventView
+from .views import AsyncEventView, EventBatchView, EventStatsView, EventStreamView, EventView
+
+# EVENT_API_ASYNC serves /v1/events from the native async view (run under ASGI)
+events_view = AsyncEventView.as_view() if settings.EVENT_API_ASYNC else EventView.as_view()
 
 urlpatterns = [
-    path('v1/events', EventView.as_view(), name='create-event'),
-    path('v1/events/', EventView.as_view(), name='delete-events'),
+    path('v1/events', events_view, name='create-event'),
+    path('v1/events/', events_view, name='delete-events'),
+    path('v1/events/batch', EventBatchView.as_view(), name='create-event-batch'),
+    path('v1/events/stream', EventStreamView.as_view(), name='stream-events'),
+    path('v1/events/stats', EventStatsView.as_view(), name='event-stats'),
 ]
\ No newline at end of file
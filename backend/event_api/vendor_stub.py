@@ -0,0 +1,177 @@
+"""
+Local stand-in for the analytics vendors
+
+VendorStub is a small threaded HTTP server that accepts POSTs on any path,
+records them, and can inject latency and errors. Point TRACKING_VENDOR_URL
+at it to exercise real delivery offline:
+
+    python -m event_api.vendor_stub --port 9100 --latency 0.02 --error-rate 0.05
+    TRACKING_VENDOR_URL=http://127.0.0.1:9100 python manage.py runserver
+
+Tracking then POSTs to <TRACKING_VENDOR_URL>/<vendor>, e.g. /segment.
+"""
+import argparse
+import gzip
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class RecordedRequest:
+    path: str
+    headers: Dict[str, str]
+    body: bytes
+    received_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def vendor(self) -> str:
+        return self.path.strip('/').split('/')[0]
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so pooled clients reuse connections
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def do_POST(self):
+        stub: 'VendorStub' = self.server.stub
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        stub._record(RecordedRequest(self.path, dict(self.headers), body))
+
+        if stub.latency:
+            time.sleep(stub.latency)
+        if stub.error_rate and random.random() < stub.error_rate:
+            self._reply(stub.error_status, {'status': 'error'})
+        else:
+            self._reply(200, {'status': 'ok'})
+
+    def _reply(self, status_code: int, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class VendorStub:
+    """
+    Threaded HTTP server recording every request it receives, counting the
+    connections they arrive on. Usable as a context manager.
+    """
+
+    def __init__(
+            self,
+            host: str = '127.0.0.1',
+            port: int = 0,
+            latency: float = 0.0,
+            error_rate: float = 0.0,
+            error_status: int = 503,
+            idle_timeout: Optional[float] = None
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests: List[RecordedRequest] = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        # idle_timeout closes keep-alive connections left idle that long
+        handler = type('VendorStubHandler', (_Handler,), {'timeout': idle_timeout})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread: Optional[threading.Thread] = None
+
+        stub = self
+        base_process_request = self._server.process_request
+
+        def process_request(request, client_address):
+            with stub._lock:
+                stub.connections += 1
+            base_process_request(request, client_address)
+        self._server.process_request = process_request
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'VendorStub':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='vendor-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> 'VendorStub':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _record(self, request: RecordedRequest) -> None:
+        with self._lock:
+            self.requests.append(request)
+
+    def requests_for(self, vendor: str) -> List[RecordedRequest]:
+        with self._lock:
+            return [request for request in self.requests if request.vendor == vendor]
+
+    def events_for(self, vendor: str) -> List[Dict[str, Any]]:
+        """Every event received for `vendor`, unpacked from single or batched bodies"""
+        events = []
+        for request in self.requests_for(vendor):
+            payload = request.json()
+            if isinstance(payload, dict) and 'batch' in payload:
+                events.extend(payload['batch'])
+            elif isinstance(payload, list):
+                events.extend(payload)
+            else:
+                events.append(payload)
+        return events
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests.clear()
+            self.connections = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the analytics vendors')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before replying')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with an error')
+    parser.add_argument('--error-status', type=int, default=503)
+    args = parser.parse_args()
+
+    stub = VendorStub(args.host, args.port, args.latency, args.error_rate, args.error_status)
+    print(f"Vendor stub listening on {stub.url}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"{len(stub.requests)} requests over {stub.connections} connections")
+        stub._server.server_close()
+
+
+if __name__ == '__main__':
+    main()
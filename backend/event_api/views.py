@@ -1,16 +1,28 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.renderers import JSONRenderer
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+import io
+import time
 import uuid
 import json
 from datetime import datetime
-from django.utils import timezone
+from django.conf import settings
 
-from .serializers import EventSerializer, EventResponseSerializer
-from .models import Event
-from .storage import memory_store
-from .tracking import tracking_client
+from . import metrics, rollups
+from .serializers import EventResponseSerializer
+from .storage import aread_events, memory_store, read_events
+from .pagination import decode_cursor, encode_cursor
+from .filters import parse_event_names, parse_filter, parse_time_range
+from .validation import validate_event
+from .ingest import (
+    IngestUnavailable, aaccept_events, accept_events, build_event, flush_pending_writes, ingest_ndjson
+)
 from .error_capture import trigger_explode_error, DeliberateError
 
 
@@ -19,133 +31,414 @@ def get_request_id(request):
     if request_id:
         return request_id
     return str(uuid.uuid4())[:8]
-class EventView(APIView):
 
-    def get(self, request):
-        request_id = get_request_id(request)
-        user_id = request.query_params.get('user_id')
-        limit = request.query_params.get('limit', 20)
 
-        if not user_id:
-            response = Response(
-                {
-                    "error": {
-                        "code": "VALIDATION_ERROR",
-                        "message": "Missing required parameter",
-                        "details": {"user_id": "This query parameter is required."}
-                    }
+def parsed_data(request):
+    """request.data, timed as the parse stage (DRF parses on first access)"""
+    started = time.perf_counter()
+    data = request.data
+    metrics.PARSE_SECONDS.observe(time.perf_counter() - started)
+    return data
 
-                }, status=status.HTTP_400_BAD_REQUEST
-            )
-            response['X-Request-ID'] = request_id
-            return response 
+
+def unavailable_response(request_id, error):
+    response = Response({
+        "error": "SERVICE_UNAVAILABLE",
+        "message": "Events could not be stored, retry later",
+        "details": str(error)
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = '1'
+    response['X-Request-ID'] = request_id
+    return response
+
+def parse_list_params(query_params):
+    """
+    Validate GET /v1/events query parameters.
+    Returns (params, None), or (None, error_body) for a 400 response.
+    """
+    user_id = query_params.get('user_id')
+    limit = query_params.get('limit', 20)
+    cursor = query_params.get('cursor')
+
+    if not user_id:
+        return None, {
+            "error": {
+                "code": "VALIDATION_ERROR",
+                "message": "Missing required parameter",
+                "details": {"user_id": "This query parameter is required."}
+            }
+
+        }
+    try:
+        limit = int(limit)
+        if limit <=0:
+            raise ValueError("Limit must be positive")
+        if limit > 100:
+            limit = 100
+    except ValueError:
+        return None, {
+            "error": {
+                    "code": "VALIDATION_ERROR",
+                    "message": "Invalid parameter",
+                    "details": {"limit": ["Must be a positive integer ≤ 100"]}
+                }
+        }
+    before = None
+    if cursor:
         try:
-            limit = int(limit)
-            if limit <=0:
-                raise ValueError("Limit must be positive")
-            if limit > 100:
-                limit = 100
+            before = decode_cursor(cursor)
         except ValueError:
-            response = Response({
+            return None, {
                 "error": {
                         "code": "VALIDATION_ERROR",
                         "message": "Invalid parameter",
-                        "details": {"limit": ["Must be a positive integer ≤ 100"]}
+                        "details": {"cursor": ["Must be a next_cursor value from a previous page"]}
                     }
-            }, status=status.HTTP_400_BAD_REQUEST)
+            }
+    query, details = parse_filter(query_params)
+    if details:
+        return None, {
+            "error": {
+                    "code": "VALIDATION_ERROR",
+                    "message": "Invalid parameter",
+                    "details": details
+                }
+        }
+    return {'user_id': user_id, 'limit': limit, 'before': before, 'query': query}, None
+
+
+def parse_stats_params(query_params):
+    """
+    Validate GET /v1/events/stats query parameters.
+    Returns (params, None), or (None, error_body) for a 400 response.
+    """
+    user_id = query_params.get('user_id')
+    if not user_id:
+        return None, {
+            "error": {
+                "code": "VALIDATION_ERROR",
+                "message": "Missing required parameter",
+                "details": {"user_id": "This query parameter is required."}
+            }
+        }
+    details = {}
+    events = parse_event_names(query_params, details)
+    since_us, until_us = parse_time_range(query_params, details)
+    if query_params.get('time_field', 'received_at') != 'received_at':
+        details['time_field'] = ["Stats are counted by received_at only"]
+    for param in query_params:
+        if param.startswith('metadata.'):
+            details[param] = ["Stats cannot be filtered by metadata"]
+
+    interval = query_params.get('interval')
+    sizes = rollups.bucket_sizes()
+    if interval is not None:
+        try:
+            interval = int(interval)
+        except ValueError:
+            interval = None
+        if interval not in sizes:
+            details['interval'] = [f"Must be one of {', '.join(str(size) for size in sizes)} (seconds)"]
+        elif since_us is None or until_us is None:
+            details['interval'] = ["A series needs both since and until"]
+        elif until_us - since_us > interval * 1_000_000 * settings.EVENT_STATS_MAX_BUCKETS:
+            details['interval'] = [f"A series spans at most {settings.EVENT_STATS_MAX_BUCKETS} buckets"]
+    if details:
+        return None, {
+            "error": {
+                    "code": "VALIDATION_ERROR",
+                    "message": "Invalid parameter",
+                    "details": details
+                }
+        }
+    return {'user_id': user_id, 'events': events, 'since_us': since_us, 'until_us': until_us,
+            'interval': interval}, None
+
+
+def list_body(params, user_events):
+    """GET /v1/events response body for a page of EventRecords"""
+    next_cursor = None
+    if len(user_events) == params['limit']:
+        last = user_events[-1]
+        next_cursor = encode_cursor(last.received_at_us, last.id)
+    serializer = EventResponseSerializer(user_events, many=True)
+    return {
+        "events": serializer.data,
+        "count": len(user_events),
+        "user_id": params['user_id'],
+        "next_cursor": next_cursor
+    }
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint"""
+    return HttpResponse(metrics.render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class EventView(APIView):
+
+    @metrics.timed(metrics.REQUEST_SECONDS.labels('events', 'get'))
+    def get(self, request):
+        request_id = get_request_id(request)
+        params, error = parse_list_params(request.query_params)
+        if error:
+            response = Response(error, status=status.HTTP_400_BAD_REQUEST)
             response['X-Request-ID'] = request_id
             return response
-        user_events = [event for event in memory_store if event['user_id'] == user_id]
-
-        user_events = user_events[:limit]
-        serializer = EventResponseSerializer(user_events, many=True)
-        response = Response({
-                "events": serializer.data,
-                "count": len(user_events),
-                "user_id": user_id
-            },
-            status=status.HTTP_200_OK)
+        user_events = read_events(params['user_id'], params['limit'], before=params['before'], query=params['query'])
+        response = Response(list_body(params, user_events), status=status.HTTP_200_OK)
         response['X-Request-ID'] = request_id
         return response
 
+    @metrics.timed(metrics.REQUEST_SECONDS.labels('events', 'post'))
     def post(self,request):
         request_id = get_request_id(request)
+        data = parsed_data(request)
         try:
-            trigger_explode_error(request)
+            trigger_explode_error(request, data)
         except DeliberateError:
             raise
-        event_id = f"evt_{uuid.uuid4().hex[:8]}"
-        data = request.data.copy()
-        data['request_id'] = request_id
-        serializer = EventSerializer(data=data)
-        if serializer.is_valid():
-            validated_data = serializer.validated_data
-            event = Event(
-                id=event_id,
-                received_at=timezone.now(),
-                client_ts=validated_data.get('client_ts', timezone.now()),
-                event=validated_data['event'],
-                user_id=validated_data['user_id'],
-                metadata=validated_data.get('metadata', {}),
-                request_id=validated_data['request_id']
-            )
-            event.save()
-            print(f"DEBUG memory_store before append: {len(memory_store)}")
-            memory_store.insert(0, {
-                "id": event.id,
-                "event": event.event,
-                "user_id": event.user_id,
-                "received_at": event.received_at.isoformat(),
-                "client_ts": event.client_ts.isoformat(),
-                "metadata": event.metadata,
-                "request_id": event.request_id
-            })
-            print(f"DEBUG memory_store after append: {len(memory_store)}")
+        validated, errors = validate_event(data, request_id=request_id)
+        if not errors:
+            event = build_event(validated)
             try:
-                tracking_client.track_event(
-                    user_id=event.user_id,
-                    event_name=event.event,
-                    properties={
-                    'event_id': event_id,
-                    'client_ts': event.client_ts.isoformat(),
-                    'metadata': event.metadata,
-                    'source': 'api_v1'
-                },request_id=event.request_id)
-
-            except Exception as e:
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.error(f"Tracking error for event {event.id}: {str(e)}", exc_info=True)
-                    
+                accept_events([event])
+            except IngestUnavailable as e:
+                return unavailable_response(request_id, e)
+
             response_data = {
                 "id": event.id,
                 "accepted": True,
                 
             }
-            return Response(response_data, status=status.HTTP_201_CREATED)
+            response = Response(response_data, status=status.HTTP_201_CREATED)
+            response['X-Request-ID'] = request_id
+            return response
         else:
             return Response({
                 "error":"VALIDATION_ERROR",
                 "message": "Invalid input data",
-                "details": serializer.errors
+                "details": errors
             }, status=status.HTTP_400_BAD_REQUEST)
+    @metrics.timed(metrics.REQUEST_SECONDS.labels('events', 'delete'))
     def delete(self, request):
         request_id = get_request_id(request)
         user_id = request.query_params.get('user_id')
 
+        flush_pending_writes()
+        deleted_db = rollups.delete_events(user_id)
         if user_id:
-            deleted_db, _ = Event.objects.filter(user_id=user_id).delete()
-            before_cache = len(memory_store)
-            memory_store[:] = [event for event in memory_store if event.get('user_id') != user_id]
-            deleted_cache = before_cache - len(memory_store)
+            deleted_cache = memory_store.delete_user(user_id)
         else:
-            deleted_db, _ = Event.objects.all().delete()
-            deleted_cache = len(memory_store)
-            memory_store.clear()
+            deleted_cache = memory_store.clear()
+        metrics.EVENTS_DELETED.inc(deleted_db)
 
         response = Response({
             "deleted_db": deleted_db,
             "deleted_cache": deleted_cache
         }, status=status.HTTP_200_OK)
         response['X-Request-ID'] = request_id
-        return response
\ No newline at end of file
+        return response
+
+class EventStatsView(APIView):
+    """Event counts and time series from the rollups (event_api.rollups)"""
+
+    @metrics.timed(metrics.REQUEST_SECONDS.labels('stats', 'get'))
+    def get(self, request):
+        request_id = get_request_id(request)
+        if not rollups.enabled():
+            response = Response({
+                "error": {
+                    "code": "NOT_FOUND",
+                    "message": "Event rollups are not enabled",
+                    "details": {}
+                }
+            }, status=status.HTTP_404_NOT_FOUND)
+            response['X-Request-ID'] = request_id
+            return response
+        params, error = parse_stats_params(request.query_params)
+        if error:
+            response = Response(error, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            response = Response(rollups.stats(**params), status=status.HTTP_200_OK)
+        response['X-Request-ID'] = request_id
+        return response
+
+
+class EventBatchView(APIView):
+    """POST up to EVENT_BATCH_MAX_SIZE events in one request"""
+
+    @metrics.timed(metrics.REQUEST_SECONDS.labels('batch', 'post'))
+    def post(self, request):
+        request_id = get_request_id(request)
+        max_size = settings.EVENT_BATCH_MAX_SIZE
+        data = parsed_data(request)
+        items = data.get('events') if isinstance(data, dict) else None
+
+        error = None
+        if not isinstance(items, list) or not items:
+            error = "Expected a non-empty list of events."
+        elif len(items) > max_size:
+            error = f"Ensure this field has no more than {max_size} elements."
+        if error:
+            response = Response({
+                "error": "VALIDATION_ERROR",
+                "message": "Invalid input data",
+                "details": {"events": [error]}
+            }, status=status.HTTP_400_BAD_REQUEST)
+            response['X-Request-ID'] = request_id
+            return response
+
+        results = []
+        events = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results.append({"index": index, "accepted": False,
+                                "details": {"non_field_errors": ["Expected an event object."]}})
+                continue
+            validated, errors = validate_event(item, request_id=item.get('request_id') or request_id)
+            if errors:
+                results.append({"index": index, "accepted": False, "details": errors})
+            else:
+                event = build_event(validated)
+                events.append(event)
+                results.append({"index": index, "id": event.id, "accepted": True})
+
+        if events:
+            try:
+                accept_events(events)
+            except IngestUnavailable as e:
+                return unavailable_response(request_id, e)
+
+        if len(events) == len(items):
+            response_status = status.HTTP_201_CREATED
+        elif events:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        response = Response({
+            "accepted": len(events),
+            "rejected": len(items) - len(events),
+            "results": results
+        }, status=response_status)
+        response['X-Request-ID'] = request_id
+        return response
+
+
+class EventStreamView(APIView):
+    """
+    POST newline-delimited JSON events (application/x-ndjson), one event per
+    line. The body is read line by line rather than parsed up front, so
+    uploads of any size run in constant memory. `?track=false` skips vendor
+    tracking, e.g. for backfills.
+    """
+
+    @metrics.timed(metrics.REQUEST_SECONDS.labels('stream', 'post'))
+    def post(self, request):
+        request_id = get_request_id(request)
+        track = request.query_params.get('track', 'true').lower() != 'false'
+        stream = request.stream
+        if stream is None:
+            stream = io.BytesIO()
+
+        summary = ingest_ndjson(stream, request_id, track=track)
+
+        if 'unavailable' in summary:
+            response_status = status.HTTP_503_SERVICE_UNAVAILABLE
+        elif summary['rejected'] == 0:
+            response_status = status.HTTP_201_CREATED
+        elif summary['accepted']:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        response = Response(summary, status=response_status)
+        response['X-Request-ID'] = request_id
+        return response
+
+
+class AsyncEventView(View):
+    """
+    Native async GET/POST/DELETE /v1/events for ASGI deployments, selected
+    with EVENT_API_ASYNC. Same contract as EventView, but the ORM, write-behind
+    waits and vendor tracking are awaited, so a request never holds a worker
+    thread while it waits on I/O.
+    """
+    renderer = JSONRenderer()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # APIView is CSRF-exempt; keep the same contract for API clients
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def _respond(self, data, response_status, request_id):
+        response = HttpResponse(
+            self.renderer.render(data), status=response_status, content_type='application/json'
+        )
+        response['X-Request-ID'] = request_id
+        return response
+
+    @metrics.timed(metrics.REQUEST_SECONDS.labels('events', 'get'))
+    async def get(self, request):
+        request_id = get_request_id(request)
+        params, error = parse_list_params(request.GET)
+        if error:
+            return self._respond(error, status.HTTP_400_BAD_REQUEST, request_id)
+        user_events = await aread_events(
+            params['user_id'], params['limit'], before=params['before'], query=params['query']
+        )
+        return self._respond(list_body(params, user_events), status.HTTP_200_OK, request_id)
+
+    @metrics.timed(metrics.REQUEST_SECONDS.labels('events', 'post'))
+    async def post(self, request):
+        request_id = get_request_id(request)
+        if request.body and request.content_type != 'application/json':
+            return self._respond(
+                {"detail": f'Unsupported media type "{request.content_type}" in request.'},
+                status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, request_id
+            )
+        started = time.perf_counter()
+        try:
+            data = json.loads(request.body) if request.body else {}
+        except ValueError as e:
+            return self._respond({"detail": f"JSON parse error - {e}"}, status.HTTP_400_BAD_REQUEST, request_id)
+        metrics.PARSE_SECONDS.observe(time.perf_counter() - started)
+        if isinstance(data, dict):
+            trigger_explode_error(request, data)
+
+        validated, errors = validate_event(data, request_id=request_id)
+        if errors:
+            return self._respond({
+                "error":"VALIDATION_ERROR",
+                "message": "Invalid input data",
+                "details": errors
+            }, status.HTTP_400_BAD_REQUEST, request_id)
+        event = build_event(validated)
+        try:
+            await aaccept_events([event])
+        except IngestUnavailable as e:
+            response = self._respond({
+                "error": "SERVICE_UNAVAILABLE",
+                "message": "Events could not be stored, retry later",
+                "details": str(e)
+            }, status.HTTP_503_SERVICE_UNAVAILABLE, request_id)
+            response['Retry-After'] = '1'
+            return response
+        return self._respond({"id": event.id, "accepted": True}, status.HTTP_201_CREATED, request_id)
+
+    @metrics.timed(metrics.REQUEST_SECONDS.labels('events', 'delete'))
+    async def delete(self, request):
+        request_id = get_request_id(request)
+        user_id = request.GET.get('user_id')
+
+        await sync_to_async(flush_pending_writes)()
+        deleted_db = await sync_to_async(rollups.delete_events)(user_id)
+        if user_id:
+            deleted_cache = memory_store.delete_user(user_id)
+        else:
+            deleted_cache = memory_store.clear()
+        metrics.EVENTS_DELETED.inc(deleted_db)
+
+        return self._respond({
+            "deleted_db": deleted_db,
+            "deleted_cache": deleted_cache
+        }, status.HTTP_200_OK, request_id)
@@ -0,0 +1,222 @@
+"""
+Write-behind group commit for Event rows
+
+When enabled, accepted events are queued here instead of being inserted by
+the request thread. A background flusher commits them with one bulk_create
+per batch, once `max_batch` events are waiting or the oldest has waited
+`flush_interval` seconds. Tracking outbox rows staged on the events are
+committed in the same transaction.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection
+
+from . import outbox
+from .models import Event
+
+logger = logging.getLogger(__name__)
+
+
+class BufferFull(Exception):
+    """The write-behind queue has no room for the submitted events"""
+    pass
+
+
+class WriteTicket:
+    """Completion handle for one submit(); set once all its events are committed or failed"""
+
+    def __init__(self, count: int):
+        self._remaining = count
+        self._done = threading.Event()
+        self.error: Optional[Exception] = None
+
+    def _complete(self, count: int, error: Optional[Exception] = None) -> None:
+        if error is not None:
+            self.error = error
+        self._remaining -= count
+        if self._remaining <= 0:
+            self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """True once every event was committed, False on failure or timeout"""
+        return self._done.wait(timeout) and self.error is None
+
+
+class WriteBehindBuffer:
+    """
+    Bounded in-process queue of unsaved Events with a background flusher.
+
+    submit() never blocks: it raises BufferFull when the queue cannot take the
+    whole submission. flush() drains synchronously, including batches the
+    flusher thread is still writing, so callers such as DELETE can order
+    themselves after every accepted event.
+    """
+
+    def __init__(
+            self,
+            max_batch: int = 500,
+            flush_interval: float = 0.05,
+            max_queue: int = 10000,
+            autostart: bool = True
+    ):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.autostart = autostart
+        self._cond = threading.Condition()
+        self._pending: deque = deque()  # (event, ticket, enqueued_at)
+        self._inflight = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self.flushes = 0
+        self.flushed_events = 0
+        self.failed_events = 0
+        self.rejected_events = 0
+        self.max_batch_seen = 0
+        self.total_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.last_flush_seconds = 0.0
+
+    def submit(self, events: List[Event]) -> WriteTicket:
+        ticket = WriteTicket(len(events))
+        now = time.monotonic()
+        with self._cond:
+            if len(self._pending) + self._inflight + len(events) > self.max_queue:
+                self.rejected_events += len(events)
+                raise BufferFull(f"write-behind queue full ({self.max_queue} events)")
+            self._pending.extend((event, ticket, now) for event in events)
+            self._cond.notify()
+        if self.autostart and self._thread is None:
+            self.start()
+        return ticket
+
+    def flush(self) -> int:
+        """Write everything queued or in flight; returns how many events this call wrote"""
+        written = 0
+        while True:
+            with self._cond:
+                if self._pending:
+                    batch = self._take_batch()
+                elif self._inflight:
+                    self._cond.wait()
+                    continue
+                else:
+                    return written
+            self._write(batch)
+            written += len(batch)
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='event-write-behind', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        """Stop the flusher after it has written everything queued"""
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, flush latency and batch-size metrics"""
+        with self._cond:
+            pending = len(self._pending)
+            oldest_age = time.monotonic() - self._pending[0][2] if self._pending else 0.0
+            inflight = self._inflight
+        return {
+            'pending': pending,
+            'inflight': inflight,
+            'oldest_pending_seconds': oldest_age,
+            'max_queue': self.max_queue,
+            'flushes': self.flushes,
+            'flushed_events': self.flushed_events,
+            'failed_events': self.failed_events,
+            'rejected_events': self.rejected_events,
+            'avg_batch_size': self.flushed_events / self.flushes if self.flushes else 0.0,
+            'max_batch_size': self.max_batch_seen,
+            'last_flush_ms': self.last_flush_seconds * 1000,
+            'avg_flush_ms': self.total_flush_seconds / self.flushes * 1000 if self.flushes else 0.0,
+            'max_flush_ms': self.max_flush_seconds * 1000,
+        }
+
+    def _take_batch(self) -> list:
+        count = min(self.max_batch, len(self._pending))
+        batch = [self._pending.popleft() for _ in range(count)]
+        self._inflight += count
+        return batch
+
+    def _run(self) -> None:
+        try:
+            while True:
+                with self._cond:
+                    while not self._stopping:
+                        if len(self._pending) >= self.max_batch:
+                            break
+                        if self._pending:
+                            remaining = self._pending[0][2] + self.flush_interval - time.monotonic()
+                            if remaining <= 0:
+                                break
+                            self._cond.wait(remaining)
+                        else:
+                            self._cond.wait()
+                    if self._stopping and not self._pending:
+                        return
+                    batch = self._take_batch()
+                self._write(batch)
+        finally:
+            connection.close()
+
+    def _write(self, batch: list) -> None:
+        events = [event for event, _, _ in batch]
+        started = time.monotonic()
+        error = None
+        try:
+            outbox.save_events(events)
+        except Exception as e:
+            error = e
+            logger.error(
+                f"Write-behind flush failed for {len(events)} events "
+                f"({events[0].id}..{events[-1].id}): {str(e)}", exc_info=True
+            )
+        elapsed = time.monotonic() - started
+
+        counts: Dict[WriteTicket, int] = {}
+        for _, ticket, _ in batch:
+            counts[ticket] = counts.get(ticket, 0) + 1
+        for ticket, count in counts.items():
+            ticket._complete(count, error)
+
+        with self._cond:
+            self._inflight -= len(batch)
+            self.flushes += 1
+            if error is None:
+                self.flushed_events += len(batch)
+            else:
+                self.failed_events += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self.last_flush_seconds = elapsed
+            self.total_flush_seconds += elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            self._cond.notify_all()
+
+
+write_behind = WriteBehindBuffer(
+    max_batch=getattr(settings, 'EVENT_WRITE_BEHIND_MAX_BATCH', 500),
+    flush_interval=getattr(settings, 'EVENT_WRITE_BEHIND_FLUSH_INTERVAL', 0.05),
+    max_queue=getattr(settings, 'EVENT_WRITE_BEHIND_MAX_QUEUE', 10000),
+)
+atexit.register(write_behind.stop)
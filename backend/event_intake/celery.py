@@ -0,0 +1,16 @@
+"""
+Celery application for background work (the tracking outbox drain).
+
+    celery -A event_intake worker -B -l info
+
+Broker and schedule come from the CELERY_* settings.
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "event_intake.settings")
+
+app = Celery("event_intake")
+app.config_from_object("django.conf:settings", namespace="CELERY")
+app.autodiscover_tasks()
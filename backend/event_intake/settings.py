@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +50,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "event_api.profiling.ProfilingMiddleware",
     "event_api.error_capture.ErrorCaptureMiddleware",
 ]
 
@@ -127,18 +129,198 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Serve GET/POST/DELETE /api/v1/events from the native async view. Only
+# worthwhile under an ASGI server (event_intake.asgi, e.g. uvicorn).
+EVENT_API_ASYNC = os.getenv("EVENT_API_ASYNC", "false").lower() == "true"
+
+# In-memory event cache (event_api.storage). Oldest events are evicted once
+# either cap is reached.
+EVENT_CACHE_MAX_EVENTS = int(os.getenv("EVENT_CACHE_MAX_EVENTS", "100000"))
+EVENT_CACHE_MAX_EVENTS_PER_USER = int(os.getenv("EVENT_CACHE_MAX_EVENTS_PER_USER", "1000"))
+# Seconds a user's cached history is trusted before GET re-reads the Event
+# table; bounds how stale the cache can be relative to other workers.
+EVENT_CACHE_TTL = float(os.getenv("EVENT_CACHE_TTL", "30"))
+
+# Largest number of events accepted by POST /api/v1/events/batch
+EVENT_BATCH_MAX_SIZE = int(os.getenv("EVENT_BATCH_MAX_SIZE", "500"))
+
+# Write-behind group commit (event_api.writebehind). When enabled, POSTed
+# events are inserted in background batches of up to MAX_BATCH rows, flushed
+# every FLUSH_INTERVAL seconds. ACK is "accepted" (respond once queued) or
+# "durable" (respond once committed, waiting up to DURABLE_TIMEOUT seconds).
+EVENT_WRITE_BEHIND_ENABLED = os.getenv("EVENT_WRITE_BEHIND_ENABLED", "false").lower() == "true"
+EVENT_WRITE_BEHIND_ACK = os.getenv("EVENT_WRITE_BEHIND_ACK", "accepted")
+EVENT_WRITE_BEHIND_MAX_BATCH = int(os.getenv("EVENT_WRITE_BEHIND_MAX_BATCH", "500"))
+EVENT_WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("EVENT_WRITE_BEHIND_FLUSH_INTERVAL", "0.05"))
+EVENT_WRITE_BEHIND_MAX_QUEUE = int(os.getenv("EVENT_WRITE_BEHIND_MAX_QUEUE", "10000"))
+EVENT_WRITE_BEHIND_DURABLE_TIMEOUT = float(os.getenv("EVENT_WRITE_BEHIND_DURABLE_TIMEOUT", "5"))
+
+# Event rollups (event_api.rollups): per user, event name and time bucket
+# counts that answer GET /api/v1/events/stats. When enabled, inserts bump their
+# buckets in the same transaction and DELETE drops them. BUCKETS are the bucket
+# sizes kept, in seconds of received_at; a stats time series spans at most
+# STATS_MAX_BUCKETS buckets. Run `python manage.py rebuild_rollups` after
+# enabling rollups or changing BUCKETS.
+EVENT_ROLLUPS_ENABLED = os.getenv("EVENT_ROLLUPS_ENABLED", "false").lower() == "true"
+EVENT_ROLLUP_BUCKETS = sorted(
+    int(size) for size in os.getenv("EVENT_ROLLUP_BUCKETS", "3600,86400").split(",") if size.strip()
+)
+EVENT_STATS_MAX_BUCKETS = int(os.getenv("EVENT_STATS_MAX_BUCKETS", "1000"))
+
+# NDJSON ingest (POST /api/v1/events/stream): events are stored CHUNK_SIZE at
+# a time; the response lists at most MAX_ERRORS rejected lines.
+EVENT_STREAM_CHUNK_SIZE = int(os.getenv("EVENT_STREAM_CHUNK_SIZE", "500"))
+EVENT_STREAM_MAX_ERRORS = int(os.getenv("EVENT_STREAM_MAX_ERRORS", "100"))
+EVENT_STREAM_MAX_LINE_BYTES = int(os.getenv("EVENT_STREAM_MAX_LINE_BYTES", "65536"))
+
+# Vendor tracking dispatch (event_api.dispatch). When enabled, track_event
+# queues the vendor sends for WORKERS background threads instead of making
+# them in the request. Once MAX_QUEUE events are waiting, OVERFLOW decides:
+# "drop_newest", "drop_oldest" or "block" (wait up to BLOCK_TIMEOUT seconds).
+# At shutdown the queue is drained for up to DRAIN_TIMEOUT seconds.
+TRACKING_DISPATCH_ENABLED = os.getenv("TRACKING_DISPATCH_ENABLED", "true").lower() == "true"
+TRACKING_DISPATCH_WORKERS = int(os.getenv("TRACKING_DISPATCH_WORKERS", "4"))
+TRACKING_DISPATCH_MAX_QUEUE = int(os.getenv("TRACKING_DISPATCH_MAX_QUEUE", "10000"))
+TRACKING_DISPATCH_OVERFLOW = os.getenv("TRACKING_DISPATCH_OVERFLOW", "drop_newest")
+TRACKING_DISPATCH_BLOCK_TIMEOUT = float(os.getenv("TRACKING_DISPATCH_BLOCK_TIMEOUT", "0.05"))
+TRACKING_DISPATCH_DRAIN_TIMEOUT = float(os.getenv("TRACKING_DISPATCH_DRAIN_TIMEOUT", "5"))
+
+# Per-vendor batching (event_api.sinks). When enabled, each vendor's payloads
+# are sent as one batch request once MAX_EVENTS are waiting, the batch would
+# exceed MAX_BYTES, or the oldest payload is MAX_AGE seconds old.
+# VENDOR_LIMITS overrides these per vendor, e.g. {"mixpanel": {"max_events": 50}}.
+# A failed batch is retried MAX_RETRIES times, RETRY_BACKOFF seconds apart and
+# doubling. Past MAX_PENDING waiting payloads per vendor, the oldest batches
+# are dropped.
+TRACKING_BATCH_ENABLED = os.getenv("TRACKING_BATCH_ENABLED", "false").lower() == "true"
+TRACKING_BATCH_MAX_EVENTS = int(os.getenv("TRACKING_BATCH_MAX_EVENTS", "100"))
+TRACKING_BATCH_MAX_BYTES = int(os.getenv("TRACKING_BATCH_MAX_BYTES", str(512 * 1024)))
+TRACKING_BATCH_MAX_AGE = float(os.getenv("TRACKING_BATCH_MAX_AGE", "1.0"))
+TRACKING_BATCH_MAX_PENDING = int(os.getenv("TRACKING_BATCH_MAX_PENDING", "10000"))
+TRACKING_BATCH_MAX_RETRIES = int(os.getenv("TRACKING_BATCH_MAX_RETRIES", "3"))
+TRACKING_BATCH_RETRY_BACKOFF = float(os.getenv("TRACKING_BATCH_RETRY_BACKOFF", "1.0"))
+TRACKING_BATCH_VENDOR_LIMITS = {
+    'segment': {'max_bytes': 500 * 1024},
+    'mixpanel': {'max_events': 50},
+}
+
+# Vendor fan-out: "concurrent" sends to all vendors at once (from a pool of
+# FANOUT_WORKERS threads), "serial" one after another. Each send is bounded by
+# VENDOR_TIMEOUT seconds (VENDOR_TIMEOUTS overrides it per vendor) and the
+# whole fan-out by FANOUT_DEADLINE seconds.
+TRACKING_FANOUT = os.getenv("TRACKING_FANOUT", "concurrent")
+TRACKING_FANOUT_WORKERS = int(os.getenv("TRACKING_FANOUT_WORKERS", "16"))
+TRACKING_FANOUT_DEADLINE = float(os.getenv("TRACKING_FANOUT_DEADLINE", "5"))
+TRACKING_VENDOR_TIMEOUT = float(os.getenv("TRACKING_VENDOR_TIMEOUT", "2"))
+TRACKING_VENDOR_TIMEOUTS = {}
+
+# POST vendor requests to <TRACKING_VENDOR_URL>/<vendor> (e.g. a local
+# event_api.vendor_stub) instead of simulating them. VENDOR_ENDPOINTS sets a
+# full URL per vendor instead; batches go to <endpoint>/batch.
+TRACKING_VENDOR_URL = os.getenv("TRACKING_VENDOR_URL", "")
+TRACKING_VENDOR_ENDPOINTS = {}
+
+# HTTP delivery (event_api.transport): keep-alive pool per vendor host with at
+# most MAX_CONNECTIONS requests in flight; bodies of at least GZIP_MIN_BYTES
+# are gzipped when GZIP is on.
+TRACKING_HTTP_MAX_CONNECTIONS = int(os.getenv("TRACKING_HTTP_MAX_CONNECTIONS", "8"))
+TRACKING_HTTP_GZIP = os.getenv("TRACKING_HTTP_GZIP", "false").lower() == "true"
+TRACKING_HTTP_GZIP_MIN_BYTES = int(os.getenv("TRACKING_HTTP_GZIP_MIN_BYTES", "1024"))
+
+# Per-vendor routing rules (event_api.routing), applied before any payload is
+# built: "allow"/"deny" event names (globs allowed), "sample_rate" keeping a
+# stable share of users by user_id hash, and "strip_properties" removing
+# top-level property keys. Vendors without a rule get every event, e.g.
+# {"mixpanel": {"deny": ["heartbeat"], "sample_rate": 0.25, "strip_properties": ["metadata"]}}.
+TRACKING_ROUTING_RULES = {}
+
+# Per-vendor circuit breakers: after FAILURE_THRESHOLD consecutive failures a
+# vendor is skipped for RESET_TIMEOUT seconds, then one trial call is allowed.
+TRACKING_BREAKER_FAILURE_THRESHOLD = int(os.getenv("TRACKING_BREAKER_FAILURE_THRESHOLD", "5"))
+TRACKING_BREAKER_RESET_TIMEOUT = float(os.getenv("TRACKING_BREAKER_RESET_TIMEOUT", "30"))
+
+# Transactional tracking outbox (event_api.outbox). When enabled, vendor
+# payloads are written with their Event rows and delivered by the Celery task
+# event_api.tasks.drain_tracking_outbox in batches of BATCH_SIZE. Failed rows
+# are retried after BACKOFF_BASE * 2^(attempt-1) seconds (at most BACKOFF_MAX),
+# up to MAX_ATTEMPTS. A claimed row is hidden from other workers for LEASE seconds.
+TRACKING_OUTBOX_ENABLED = os.getenv("TRACKING_OUTBOX_ENABLED", "false").lower() == "true"
+TRACKING_OUTBOX_BATCH_SIZE = int(os.getenv("TRACKING_OUTBOX_BATCH_SIZE", "100"))
+TRACKING_OUTBOX_BACKOFF_BASE = float(os.getenv("TRACKING_OUTBOX_BACKOFF_BASE", "1"))
+TRACKING_OUTBOX_BACKOFF_MAX = float(os.getenv("TRACKING_OUTBOX_BACKOFF_MAX", "300"))
+TRACKING_OUTBOX_MAX_ATTEMPTS = int(os.getenv("TRACKING_OUTBOX_MAX_ATTEMPTS", "10"))
+TRACKING_OUTBOX_LEASE = float(os.getenv("TRACKING_OUTBOX_LEASE", "60"))
+TRACKING_OUTBOX_POLL_INTERVAL = float(os.getenv("TRACKING_OUTBOX_POLL_INTERVAL", "1"))
+
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "memory://")
+CELERY_BEAT_SCHEDULE = {
+    "drain-tracking-outbox": {
+        "task": "event_api.tasks.drain_tracking_outbox",
+        "schedule": TRACKING_OUTBOX_POLL_INTERVAL,
+    },
+}
+
+# Prometheus metrics at /metrics (event_api.metrics). With several worker
+# processes, set METRICS_MULTIPROCESS_DIR to a directory they share: each
+# writes its totals there every METRICS_FLUSH_INTERVAL seconds and a scrape
+# merges them.
+METRICS_MULTIPROCESS_DIR = os.getenv("METRICS_MULTIPROCESS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+# Per-request profiling (event_api.profiling): requests sent with
+# `X-Profile: <PROFILING_TOKEN>`, plus PROFILING_SAMPLE_RATE of all requests,
+# get a Server-Timing header with their stage durations. With PROFILING_DIR set
+# they are also run under cProfile and dumped there, named by X-Request-ID.
+# With no token and no sample rate the middleware is not loaded at all.
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_DIR = os.getenv("PROFILING_DIR", "")
+
+# Unhandled exceptions (event_api.error_capture) are fingerprinted by type and
+# their innermost FINGERPRINT_FRAMES frames. Only the first DEDUP_LIMIT of a
+# fingerprint per DEDUP_WINDOW seconds are formatted and logged; the rest are
+# counted and reported with the next logged occurrence.
+ERROR_CAPTURE_FINGERPRINT_FRAMES = int(os.getenv("ERROR_CAPTURE_FINGERPRINT_FRAMES", "5"))
+ERROR_CAPTURE_DEDUP_LIMIT = int(os.getenv("ERROR_CAPTURE_DEDUP_LIMIT", "5"))
+ERROR_CAPTURE_DEDUP_WINDOW = float(os.getenv("ERROR_CAPTURE_DEDUP_WINDOW", "60"))
+
+# event_api logs go through a bounded queue to a background thread, so
+# requests never wait on log I/O; records beyond LOG_QUEUE_MAXSIZE are dropped.
+# They are written as JSON lines at LOG_LEVEL and above. LOG_SAMPLE_RATES keeps
+# a share of each structured-log category (event_api.structured_log), e.g.
+# LOG_SAMPLE_RATES="track=0.01,cache=0" logs 1% of TRACK lines and no cache lines.
+LOG_QUEUE_MAXSIZE = int(os.getenv("LOG_QUEUE_MAXSIZE", "10000"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATES = {
+    category.strip(): float(rate)
+    for category, rate in (
+        item.split("=", 1) for item in os.getenv("LOG_SAMPLE_RATES", "").split(",") if item.strip()
+    )
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'event_api.log_handlers.JSONFormatter',
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
+            'formatter': 'json',
+        },
+        'queue': {
+            'class': 'event_api.log_handlers.NonBlockingQueueHandler',
+            'queue': {'()': 'queue.Queue', 'maxsize': LOG_QUEUE_MAXSIZE},
+            'handlers': ['console'],
         },
     },
     'loggers': {
         'event_api': {
-            'handlers': ['console'],
-            'level': 'INFO',
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
             'propagate': True,
         },
     },
@@ -18,8 +18,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from event_api.views import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path('api/', include('event_api.urls')),
+    path('metrics', metrics_view, name='metrics'),
 
 ]
@@ -2,13 +2,21 @@
 """
 CLI script to demonstrate frontend-backend wiring
 Sends sample events and retrieves them back
+
+`--mode load` runs a concurrent load test instead and reports throughput,
+error rates and latency percentiles (see LoadGenerator).
 """
 import requests
 import json
+import random
+import threading
 import time
 import sys
 import uuid
-from typing import Dict, Any
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+from requests.adapters import HTTPAdapter
 
 API_BASE_URL = "http://localhost:8081/api/v1/events"
 
@@ -207,11 +215,191 @@ class EventSimulator:
         return retrieve_result['success'] and retrieve_result['data']['count'] > 0
 
 
+def parse_weights(spec: str) -> Dict[str, float]:
+    """'page_view=5,click=3' -> {'page_view': 5.0, 'click': 3.0}; a bare name weighs 1"""
+    weights = {}
+    for item in spec.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name:
+            weights[name] = float(weight) if weight else 1.0
+    if not weights or any(weight < 0 for weight in weights.values()) or not any(weights.values()):
+        raise ValueError(f"Invalid weights: {spec!r}")
+    return weights
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class LoadGenerator:
+    """
+    Sends a mix of POST/GET/DELETE requests from `concurrency` worker threads,
+    each with its own keep-alive session, for `duration` seconds or until
+    `total_requests` have been sent.
+
+    With a target `rate` (requests/s across all workers) requests are started
+    on a fixed schedule, and latency is measured from each request's scheduled
+    start. When the service falls behind, the queueing shows up in the
+    percentiles instead of silently lowering the request rate.
+    """
+
+    OPERATIONS = ('post', 'get', 'delete')
+
+    def __init__(self, base_url=API_BASE_URL, concurrency: int = 8, rate: float = 0.0,
+                 duration: float = 10.0, total_requests: int = 0,
+                 event_mix: Optional[Dict[str, float]] = None, op_mix: Optional[Dict[str, float]] = None,
+                 users: int = 1000, metadata_bytes: int = 64, timeout: float = 10.0):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.total_requests = total_requests
+        self.event_mix = event_mix or {'page_view': 6, 'button_clicked': 3, 'signup_completed': 1}
+        self.op_mix = op_mix or {'post': 90, 'get': 9, 'delete': 1}
+        unknown = set(self.op_mix) - set(self.OPERATIONS)
+        if unknown:
+            raise ValueError(f"Unknown operations in mix: {sorted(unknown)}")
+        self.users = users
+        self.metadata_bytes = metadata_bytes
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        session.headers.update({'Content-Type': 'application/json', 'Accept': 'application/json'})
+        return session
+
+    def _claim(self) -> Optional[int]:
+        """Index of the next request to send, or None when the run is over"""
+        with self._lock:
+            index = self._next
+            self._next += 1
+        if self.total_requests and index >= self.total_requests:
+            return None
+        return index
+
+    def _request(self, session: requests.Session, rng: random.Random, operation: str) -> int:
+        user_id = f"u_load_{rng.randrange(self.users)}"
+        if operation == 'post':
+            event = {
+                "event": rng.choices(list(self.event_mix), weights=list(self.event_mix.values()))[0],
+                "user_id": user_id,
+                "client_ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "metadata": {"pad": "x" * self.metadata_bytes},
+            }
+            response = session.post(self.base_url, data=json.dumps(event), timeout=self.timeout)
+        elif operation == 'get':
+            response = session.get(self.base_url, params={'user_id': user_id, 'limit': 20}, timeout=self.timeout)
+        else:
+            response = session.delete(self.base_url, params={'user_id': user_id}, timeout=self.timeout)
+        response.content  # read the body so the connection goes back to the pool
+        return response.status_code
+
+    def _worker(self, seed: int, started: float, deadline: float, results: List[Tuple[str, float, str]]):
+        rng = random.Random(seed)
+        session = self._new_session()
+        operations, weights = list(self.op_mix), list(self.op_mix.values())
+        try:
+            while True:
+                index = self._claim()
+                if index is None:
+                    break
+                if self.rate:
+                    scheduled = started + index / self.rate
+                    if scheduled >= deadline:
+                        break
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                else:
+                    scheduled = time.perf_counter()
+                    if scheduled >= deadline:
+                        break
+                operation = rng.choices(operations, weights=weights)[0]
+                try:
+                    outcome = str(self._request(session, rng, operation))
+                except requests.exceptions.RequestException as e:
+                    outcome = type(e).__name__
+                results.append((operation, time.perf_counter() - scheduled, outcome))
+        finally:
+            session.close()
+
+    def run(self) -> Dict[str, Any]:
+        per_worker: List[List[Tuple[str, float, str]]] = [[] for _ in range(self.concurrency)]
+        started = time.perf_counter()
+        deadline = started + self.duration if self.duration else float('inf')
+        threads = [
+            threading.Thread(target=self._worker, args=(seed, started, deadline, per_worker[seed]), daemon=True)
+            for seed in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        results = [result for worker_results in per_worker for result in worker_results]
+        return self.report(results, elapsed)
+
+    def report(self, results: List[Tuple[str, float, str]], elapsed: float) -> Dict[str, Any]:
+        def summary(rows):
+            latencies = sorted(latency * 1000 for _, latency, _ in rows)
+            outcomes = Counter(outcome for _, _, outcome in rows)
+            errors = sum(count for outcome, count in outcomes.items() if not outcome.isdigit() or int(outcome) >= 400)
+            return {
+                'requests': len(rows),
+                'throughput_rps': round(len(rows) / elapsed, 1) if elapsed else 0.0,
+                'errors': errors,
+                'error_rate': round(errors / len(rows), 4) if rows else 0.0,
+                'outcomes': dict(sorted(outcomes.items())),
+                'latency_ms': {
+                    'p50': round(percentile(latencies, 50), 2),
+                    'p95': round(percentile(latencies, 95), 2),
+                    'p99': round(percentile(latencies, 99), 2),
+                    'max': round(latencies[-1], 2) if latencies else 0.0,
+                },
+            }
+
+        report = {
+            'config': {
+                'url': self.base_url, 'concurrency': self.concurrency, 'rate': self.rate,
+                'duration': self.duration, 'requests': self.total_requests, 'users': self.users,
+                'metadata_bytes': self.metadata_bytes, 'event_mix': self.event_mix, 'op_mix': self.op_mix,
+            },
+            'elapsed_s': round(elapsed, 3),
+            **summary(results),
+            'operations': {
+                operation: summary([row for row in results if row[0] == operation])
+                for operation in self.OPERATIONS if operation in self.op_mix
+            },
+        }
+        return report
+
+
+def print_load_report(report: Dict[str, Any]) -> None:
+    config = report['config']
+    rate = f"{config['rate']:g} req/s target" if config['rate'] else "unthrottled"
+    print(f"Load test against {config['url']}: {config['concurrency']} workers, {rate}, {report['elapsed_s']:.1f}s")
+    print(f"{'':8} {'requests':>9} {'req/s':>9} {'errors':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    rows = [('all', report)] + list(report['operations'].items())
+    for name, row in rows:
+        latency = row['latency_ms']
+        print(f"{name:8} {row['requests']:>9} {row['throughput_rps']:>9.1f} {row['error_rate']:>8.2%} "
+              f"{latency['p50']:>9.2f} {latency['p95']:>9.2f} {latency['p99']:>9.2f} {latency['max']:>9.2f}")
+    print("Outcomes: " + ", ".join(f"{outcome}={count}" for outcome, count in report['outcomes'].items()))
+
+
 def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='Event Intake Frontend Simulator')
-    parser.add_argument('--mode', choices=['demo', 'test', 'submit', 'retrieve'], 
+    parser.add_argument('--mode', choices=['demo', 'test', 'submit', 'retrieve', 'load'], 
                        default='demo', help='Operation mode')
     parser.add_argument('--url', default=API_BASE_URL, help='API base URL')
     parser.add_argument('--user-id', help='User ID for submit/retrieve operations')
@@ -219,8 +407,40 @@ def main():
     parser.add_argument('--metadata', help='JSON metadata for submission')
     parser.add_argument('--request-id', help='Custom X-Request-Id header value')
     parser.add_argument('--limit', type=int, default=10, help='Limit for retrieval')
+
+    load = parser.add_argument_group('load mode')
+    load.add_argument('--concurrency', type=int, default=8, help='Worker threads, one keep-alive connection each')
+    load.add_argument('--rate', type=float, default=0.0, help='Target requests/s across workers (0: as fast as possible)')
+    load.add_argument('--duration', type=float, default=10.0, help='Seconds to run (0: until --requests are sent)')
+    load.add_argument('--requests', type=int, default=0, help='Stop after this many requests (0: no limit)')
+    load.add_argument('--events', default='page_view=6,button_clicked=3,signup_completed=1',
+                      help='Event name weights for POSTs')
+    load.add_argument('--ops', default='post=90,get=9,delete=1', help='POST/GET/DELETE weights')
+    load.add_argument('--users', type=int, default=1000, help='Distinct user ids to spread requests over')
+    load.add_argument('--metadata-bytes', type=int, default=64, help='Size of the metadata padding per event')
+    load.add_argument('--json', action='store_true', help='Print the load report as JSON')
     
     args = parser.parse_args()
+
+    if args.mode == 'load':
+        if not args.duration and not args.requests:
+            print("Error: load mode needs --duration or --requests")
+            sys.exit(1)
+        try:
+            generator = LoadGenerator(
+                args.url, concurrency=args.concurrency, rate=args.rate, duration=args.duration,
+                total_requests=args.requests, event_mix=parse_weights(args.events), op_mix=parse_weights(args.ops),
+                users=args.users, metadata_bytes=args.metadata_bytes,
+            )
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        report = generator.run()
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_load_report(report)
+        sys.exit(0 if report['requests'] and report['error_rate'] == 0 else 1)
     
     simulator = EventSimulator(args.url)
     